@@ -1,27 +1,20 @@
 import datetime
 import discord
-import apikeys
 import logging
 import asyncio
 import config 
 import time
 from discord import ChannelType
 import os
-from helpers import managementHelpers
+import messageMirror
+from helpers import exportHelpers, managementHelpers, rateHelpers
 
+logger = logging.getLogger(__name__)
 
-class GDPRClient(discord.Client):
-
-    async def on_ready(self):
-        self.logger = logging.getLogger(__name__)
 
-        # Only log debug messages in debug mode
-        if (config.DEBUG):
-            logging.basicConfig(level=logging.DEBUG)
-        else:
-            logging.basicConfig(level=logging.INFO)
+class GDPRClient(discord.Client):
 
-    async def getGDPR(self, userid, guildid, sendReply):
+    async def getGDPR(self, userid, guildid, sendReply, jsonl=False):
         guild = self.get_guild(guildid)
         user = self.get_user(int(userid))
 
@@ -31,40 +24,34 @@ class GDPRClient(discord.Client):
         if(user is None):
             return await sendReply("Could not find user with id: " + userid)
 
-        filename = "gdprdata/data.txt"
+        exporter = exportHelpers.GDPRExporter(userid, jsonl=jsonl)
         mymessage = await sendReply("Compiling GDPR data...")
 
-        with open(filename, 'w') as f:
-            for channel in guild.channels:
-                try:
-                    if channel.type == ChannelType.text:
-                        count = 0
-                        self.logger.debug("Processing gdpr data for: " + str(channel)) 
-                        await sendReply("Processing data for: " + str(channel), edit=mymessage)
-                        async for message in channel.history(limit=None):
-                            count += 1
-
-                            if isGDPRableMessage(message, userid):
-                                f.write(managementHelpers.messageToString(message))
-
-                            if(count == 500):
-                                self.logger.debug("Processed 500 messages")
-                                count = 0
-                                asyncio.sleep(1)
-                except Exception as e:
-                    await sendReply("Exception while processing channel: " + str(channel))
-                    self.logger.error(e)
-                    pass
+        async def writeMessages(channel, messages):
+            for message in messages:
+                await exporter.write(message)
 
-                await asyncio.sleep(1)
-        
-        await sendReply("GDPR Data Compiled!", edit=mymessage)
-        filesize = os.path.getsize(filename)
+        # The parts are removed however this ends, including when the scan fails or is cancelled part way through
+        try:
+            try:
+                index = await messageMirror.messageMirror.find_messages(guild, userid)
 
-        if(filesize < 8*1000*1000):
-            await sendReply("Data: ", file=filename)
-        else:
-            await sendReply("Data is too large ("+str(filesize)+" megabytes) to send via discord! :(")
+                if index is not None:
+                    await self.fetchIndexed(guild, index, writeMessages, sendReply, mymessage)
+                else:
+                    await self.scanGuild(guild, lambda message: isGDPRableMessage(message, userid), writeMessages, sendReply, mymessage)
+            finally:
+                parts = await exporter.close()
+
+            await sendReply("GDPR Data Compiled! " + str(exporter.count) + " messages found.", edit=mymessage)
+
+            if len(parts) == 0:
+                return await sendReply("No data found.")
+
+            for number, part in enumerate(parts, 1):
+                await sendReply("Data (part " + str(number) + " of " + str(len(parts)) + "): ", file=part)
+        finally:
+            await exporter.remove()
 
 
     async def deleteGDPR(self, userid, guildid, sendReply):
@@ -79,18 +66,135 @@ class GDPRClient(discord.Client):
 
         mymessage = await sendReply("Deleting messages sent by "+userid+" in compliance with gdpr.")
 
-        for channel in guild.channels:
-            try:
-                if channel.type == ChannelType.text:
+        async def deleteMessages(channel, messages):
+            await managementHelpers.bulkDeleteAll(messages, channel)
+
+        index = await messageMirror.messageMirror.find_messages(guild, userid, include_mentions=False)
+
+        if index is not None:
+            # Deleting only needs the ids, so nothing has to be fetched
+            for channel_id, message_ids in index.items():
+                channel = guild.get_channel(channel_id)
+                if channel is not None:
                     await sendReply("Processing data for: " + str(channel), edit=mymessage)
-                    await managementHelpers.clearChannelOfUser(channel, userid)
-            except Exception as e:
-                await sendReply("Exception while processing channel: " + str(channel))
-                self.logger.error(e)
-                pass
+                    await deleteMessages(channel, [channel.get_partial_message(message_id) for message_id in message_ids])
+        else:
+            await self.scanGuild(guild, lambda message: managementHelpers.userPostedMessage(message, userid),
+                                 deleteMessages, sendReply, mymessage)
         
         await sendReply("Data for user " + str(userid) + " deleted!", edit=mymessage)
 
+    # Scan every text channel in a guild, several channels at a time. Each page of history goes through a
+    # shared token bucket so we go as fast as discord allows, and no faster.
+    # handleMessages(channel, messages) is called with the messages from each page for which isMatch(message) is true.
+    async def scanGuild(self, guild, isMatch, handleMessages, sendReply, statusMessage):
+        channels = [channel for channel in guild.channels if channel.type == ChannelType.text]
+        progress = ScanProgress(len(channels))
+        semaphore = asyncio.Semaphore(config.gdpr_channel_concurrency)
+        bucket = rateHelpers.TokenBucket(rate=config.gdpr_requests_per_second)
+
+        async def scanChannel(channel):
+            async with semaphore:
+                progress.active.add(channel.name)
+                logger.debug("Processing gdpr data for: " + str(channel))
+
+                try:
+                    async for page in rateHelpers.history_pages(channel, bucket):
+                        matches = [message for message in page if isMatch(message)]
+                        progress.scanned += len(page)
+                        progress.matched += len(matches)
+
+                        if len(matches) > 0:
+                            await handleMessages(channel, matches)
+                except Exception as e:
+                    progress.failed.append(channel.name)
+                    logger.error("Exception while processing channel " + str(channel) + ": " + str(e))
+                finally:
+                    progress.active.discard(channel.name)
+                    progress.done += 1
+
+        return await self.runWithProgress([scanChannel(channel) for channel in channels], progress, bucket, sendReply, statusMessage)
+
+    # Like scanGuild, but only fetches the messages the message mirror says we need ({channel id: [message ids]})
+    async def fetchIndexed(self, guild, index, handleMessages, sendReply, statusMessage):
+        progress = ScanProgress(len(index))
+        semaphore = asyncio.Semaphore(config.gdpr_channel_concurrency)
+        bucket = rateHelpers.TokenBucket(rate=config.gdpr_requests_per_second)
+
+        async def fetchChannel(channel_id, message_ids):
+            channel = guild.get_channel(channel_id)
+            if channel is None:
+                progress.done += 1
+                return
+
+            async with semaphore:
+                progress.active.add(channel.name)
+
+                try:
+                    for message_id in message_ids:
+                        try:
+                            message = await bucket.call(channel.fetch_message, message_id)
+                        except discord.NotFound:
+                            continue
+
+                        progress.scanned += 1
+                        progress.matched += 1
+                        await handleMessages(channel, [message])
+                except Exception as e:
+                    progress.failed.append(channel.name)
+                    logger.error("Exception while processing channel " + str(channel) + ": " + str(e))
+                finally:
+                    progress.active.discard(channel.name)
+                    progress.done += 1
+
+        return await self.runWithProgress([fetchChannel(channel_id, message_ids) for channel_id, message_ids in index.items()],
+                                          progress, bucket, sendReply, statusMessage)
+
+    # Run the per channel coroutines, posting aggregated progress to the status message as they go
+    async def runWithProgress(self, coroutines, progress, bucket, sendReply, statusMessage):
+        async def reportProgress():
+            while True:
+                await asyncio.sleep(PROGRESS_INTERVAL)
+                await sendReply(progress.describe(), edit=statusMessage)
+
+        with rateHelpers.watch_rate_limits(bucket):
+            reporter = asyncio.ensure_future(reportProgress())
+            try:
+                await asyncio.gather(*coroutines)
+            finally:
+                reporter.cancel()
+
+        if len(progress.failed) > 0:
+            await sendReply("Exception while processing channels: " + ", ".join(progress.failed))
+
+        return progress
+
+
+# How often (in seconds) to update the status message while scanning
+PROGRESS_INTERVAL = 5
+
+
+# Aggregated progress of a guild scan, across all the channels being scanned at once
+class ScanProgress:
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.scanned = 0
+        self.matched = 0
+        self.active = set()
+        self.failed = []
+
+    def describe(self):
+        description = "Processed " + str(self.done) + "/" + str(self.total) + " channels, " + \
+                      str(self.scanned) + " messages scanned, " + str(self.matched) + " found."
+
+        if len(self.active) > 0:
+            description += "\nProcessing: " + ", ".join(sorted(self.active))
+
+        return description
+
+
 def isGDPRableMessage(message, userid):
     for user in message.mentions:
         if(str(user.id) == str(userid)):
@@ -0,0 +1,273 @@
+import ast
+import glob
+import importlib
+import logging
+import os
+import sys
+import time
+
+import commandRegistry
+import commands
+import config
+
+logger = logging.getLogger(__name__)
+
+ROLE_MESSAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rolemessages")
+
+# (mtime, size) of each command and role message file when it was last loaded, so reload_changed can tell what changed
+fileVersions = {}
+
+# The registrars a command module may decorate its functions with, applied in the order found (bottom up)
+REGISTRARS = {
+    "command": commandRegistry.command,
+    "reaction": commandRegistry.reaction,
+    "help_text": commandRegistry.help_text,
+    "restrictions": commandRegistry.restrictions,
+    "tag_reactables": commandRegistry.tag_reactables
+}
+
+# Stands in for a command module's function until the module is first used
+class LazyFunction:
+
+    def __init__(self, module_name, name):
+        self.module_name = module_name
+        self.__name__ = name
+
+    async def __call__(self, *args, **kwargs):
+        function = getattr(load_module(self.module_name), self.__name__)
+        return await function(*args, **kwargs)
+
+    def __repr__(self):
+        return "<LazyFunction(%s.%s)>" % (self.module_name, self.__name__)
+
+
+# Work out a decorator argument without running any code: a literal, a config setting (config.name) or a
+# lookup in one (config.name.get(...)). Raises ValueError for anything else.
+def static_value(node):
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "config":
+        if not hasattr(config, node.attr):
+            raise ValueError("config has no setting " + node.attr)
+        return getattr(config, node.attr)
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "get" and not node.keywords:
+        mapping = static_value(node.func.value)
+        if not isinstance(mapping, dict):
+            raise ValueError("Can only look things up in dicts")
+        return mapping.get(*[static_value(arg) for arg in node.args])
+
+    return ast.literal_eval(node)
+
+
+# Read a command module's registrations from its source, without importing it. Returns a list of
+# (function name, [(registrar name, args)]), or None if the decorators can't be worked out statically.
+def read_manifest(path):
+    with open(path, 'r') as fileHandler:
+        tree = ast.parse(fileHandler.read(), path)
+
+    manifest = []
+
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+
+        registrations = []
+        for decorator in reversed(node.decorator_list):
+            if not isinstance(decorator, ast.Call):
+                return None
+
+            name = decorator.func.attr if isinstance(decorator.func, ast.Attribute) else getattr(decorator.func, "id", None)
+            if name not in REGISTRARS:
+                return None
+
+            try:
+                # Arguments are literals, or things from config (e.g restricted server ids)
+                args = [static_value(arg) for arg in decorator.args]
+            except (ValueError, TypeError, SyntaxError):
+                return None
+
+            registrations.append((name, args))
+
+        if registrations:
+            manifest.append((node.name, registrations))
+
+    return manifest
+
+
+def module_path(module_name):
+    return os.path.join(os.path.dirname(commands.__file__), module_name + ".py")
+
+
+def file_version(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+def role_message_paths():
+    return glob.glob(os.path.join(ROLE_MESSAGES_DIR, "*.py"))
+
+
+# Register every command module, lazily where possible
+def register_all():
+    lazy = 0
+
+    for module_name in commands.__all__:
+        if register_module(module_name):
+            lazy += 1
+
+    for path in role_message_paths():
+        fileVersions[path] = file_version(path)
+
+    logger.debug(str(lazy) + " of " + str(len(commands.__all__)) + " command modules will be loaded on first use")
+
+
+# Register a command module's functions, returns whether it will be loaded on first use rather than imported now
+def register_module(module_name):
+    path = module_path(module_name)
+    fileVersions[path] = file_version(path)
+
+    manifest = read_manifest(path) if config.lazy_load_commands else None
+
+    if manifest is None:
+        load_module(module_name)
+        return False
+
+    for function_name, registrations in manifest:
+        function = LazyFunction(module_name, function_name)
+        for registrar_name, args in registrations:
+            REGISTRARS[registrar_name](*args)(function)
+
+    return True
+
+
+# Import a command module, which replaces its LazyFunctions with the real functions
+def load_module(module_name):
+    full_name = commands.__name__ + "." + module_name
+    module = sys.modules.get(full_name)
+    if module is not None:
+        return module
+
+    started = time.perf_counter()
+    module = importlib.import_module(full_name)
+
+    # The real functions registered their own restrictions, so forget the stand ins'
+    for function in [function for function in commandRegistry.restrictionsDict if isinstance(function, LazyFunction)
+                     and function.module_name == module_name]:
+        del commandRegistry.restrictionsDict[function]
+    commandRegistry.registry_changed()
+
+    logger.info("Loaded " + full_name + " in " + str(round((time.perf_counter() - started) * 1000)) + "ms")
+    return module
+
+
+def belongs_to(function, module_name):
+    if isinstance(function, LazyFunction):
+        return function.module_name == module_name
+
+    return getattr(function, "__module__", None) == commands.__name__ + "." + module_name
+
+
+# Remove everything a command module registered
+def unregister_module(module_name):
+    removed = set()
+
+    for registry in (commandRegistry.commandsDict, commandRegistry.reactionsDict, commandRegistry.tagReactablesDict):
+        for key, function in list(registry.items()):
+            if belongs_to(function, module_name):
+                removed.add(function)
+                del registry[key]
+
+    for function in [function for function in commandRegistry.restrictionsDict if belongs_to(function, module_name)]:
+        removed.add(function)
+        del commandRegistry.restrictionsDict[function]
+
+    for function in removed:
+        commandRegistry.help_texts.pop(function.__name__, None)
+
+
+def registries():
+    return (commandRegistry.commandsDict, commandRegistry.reactionsDict, commandRegistry.restrictionsDict,
+            commandRegistry.help_texts, commandRegistry.tagReactablesDict)
+
+
+# Swap one command module for the version on disk (or drop it, if its file is gone). The module is imported
+# straight away, so a broken module is found now rather than on first use, and if anything goes wrong the
+# registry is put back exactly as it was.
+def reload_module(module_name):
+    full_name = commands.__name__ + "." + module_name
+    path = module_path(module_name)
+    snapshot = [(registry, dict(registry)) for registry in registries()]
+    old_module = sys.modules.pop(full_name, None)
+    old_version = fileVersions.get(path)
+
+    try:
+        unregister_module(module_name)
+
+        if os.path.isfile(path):
+            fileVersions[path] = file_version(path)
+            importlib.import_module(full_name)
+        else:
+            fileVersions.pop(path, None)
+            if hasattr(commands, module_name):
+                delattr(commands, module_name)
+    except BaseException:
+        for registry, contents in snapshot:
+            registry.clear()
+            registry.update(contents)
+
+        sys.modules.pop(full_name, None)
+        if old_module is not None:
+            sys.modules[full_name] = old_module
+            setattr(commands, module_name, old_module)
+
+        fileVersions[path] = old_version
+        raise
+
+
+# Reload the role messages and command modules whose files changed since they were loaded, and pick up new
+# command modules. This runs without awaiting anything, so nothing else on the event loop can see the
+# registry part way through. Returns (names reloaded, {name: exception} for those which failed and were kept).
+def reload_changed():
+    reloaded = []
+    failed = {}
+
+    # Command modules hold these modules rather than their contents, so reloading them in place is enough
+    for path in role_message_paths():
+        version = file_version(path)
+        if version == fileVersions.get(path):
+            continue
+
+        name = "rolemessages." + os.path.basename(path)[:-3]
+        try:
+            if name in sys.modules:
+                importlib.reload(sys.modules[name])
+            fileVersions[path] = version
+            reloaded.append(name)
+        except Exception as e:
+            logger.exception(e)
+            failed[name] = e
+
+    # New modules are loaded, and deleted ones dropped
+    module_names = set(commands.__all__) | set(commands.find_modules())
+
+    for module_name in sorted(module_names):
+        path = module_path(module_name)
+        if file_version(path) == fileVersions.get(path):
+            continue
+
+        try:
+            reload_module(module_name)
+            reloaded.append(commands.__name__ + "." + module_name)
+        except Exception as e:
+            logger.exception(e)
+            failed[commands.__name__ + "." + module_name] = e
+
+    commands.__all__ = commands.find_modules()
+    commandRegistry.rebuild_reaction_matcher()
+    commandRegistry.registry_changed()
+
+    logger.info("Reloaded " + str(len(reloaded)) + " modules, " + str(len(failed)) + " failed")
+    return reloaded, failed
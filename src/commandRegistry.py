@@ -1,4 +1,5 @@
 from helpers import basicResponseHelpers
+from helpers.reactionHelpers import ReactionMatcher
 import config
 
 commandsDict={}
@@ -7,6 +8,15 @@ restrictionsDict={}
 help_texts = {}
 tagReactablesDict = {}
 
+# Every key in reactionsDict compiled into one matcher, rebuilt whenever a reaction is registered
+reactionMatcher = ReactionMatcher()
+
+# Help message chunks keyed by server id, cleared whenever anything is registered
+helpCache = {}
+
+# The commands usable in each server ({server id: {command name: function}}), cleared whenever anything is registered
+dispatchTables = {}
+
 __all__ = {}
 __all__["commands"] = commandsDict
 __all__["reactions"] = reactionsDict
@@ -15,7 +25,9 @@ __all__["tagreactables"] = tagReactablesDict
 
 def restrictions(*servers):
     def registrar(function):
-        restrictionsDict[function] = servers
+        restrictionsDict[function] = frozenset(servers)
+        registry_changed()
+        return function
 
     return registrar
 
@@ -23,6 +35,7 @@ def command(*commandNames):
     def registrar(function):
         for commandName in commandNames:
             commandsDict[commandName] = function
+        registry_changed()
         return function
 
     return registrar
@@ -31,13 +44,25 @@ def reaction(*reactionNames):
     def registrar(function):
         for reactionName in reactionNames:
             reactionsDict[reactionName] = function
+        rebuild_reaction_matcher()
+        registry_changed()
         return function
 
     return registrar
 
+def rebuild_reaction_matcher():
+    global reactionMatcher
+    reactionMatcher = ReactionMatcher(reactionsDict.keys())
+
+# Throw away anything derived from the registry, so it is rebuilt with the new registrations
+def registry_changed():
+    helpCache.clear()
+    dispatchTables.clear()
+
 def help_text(text):
     def registrar(function):
         help_texts[function.__name__] = text
+        registry_changed()
         return function
 
     return registrar
@@ -52,32 +77,56 @@ def get_help_message(server):
     helpData = {}
 
     # get help data (commands, their aliases, and their help text)
-    for given_command in commandsDict:
-        command_func = commandsDict[given_command]
-        function_name = commandsDict[given_command].__name__
-        
+    for given_command, command_func in commandsDict.items():
+        function_name = command_func.__name__
+        servers = restrictionsDict.get(command_func)
+
         # If help text exists for this command and the command is able to be used in the server
-        if function_name in help_texts.keys() and (restrictionsDict.get(command_func, None) is None or server in restrictionsDict.get(command_func, None)):
-            if not (function_name in helpData.keys()):
+        if function_name in help_texts and (servers is None or server in servers):
+            if function_name not in helpData:
                 helpData[function_name] = {"helpText": help_texts[function_name], "aliases": [given_command]}
             else:
                 helpData[function_name]["aliases"].append(given_command)
 
-    help_message = "Help for "+config.bot_name+":\n"
-    for the_command in sorted(helpData.keys()):
-        help_message += "- "
-        help_message += ", ".join(helpData[the_command]["aliases"])
-        help_message += ": " + helpData[the_command]["helpText"] + "\n"
+    lines = ["Help for " + config.bot_name + ":\n"]
+    for the_command in sorted(helpData):
+        lines.append("- " + ", ".join(helpData[the_command]["aliases"]) + ": " + helpData[the_command]["helpText"] + "\n")
 
-    return help_message
+    return "".join(lines)
 
+# Commands usable in a server, with restrictions already applied
+def get_dispatch_table(server):
+    table = dispatchTables.get(server)
 
-# Import all other commands and add them to the commands file
-from commands import *
+    if table is None:
+        table = dispatchTables[server] = {name: function for name, function in commandsDict.items()
+                                          if restrictionsDict.get(function) is None or server in restrictionsDict[function]}
+
+    return table
+
+# The help message for a server, already split into messages, built once per server
+def get_help_chunks(server):
+    chunks = helpCache.get(server)
+
+    if chunks is None:
+        chunks = helpCache[server] = [chunk for chunk in basicResponseHelpers.split_message(get_help_message(server))
+                                      if chunk.strip() != ""]
+
+    return chunks
+
+
+# Register all other commands from the commands folder. Modules are only imported when first used (see commandLoader).
+import commandLoader
+commandLoader.register_all()
 
 # Generate help text
 @help_text("This command will display help text.")
 @command("help")
 async def help(command, metadata, sendReply):
-    help_message = get_help_message(metadata["server"].id)
-    await basicResponseHelpers.send_in_stages(help_message, sendReply)
+    for chunk in get_help_chunks(metadata["server"].id):
+        await sendReply(chunk)
+
+# Registration is finished, so build dispatch tables and help for the servers we know about up front
+for server_id in config.servers.values():
+    get_dispatch_table(server_id)
+    get_help_chunks(server_id)
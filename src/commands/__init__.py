@@ -1,4 +1,9 @@
 from os.path import dirname, basename, isfile
 import glob
-modules = glob.glob(dirname(__file__)+"/**/*.py", recursive=True)
-__all__ = [ basename(f)[:-3] for f in modules if isfile(f) and not basename(f).startswith('_') and not f.endswith('__init__.py')]
+
+# The command modules currently in this folder (checked again when reloading commands)
+def find_modules():
+    modules = glob.glob(dirname(__file__)+"/**/*.py", recursive=True)
+    return [ basename(f)[:-3] for f in modules if isfile(f) and not basename(f).startswith('_') and not f.endswith('__init__.py')]
+
+__all__ = find_modules()
@@ -1,12 +1,12 @@
-import asyncio
 import logging
 
-import GDPRClient
-import apikeys
+import commandLoader
 import commandRegistry
 import config
-from helpers import managementHelpers
-from models import Session, TagReactables
+import gdprWorker
+import jobScheduler
+import reactableRegistry
+from helpers import managementHelpers, metricsHelpers
 from rolemessages import TMHCRoles, TestRoles
 
 logger = logging.getLogger(__name__)
@@ -51,6 +51,10 @@ async def vet(command_data, metadata, send_reply):
 @command("regenroles")
 @help_text("Regenerate the roles text")
 async def regenroles(command_data, metadata, send_reply):
+    return await start_job(metadata, "regenroles", lambda sendReply: regenerate_roles(metadata, sendReply), send_reply)
+
+
+async def regenerate_roles(metadata, send_reply):
     if metadata["server"].id == config.servers["TMHC"]:
         rolearray = TMHCRoles.rolearray
     elif metadata["server"].id == config.servers["Test"]:
@@ -63,10 +67,10 @@ async def regenroles(command_data, metadata, send_reply):
 
     await managementHelpers.clearChannel(channel)
 
+    # The channel's send queue paces these
     for element in rolearray:
         if isinstance(element, str):
             await send_reply(element)
-            await asyncio.sleep(1)
         elif isinstance(element, tuple):
             message = await send_reply(element[1])
             role = guild.get_role(int(element[0]))
@@ -75,7 +79,6 @@ async def regenroles(command_data, metadata, send_reply):
                 return await send_reply("An error occurred!")
 
             await do_add_role_reactable(message, role.id, metadata)
-            await asyncio.sleep(1)
 
 
 @restrictions(config.servers.get("TMHC"), config.servers.get("Test"))
@@ -110,21 +113,7 @@ async def do_add_role_reactable(message, roleid, metadata):
     emoji = "🔼"
     await message.add_reaction(emoji)
 
-    session = Session()
-    instance = session.query(TagReactables).filter_by(message_id=message.id).first()
-
-    if instance:
-        instance.function_name = "toggle_role"
-        instance.function_args = roleid
-    else:
-        instance = TagReactables(message_id=message.id, function_name="toggle_role", function_args=roleid)
-    session.add(instance)
-
-    try:
-        session.commit()
-    except Exception as e:
-        session.rollback()
-        logger.error("Unable to commit to database: {}", e)
+    await reactableRegistry.set_reactable(message.id, "toggle_role", roleid)
 
 
 @restrictions(config.servers.get("TMHC"), config.servers.get("Test"))
@@ -169,33 +158,103 @@ async def toggle_role(args, event_type, metadata):
             logger.exception(e)
 
 
+@restrictions(config.servers.get("TMHC"), config.servers.get("Test"))
+@command("logstats")
+@help_text("Show the edit/delete log queue depth and sent/dropped/failed counts for this server.")
+async def logstats(command_data, metadata, send_reply):
+    stats = metadata.get("client").log_pipeline.stats().get(metadata.get("server").id)
+
+    if stats is None:
+        return await send_reply("Nothing has been logged yet.")
+
+    return await send_reply("Log queue: " + str(stats["queued"]) + " queued, " + str(stats["sent"]) + " sent, " +
+                            str(stats["dropped"]) + " dropped, " + str(stats["failed"]) + " failed.")
+
+
+@restrictions(config.servers.get("TMHC"), config.servers.get("Test"))
+@command("stats")
+@help_text("Show call counts, errors and latencies, slowest first. Usage: 'stats [command|reaction|tag_reactable|event|rest]'.")
+async def stats(command_data, metadata, send_reply):
+    kind = command_data[1][0].lower() if command_data[1] else None
+    lines = metricsHelpers.describe(kind, limit=15)
+
+    if not lines:
+        return await send_reply("Nothing has been timed yet.")
+
+    return await send_reply("```\n" + "\n".join(lines) + "\n```")
+
+
+@restrictions(config.servers.get("TMHC"), config.servers.get("Test"))
+@command("reload")
+@help_text("Reload the command modules and role messages which have changed, without reconnecting.")
+async def reload_commands(command_data, metadata, send_reply):
+    reloaded, failed = commandLoader.reload_changed()
+
+    if not reloaded and not failed:
+        return await send_reply("Nothing has changed.")
+
+    lines = []
+    if reloaded:
+        lines.append("Reloaded: " + ", ".join(reloaded))
+    for name, error in failed.items():
+        lines.append("Failed to reload " + name + " (kept the old version): " + type(error).__name__ + ": " + str(error))
+
+    return await send_reply("\n".join(lines))
+
+
 @restrictions(config.servers.get("TMHC"), config.servers.get("Test"))
 @command("gdpr")
-@help_text("Compile GDPR data on a user. Usage: 'gdpr <userid>'.")
+@help_text("Compile GDPR data on a user. Usage: 'gdpr <userid> [jsonl]'.")
 async def get_gdpr(command_data, metadata, send_reply):
-    await send_reply("Booting up worker...")
-    client = GDPRClient.GDPRClient()
-    loop = asyncio.get_event_loop()
-    loop.create_task(client.start(apikeys.workerkey))
-    await client.wait_until_ready()
     userid = command_data[1][0]
     guildid = metadata["message"].guild.id
 
-    await client.getGDPR(userid, guildid, send_reply)
-    await client.logout()
+    jsonl = len(command_data[1]) > 1 and command_data[1][1].lower() == "jsonl"
+
+    return await start_job(metadata, "gdpr", lambda sendReply, started: gdprWorker.gdprWorker.submit(
+        "getGDPR", userid, guildid, sendReply, on_start=started, jsonl=jsonl), send_reply, queued=True)
 
 
 @restrictions(config.servers.get("TMHC"), config.servers.get("Test"))
 @command("gdprdelete")
 @help_text("Delete all messages sent by a user. Usage: 'gdprdelete <userid>'.")
 async def delete_gdpr(command_data, metadata, send_reply):
-    await send_reply("Booting up worker...")
-    client = GDPRClient.GDPRClient()
-    loop = asyncio.get_event_loop()
-    loop.create_task(client.start(apikeys.workerkey))
-    await client.wait_until_ready()
     userid = command_data[1][0]
     guildid = metadata["message"].guild.id
 
-    await client.deleteGDPR(userid, guildid, send_reply)
-    await client.logout()
+    return await start_job(metadata, "gdprdelete", lambda sendReply, started: gdprWorker.gdprWorker.submit(
+        "deleteGDPR", userid, guildid, sendReply, on_start=started), send_reply, queued=True)
+
+
+@restrictions(config.servers.get("TMHC"), config.servers.get("Test"))
+@command("jobs")
+@help_text("List this server's running, waiting and recently finished jobs (e.g regenroles, gdpr).")
+async def list_jobs(command_data, metadata, send_reply):
+    jobs = jobScheduler.jobScheduler.guild_jobs(metadata["server"].id)
+
+    if not jobs:
+        return await send_reply("No jobs have been run.")
+
+    return await send_reply("\n".join(job.describe() for job in jobs))
+
+
+@restrictions(config.servers.get("TMHC"), config.servers.get("Test"))
+@command("cancel")
+@help_text("Cancel a running or waiting job. Usage: 'cancel <job id>'.")
+async def cancel_job(command_data, metadata, send_reply):
+    if len(command_data[1]) < 1 or not command_data[1][0].lstrip("#").isdigit():
+        return await send_reply("Please specify a job id")
+
+    # The job reports its own cancellation
+    if not jobScheduler.jobScheduler.cancel(metadata["server"].id, int(command_data[1][0].lstrip("#"))):
+        return await send_reply("No running or waiting job with that id was found")
+
+
+# Run a long running command as a background job, so it can be listed and cancelled
+async def start_job(metadata, name, function, send_reply, queued=False):
+    try:
+        job = jobScheduler.jobScheduler.submit(metadata["server"].id, name, function, send_reply, queued=queued)
+    except jobScheduler.JobLimitError as e:
+        return await send_reply(str(e))
+
+    return await send_reply("Started job #" + str(job.id) + " (" + name + "), use 'cancel " + str(job.id) + "' to stop it.")
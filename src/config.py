@@ -28,6 +28,15 @@ log_channels = {
     servers["TMHC"]: 604787076021485589  # TMHC
 }
 
+# Optional webhook urls for log channels, keyed by guild id. Logging through a webhook lets up to 10
+# log entries share one message, and webhooks have their own rate limit.
+log_webhooks = {
+}
+
+# Log channel messages older than this many seconds are deleted, checked every log_retention_interval seconds
+log_retention = 86400
+log_retention_interval = 3600
+
 # A list of role ids who are approved to use commands, keyed by guild id
 approved_roles = {
     servers["Test"]: [roles["Test"]["Admin"]], # Test server
@@ -54,6 +63,13 @@ member_role = {
     servers["TMHC"]: roles["TMHC"]["Member"]
 }
 
+# Role reconciliation (runRoleAssign.py): every member should have the first role unless they have
+# the second, in which case they should not have the first.
+reconcile_roles = {
+    servers["TMHC"]: (roles["TMHC"]["Member"], roles["TMHC"]["404"])
+}
+reconcile_concurrency = 4
+
 roles_channel = {
     servers["TMHC"]: 616700269589430274,
     servers["Test"]: 616723907915022339
@@ -64,6 +80,52 @@ warning_channel = {
     servers["Test"]: 805068865322221619
 }
 
+# How many channels gdpr and gdprdelete scan at once, and the request rate they start at (this adapts to rate limits)
+gdpr_channel_concurrency = 4
+gdpr_requests_per_second = 10
+
+# gdpr commands run on a worker client (logged in with apikeys.workerkey) which stays connected once the first
+# gdpr command has logged it in. If set, it logs in when the bot starts instead (in every shard process).
+gdpr_worker_warm = False
+
+# How many recent messages in logged guilds are remembered, so their edits and deletes can be logged. Each takes
+# around 450 bytes (measured with 80 character messages), so this is about 64MB.
+message_store_size = 150000
+
+# Largest file we can upload to discord, and whether gdpr exports are gzipped (exports larger than this are split into parts)
+max_upload_size = 8 * 1000 * 1000
+gdpr_compress_exports = True
+
+# Keep a local index of who sent (and was mentioned in) each message, so gdpr commands can find a user's
+# messages without scanning every channel. Channels are backfilled when the bot starts.
+message_mirror_enabled = False
+
+# Register commands from their source and only import a command module when one of its commands is first used
+lazy_load_commands = True
+
+# Long running admin commands (regenroles, gdpr, gdprdelete) run as background jobs. At most job_concurrency run
+# at once, and jobs_per_guild in any one guild, with up to max_jobs_per_guild running or waiting. Jobs are
+# cancelled after job_timeout seconds, or their entry in job_timeouts.
+job_concurrency = 4
+jobs_per_guild = 2
+max_jobs_per_guild = 10
+job_timeout = 6 * 3600
+job_timeouts = {
+    "regenroles": 600
+}
+
+# Sharding (runSharded.py): the total number of shards, and how many processes to split them between. Each
+# process runs runDiscord.py for its range of shards, and is restarted this many seconds after it exits.
+# Leave shard_count as None to run unsharded.
+shard_count = None
+shard_processes = 1
+shard_restart_delay = 5
+
+# Serve command/event/REST call timings for Prometheus at http://metrics_host:metrics_port/metrics.
+# Leave metrics_port as None to not serve them (they are still available through the stats command).
+metrics_host = "127.0.0.1"
+metrics_port = None
+
 ROOT_DIR = os.path.dirname(sys.modules['__main__'].__file__)
 RESPONSE_DIR = os.path.join(ROOT_DIR, "responses")
 COMMAND_DIR = os.path.join(ROOT_DIR, "commands")
@@ -0,0 +1,150 @@
+import asyncio
+import datetime
+import heapq
+import logging
+
+from helpers import deletionHelpers
+from models import ScheduledDeletion, run_in_db
+
+logger = logging.getLogger(__name__)
+
+# Deletions due within this many seconds of the first are done along with it, so they can be bulk deleted
+BATCH_WINDOW = 1
+
+
+# Deletes messages once their time is up (sendReply's delete_after) without anyone waiting around for it.
+# Pending deletions are kept in a heap, ordered by when they are due, and in the database so they
+# survive a restart.
+class DeletionScheduler:
+
+    def __init__(self):
+        self.heap = []  # (due at, message id, channel id)
+        self.channels = {}  # channel id -> channel, for channels with deletions scheduled from this process
+        self.client = None
+        self.worker = None
+        self.wakeup = None
+
+    # Delete a message in delay seconds. Returns straight away.
+    def schedule(self, message, delay):
+        due = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+        guild_id = message.guild.id if message.guild is not None else None
+
+        self.channels[message.channel.id] = message.channel
+        self.push(due, message.id, message.channel.id)
+        asyncio.ensure_future(self.persist(message.id, message.channel.id, guild_id, due))
+
+    def push(self, due, message_id, channel_id):
+        earliest = self.heap[0][0] if self.heap else None
+        heapq.heappush(self.heap, (due, message_id, channel_id))
+
+        if self.worker is None:
+            self.wakeup = asyncio.Event()
+            self.worker = asyncio.ensure_future(self.run())
+        elif earliest is None or due < earliest:
+            self.wakeup.set()
+
+    async def persist(self, message_id, channel_id, guild_id, due):
+        try:
+            await run_in_db(storeDeletion, message_id, channel_id, guild_id, due)
+        except Exception as e:
+            logger.error("Unable to save scheduled deletion, it won't survive a restart: " + str(e))
+
+    # Pick up the deletions left by the last run, for the guilds this client is connected to
+    async def start(self, client):
+        self.client = client
+        scheduled = {message_id for due, message_id, channel_id in self.heap}
+        forgotten = []
+
+        for message_id, channel_id, guild_id, due in await run_in_db(loadDeletions):
+            if message_id in scheduled:
+                continue
+
+            # When sharded, other processes look after other guilds' deletions
+            if guild_id is not None and client.get_guild(guild_id) is None:
+                continue
+
+            if client.get_channel(channel_id) is None:
+                forgotten.append(message_id)
+                continue
+
+            self.push(due, message_id, channel_id)
+
+        if forgotten:
+            await run_in_db(removeDeletions, forgotten)
+
+        logger.debug(str(len(self.heap)) + " scheduled deletions pending")
+
+    async def run(self):
+        try:
+            while self.heap:
+                now = datetime.datetime.utcnow()
+                wait = (self.heap[0][0] - now).total_seconds()
+
+                if wait > 0:
+                    self.wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                cutoff = now + datetime.timedelta(seconds=BATCH_WINDOW)
+                batch = {}
+                while self.heap and self.heap[0][0] <= cutoff:
+                    due, message_id, channel_id = heapq.heappop(self.heap)
+                    batch.setdefault(channel_id, []).append(message_id)
+
+                await self.delete(batch)
+        finally:
+            self.worker = None
+
+    def get_channel(self, channel_id):
+        channel = self.client.get_channel(channel_id) if self.client is not None else None
+        return channel if channel is not None else self.channels.get(channel_id)
+
+    # Delete {channel id: [message ids]}, in bulk where discord allows
+    async def delete(self, batch):
+        for channel_id, message_ids in batch.items():
+            channel = self.get_channel(channel_id)
+
+            if channel is None:
+                logger.error("Unable to find channel " + str(channel_id) + " to delete " + str(len(message_ids)) + " messages")
+            else:
+                engine = deletionHelpers.DeletionEngine(channel)
+                try:
+                    await engine.add_all([channel.get_partial_message(message_id) for message_id in message_ids])
+                    await engine.flush_bulk()
+                except Exception as e:
+                    logger.error("Error deleting scheduled messages: " + str(e))
+
+            try:
+                await run_in_db(removeDeletions, message_ids)
+            except Exception as e:
+                logger.error("Unable to remove scheduled deletions: " + str(e))
+
+    def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+
+    def __len__(self):
+        return len(self.heap)
+
+
+def storeDeletion(session, message_id, channel_id, guild_id, due):
+    session.merge(ScheduledDeletion(message_id=str(message_id), channel_id=str(channel_id),
+                                    guild_id=None if guild_id is None else str(guild_id), due_at=due))
+
+
+def loadDeletions(session):
+    return [(int(row.message_id), int(row.channel_id), None if row.guild_id is None else int(row.guild_id), row.due_at)
+            for row in session.query(ScheduledDeletion)]
+
+
+def removeDeletions(session, message_ids):
+    session.query(ScheduledDeletion) \
+        .filter(ScheduledDeletion.message_id.in_([str(message_id) for message_id in message_ids])) \
+        .delete(synchronize_session=False)
+
+
+# Process wide scheduler, used by every sendReply
+deletionScheduler = DeletionScheduler()
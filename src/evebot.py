@@ -1,9 +1,8 @@
-from helpers import commandHelpers
+from helpers import commandHelpers, metricsHelpers
 import commandRegistry
-import re
 import config
 import logging
-from models import TagReactables, Session
+import reactableRegistry
 
 logger = logging.getLogger(__name__)
 
@@ -20,54 +19,54 @@ class EveBot:
         self.user = this_user
 
     async def read(self, message, metadata, send_reply):
-        all_commands = commandRegistry.commandsDict
         all_reactions = commandRegistry.reactionsDict
 
         if metadata.get("user").id != self.user.id:
-            # If this message is a command, read it
-            if commandHelpers.is_command(message):
-                command_name = commandHelpers.get_command(message)
-                
-                try:
-                    command_func = all_commands[command_name[0]]
-                    server = metadata.get("server")
-
-                    if self.has_permission_for_server(server, command_func):
-                        return await command_func(command_name, metadata, send_reply)
-
-                except KeyError as err:
-                    logger.debug("Couldn't find command " + str(err))
+            # If this message is a command this server can use, run it
+            command = commandHelpers.parse_command(message)
+
+            if command is not None:
+                command_func = commandRegistry.get_dispatch_table(metadata.get("server").id).get(command[0])
+
+                if command_func is not None:
+                    with metricsHelpers.timer("command", command_func.__name__):
+                        return await command_func(command, metadata, send_reply)
+
+                logger.debug("Couldn't find command " + command[0])
             
             # Scan message looking for content to react to
             return await self.do_reacts(all_reactions, message, metadata, send_reply)
 
     # React to things people say (not commands)
     async def do_reacts(self, all_reactions, message, metadata, send_reply):
-        for reaction in all_reactions:
-            if reaction in message.lower():
-                # calls the reaction function with the only argument being the message that triggered the reaction
-                return await all_reactions[reaction]([reaction, [message]], metadata, send_reply)
-            else:
-                regmatch = re.findall(reaction, message, re.IGNORECASE)
+        reaction = commandRegistry.reactionMatcher.match(message)
 
-                if regmatch:
-                    return await all_reactions[reaction]([reaction, [message]], metadata, send_reply)
+        if reaction is not None:
+            # calls the reaction function with the only argument being the message that triggered the reaction
+            with metricsHelpers.timer("reaction", reaction):
+                return await all_reactions[reaction]([reaction, [message]], metadata, send_reply)
 
     # Deal with users tagging messages with emojis
     async def do_tag_reacts(self, event_type, metadata):
         all_tag_reacts = commandRegistry.tagReactablesDict
 
-        session = Session()
-        reactable = session.query(TagReactables).filter_by(message_id=metadata.get("message").id).first()
+        reactable = reactableRegistry.get_reactable(metadata.get("message").id)
 
         if reactable is None:
             return
 
-        command = all_tag_reacts[reactable.function_name]
+        function_name, function_args = reactable
+        command = all_tag_reacts.get(function_name)
         server = metadata.get("server")
 
+        # The function may have been removed by reloading its module
+        if command is None:
+            logger.debug("Couldn't find tag reactable " + function_name)
+            return
+
         if self.has_permission_for_server(server, command):
-            return await command(reactable.function_args, event_type, metadata)
+            with metricsHelpers.timer("tag_reactable", function_name):
+                return await command(function_args, event_type, metadata)
 
     def has_permission_for_server(self, server, command):
         all_restrictions = commandRegistry.restrictionsDict
@@ -0,0 +1,198 @@
+# Replays a corpus of synthetic events through EveBot without discord, to measure how fast the dispatch and
+# reaction paths are (python runLocal.py --replay corpus.jsonl). Each line of the corpus is one JSON event:
+#
+#   {"type": "message", "id": 1, "content": ".ping", "user": 10, "server": 0, "channel": 0}
+#   {"type": "reaction_add", "message": 1, "user": 10, "server": 0, "channel": 0}   (or reaction_remove)
+#   {"type": "edit", "message": 1, "content": "new content"}
+#   {"type": "delete", "message": 1}
+#   {"type": "reactable", "message": 1, "function": "toggle_role", "args": "123"}   (marks a message as reactable)
+#
+# user, server and channel default to 0. Edits and deletes go through the same MessageStore as runDiscord.py.
+import asyncio
+import json
+import random
+import time
+from collections import namedtuple, defaultdict
+
+import evebot
+import metadata
+import reactableRegistry
+from helpers import logHelpers
+
+REPLAY_SERVICE_ID = 0
+
+# Just enough of discord's objects for metadata, the message store and simple commands
+FakeUser = namedtuple("FakeUser", ["id", "name", "display_name", "bot"])
+FakeGuild = namedtuple("FakeGuild", ["id", "name"])
+FakeChannel = namedtuple("FakeChannel", ["id", "name", "guild"])
+FakeMessage = namedtuple("FakeMessage", ["id", "content", "author", "channel", "guild", "attachments"])
+FakeReactionEvent = namedtuple("FakeReactionEvent", ["message_id", "user_id", "channel_id", "guild_id"])
+
+
+def read_corpus(path):
+    with open(path, 'r') as fileHandler:
+        return [json.loads(line) for line in fileHandler if line.strip() != ""]
+
+
+# A synthetic corpus: mostly chat, some commands, edits, deletes and reactions on a few reactable messages
+def generate_corpus(count, users=50, channels=5, seed=0):
+    generator = random.Random(seed)
+    words = ["hello", "the", "bot", "server", "role", "help", "thanks", "anyone", "here", "linux", "python", "lol"]
+    events = [{"type": "reactable", "message": message_id, "function": "toggle_role", "args": "0"} for message_id in range(1, 4)]
+    sent = []
+
+    for message_id in range(100, 100 + count):
+        user = generator.randrange(users)
+        channel = generator.randrange(channels)
+        roll = generator.random()
+
+        if roll < 0.1:
+            events.append({"type": "message", "id": message_id, "content": ".help", "user": user, "channel": channel})
+        elif roll < 0.15 and sent:
+            events.append({"type": "edit", "message": generator.choice(sent), "content": " ".join(generator.choices(words, k=8))})
+        elif roll < 0.2 and sent:
+            events.append({"type": "delete", "message": sent.pop(generator.randrange(len(sent)))})
+        elif roll < 0.25:
+            events.append({"type": generator.choice(["reaction_add", "reaction_remove"]), "message": generator.randrange(1, 4),
+                           "user": user, "channel": channel})
+        else:
+            events.append({"type": "message", "id": message_id, "content": " ".join(generator.choices(words, k=8)),
+                           "user": user, "channel": channel})
+            sent.append(message_id)
+
+    return events
+
+
+# Nearest rank percentile of an already sorted list
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+
+class ReplayReport:
+
+    def __init__(self, duration, latencies, errors, replies):
+        self.duration = duration
+        self.latencies = {event_type: sorted(values) for event_type, values in latencies.items()}
+        self.errors = errors
+        self.replies = replies
+
+    @property
+    def count(self):
+        return sum(len(values) for values in self.latencies.values())
+
+    @property
+    def throughput(self):
+        return self.count / self.duration if self.duration > 0 else 0.0
+
+    def describe(self):
+        every = sorted(latency for values in self.latencies.values() for latency in values)
+        lines = [str(self.count) + " events in " + str(round(self.duration, 3)) + "s (" + str(round(self.throughput)) +
+                 " events/s), " + str(self.replies) + " replies, " + str(sum(self.errors.values())) + " errors"]
+
+        for event_type, values in [("all", every)] + sorted(self.latencies.items()):
+            lines.append("  " + event_type + ": " + str(len(values)) + " events, p50 " +
+                         str(round(percentile(values, 0.5) * 1000, 3)) + "ms, p99 " +
+                         str(round(percentile(values, 0.99) * 1000, 3)) + "ms")
+
+        for error, count in sorted(self.errors.items()):
+            lines.append("  " + error + ": " + str(count))
+
+        return "\n".join(lines)
+
+
+# Drives EveBot with events as runDiscord.py would, recording replies instead of sending them
+class Replayer:
+
+    def __init__(self, eve=None):
+        self.eve = eve or evebot.EveBot(metadata.UserData(0, REPLAY_SERVICE_ID, "Eve"))
+        self.message_store = logHelpers.MessageStore()
+        self.replies = []
+
+    def build_reply(self, event):
+        async def sendReply(text, *args, **kwargs):
+            self.replies.append((event, text))
+        return sendReply
+
+    def build_metadata(self, message):
+        server = metadata.server_data(message.guild.id, REPLAY_SERVICE_ID, message.guild.name)
+        chat = metadata.chat_data(message.channel.id, server.id, message.channel.name, False)
+        user = metadata.UserData(message.author.id, REPLAY_SERVICE_ID, message.author.display_name)
+
+        return metadata.Metadata(service=None, user=user, server=server, chat=chat, message=message)
+
+    def build_message(self, event, message_id, content):
+        user_id = event.get("user", 0)
+        guild = FakeGuild(event.get("server", 0), "Replay Server")
+        channel = FakeChannel(event.get("channel", 0), "replay-" + str(event.get("channel", 0)), guild)
+        author = FakeUser(user_id, "user" + str(user_id), "User " + str(user_id), False)
+
+        return FakeMessage(message_id, content, author, channel, guild, ())
+
+    async def handle(self, event):
+        event_type = event["type"]
+
+        if event_type == "message":
+            message = self.build_message(event, event["id"], event["content"])
+            self.message_store.add(message)
+            await self.eve.read(message.content, self.build_metadata(message), self.build_reply(event))
+
+        elif event_type in ("reaction_add", "reaction_remove"):
+            # As in runDiscord.py, reactions on messages nobody registered are dropped first
+            if not reactableRegistry.is_reactable(event["message"]):
+                return
+
+            message = self.build_message(event, event["message"], "")
+            message_metadata = self.build_metadata(message)
+            message_metadata["event"] = FakeReactionEvent(message.id, message.author.id, message.channel.id, message.guild.id)
+            await self.eve.do_tag_reacts(event_type.upper(), message_metadata)
+
+        elif event_type == "edit":
+            before = self.message_store.get(event["message"])
+            if before is not None:
+                self.message_store.put(event["message"], before.edited({"content": event["content"]}))
+
+        elif event_type == "delete":
+            self.message_store.pop(event["message"])
+
+        elif event_type == "reactable":
+            reactableRegistry.reactablesDict[int(event["message"])] = (event["function"], event.get("args", ""))
+
+        else:
+            raise ValueError("Unknown event type " + event_type)
+
+    # Replays the events concurrently. With a rate (events per second) each event is started on schedule and its
+    # latency counts from when it should have started, so falling behind shows up in the latencies. Without
+    # one, events are replayed as fast as possible, at most concurrency at a time.
+    async def run(self, events, rate=None, concurrency=100):
+        loop = asyncio.get_event_loop()
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+
+        async def replay(event, scheduled):
+            async with semaphore:
+                started = scheduled if scheduled is not None else time.perf_counter()
+                try:
+                    await self.handle(event)
+                except Exception as e:
+                    errors[event["type"] + " " + type(e).__name__] += 1
+                latencies[event["type"]].append(time.perf_counter() - started)
+
+        tasks = []
+        started = time.perf_counter()
+
+        for index, event in enumerate(events):
+            scheduled = None
+            if rate:
+                scheduled = started + index / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            tasks.append(loop.create_task(replay(event, scheduled)))
+
+        await asyncio.gather(*tasks)
+
+        return ReplayReport(time.perf_counter() - started, latencies, errors, len(self.replies))
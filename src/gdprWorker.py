@@ -0,0 +1,183 @@
+import asyncio
+import logging
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+# The worker couldn't connect. Every waiting request has been told, so there is no need to report it again.
+class GDPRWorkerError(Exception):
+    reported = True
+
+
+# A gdpr or gdprdelete request waiting for (or being run by) the worker
+class GDPRJob:
+    __slots__ = ("method", "userid", "guildid", "sendReply", "kwargs", "on_start", "future", "task")
+
+    def __init__(self, method, userid, guildid, sendReply, kwargs, on_start=None):
+        self.method = method
+        self.userid = userid
+        self.guildid = guildid
+        self.sendReply = sendReply
+        self.kwargs = kwargs
+        self.on_start = on_start
+        self.future = asyncio.get_event_loop().create_future()
+        self.task = None
+
+        # Whoever submitted the job giving up on it stops it
+        self.future.add_done_callback(self.on_done)
+
+    def on_done(self, future):
+        if future.cancelled() and self.task is not None:
+            self.task.cancel()
+
+
+# One GDPRClient, logged in with the worker token and kept connected, which runs gdpr requests one at a time
+# from a queue. Progress goes to the sendReply of whoever asked.
+class GDPRWorker:
+
+    def __init__(self):
+        self.client = None
+        self.connection = None
+        self.queue = None
+        self.runner = None
+        self.current = None
+        self.completed = 0
+
+    # Start taking jobs, and log in now if config.gdpr_worker_warm is set (otherwise on the first job)
+    def start(self):
+        if self.runner is not None:
+            return
+
+        self.queue = asyncio.Queue()
+        self.runner = asyncio.ensure_future(self.run())
+
+        if config.gdpr_worker_warm:
+            asyncio.ensure_future(self.connect_warm())
+
+    async def connect_warm(self):
+        try:
+            await self.connect()
+        except GDPRWorkerError as e:
+            logger.error(str(e))
+
+    async def connect(self):
+        # Only needed once there's gdpr work to do, so runDiscord doesn't import them on startup
+        import apikeys
+        import GDPRClient
+
+        # discord.py reconnects by itself, so a new client is only needed if this one was closed (or never started)
+        if self.client is None or self.client.is_closed():
+            logger.info("Connecting the gdpr worker")
+            self.client = GDPRClient.GDPRClient(max_messages=None)  # it only reads history
+            self.connection = asyncio.ensure_future(self.client.start(apikeys.workerkey))
+
+        # If logging in or connecting fails, start() finishes without the client ever becoming ready
+        ready = asyncio.ensure_future(self.client.wait_until_ready())
+        await asyncio.wait([ready, self.connection], return_when=asyncio.FIRST_COMPLETED)
+
+        if ready.done():
+            return self.client
+
+        ready.cancel()
+        error = self.connection.exception() if not self.connection.cancelled() else None
+        client, self.client = self.client, None
+        if not client.is_closed():
+            await client.close()
+
+        raise GDPRWorkerError("Couldn't connect the gdpr worker" + (": " + str(error) if error is not None else "."))
+
+    # Run GDPRClient.<method>(userid, guildid, sendReply, **kwargs) on the worker, once the jobs ahead of it are done.
+    # on_start is called when the worker picks the request up.
+    async def submit(self, method, userid, guildid, sendReply, on_start=None, **kwargs):
+        self.start()
+
+        job = GDPRJob(method, userid, guildid, sendReply, kwargs, on_start)
+        waiting = self.queue.qsize() + (1 if self.current is not None else 0)
+        self.queue.put_nowait(job)
+
+        if waiting:
+            await sendReply("Queued behind " + str(waiting) + " other gdpr requests.")
+
+        return await job.future
+
+    async def run(self):
+        while True:
+            job = await self.queue.get()
+
+            # Cancelled while it was waiting
+            if job.future.done():
+                continue
+
+            self.current = job
+            try:
+                if job.on_start is not None:
+                    job.on_start()
+
+                try:
+                    client = await self.connect()
+                except GDPRWorkerError as e:
+                    logger.error(str(e))
+                    await self.fail_waiting(job, e)
+                    continue
+
+                # Cancelled (or timed out) while connecting
+                if job.future.done():
+                    continue
+
+                job.task = asyncio.ensure_future(getattr(client, job.method)(job.userid, job.guildid, job.sendReply, **job.kwargs))
+
+                # Wait without raising, so a cancelled job doesn't stop the worker
+                await asyncio.wait([job.task])
+
+                if not job.future.done():
+                    if job.task.cancelled():
+                        job.future.cancel()
+                    elif job.task.exception() is not None:
+                        job.future.set_exception(job.task.exception())
+                    else:
+                        job.future.set_result(job.task.result())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(e)
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self.current = None
+                self.completed += 1
+
+    # Fail a job and everything queued behind it, telling each requester why
+    async def fail_waiting(self, job, error):
+        jobs = [job]
+        while not self.queue.empty():
+            jobs.append(self.queue.get_nowait())
+
+        for waiting in jobs:
+            if waiting.future.done():
+                continue
+
+            try:
+                await waiting.sendReply(str(error))
+            except Exception as e:
+                logger.error("Couldn't report gdpr worker failure: " + str(e))
+            waiting.future.set_exception(error)
+
+    def __len__(self):
+        return (self.queue.qsize() if self.queue is not None else 0) + (1 if self.current is not None else 0)
+
+    async def stop(self):
+        if self.runner is not None:
+            self.runner.cancel()
+            self.runner = None
+
+        if self.current is not None and self.current.task is not None:
+            self.current.task.cancel()
+
+        if self.client is not None and not self.client.is_closed():
+            await self.client.close()
+
+
+# Process wide worker, used by the gdpr commands
+gdprWorker = GDPRWorker()
@@ -1,47 +1,89 @@
+import bisect
 import random
+import re
 from helpers import fileHelpers
 
 MAX_MESSAGE_SIZE = 2000
 
-# Send a message in different parts
-async def send_in_stages(message, sendReply):
-    counter = 0
+# Places a message can be split, in order of preference. Each is the position just after the match.
+SENTENCE_BREAK = re.compile(r"[.!?]\s+")
+LINE_BREAK = re.compile(r"\n")
+WORD_BREAK = re.compile(r"\s+")
+
+# Code blocks and mentions/channels/emoji, which should never be cut in half
+PROTECTED = re.compile(r"```.*?```|<(?:@[!&]?|#|a?:\w+:)\d+>", re.DOTALL)
+
+
+# Split a message into chunks of at most max_size characters, in one pass over the message
+def split_message(message, max_size=MAX_MESSAGE_SIZE):
+    if len(message) <= max_size:
+        return [message]
+
+    # Code blocks too big for one message have to be split anyway
+    protected = [match.span() for match in PROTECTED.finditer(message) if match.end() - match.start() <= max_size]
+    protected_starts = [span[0] for span in protected]
+
+    def breakpoints(pattern):
+        points = []
+        span = 0
+
+        for match in pattern.finditer(message):
+            point = match.end()
 
-    # The maximum number of characters to send in one message
-    breakMax = MAX_MESSAGE_SIZE
+            while span < len(protected) and protected[span][1] <= point:
+                span += 1
+            if span < len(protected) and protected[span][0] < point:
+                continue  # inside a protected span
 
-    while (counter+breakMax) < len(message):
-        breakpoint = breakMax
+            points.append(point)
 
-        # Best to break at the end of a sentence
-        for char in reversed(range(0, breakMax)):
-            if message[counter+char] == ".":
-                # Break at the first space after this full stop
-                print(message[counter+char:])
-                breakpoint = char+message[counter+char:].index(" ") + 1
-                print(breakpoint)
-                break
+        return points
 
-        print("passed ." + str(breakpoint))
+    preferences = [breakpoints(SENTENCE_BREAK), breakpoints(LINE_BREAK), breakpoints(WORD_BREAK)]
 
-        # If we cant break at the end of a sentence, break on the rightmost space we can find
-        if breakpoint == breakMax:
-            for char in reversed(range(0, breakMax)):
-                if message[counter+char] == " ":
-                    breakpoint = char + 1
-                    break
+    # The rightmost breakpoint of the most preferred kind, at or before end and after minimum
+    def find_break(end, minimum):
+        for points in preferences:
+            index = bisect.bisect_right(points, end) - 1
+            if index >= 0 and points[index] > minimum:
+                return points[index]
+        return None
 
-            # Else breakpoint == breakMax and we will just have to break at whatever is there
+    chunks = []
+    start = 0
 
-        await sendReply(message[counter:counter+breakpoint])
-        counter += breakpoint
+    while len(message) - start > max_size:
+        end = start + max_size
 
-    await sendReply(message[counter:])
+        # Prefer a good break which still fills at least half the message, then any break at all
+        point = find_break(end, start + max_size // 2) or find_break(end, start)
+
+        if point is None:
+            point = end
+
+            # Nowhere nice to break, but still don't cut a mention or code block in half
+            index = bisect.bisect_right(protected_starts, end) - 1
+            if index >= 0 and start < protected[index][0] and end < protected[index][1]:
+                point = protected[index][0]
+
+        chunks.append(message[start:point])
+        start = point
+
+    chunks.append(message[start:])
+    return chunks
+
+
+# Send a message in different parts
+async def send_in_stages(message, sendReply):
+    for chunk in split_message(message):
+        # Discord won't send a message which is just whitespace
+        if chunk.strip() != "":
+            await sendReply(chunk)
 
 
 # Get a random entry from a file, splitting on the delimiter given
 async def randomResponseCommand(command, metadata, filePath, delimiter=None):
-    lines = fileHelpers.parse_file_as_array(filePath, delimiter)
+    lines = fileHelpers.get_corpus(filePath, delimiter)
     index = random.randint(0,len(lines)-1)
     chosenLine = lines[index]
 
@@ -53,7 +95,7 @@ async def chosenResponseCommand(command, metadata, filePath, delimiter=None):
     if(len(command[1]) > 0):
         if (command[1][0].isdigit() and int(command[1][0]) > 0):
             selection = int(command[1][0])
-            lines = fileHelpers.parse_file_as_array(filePath, delimiter)
+            lines = fileHelpers.get_corpus(filePath, delimiter)
 
             if(selection <= len(lines)):
                 return lines[selection-1]
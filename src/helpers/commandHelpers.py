@@ -8,12 +8,21 @@ def is_command(string):
     return (string[0] == "." or string[0] == "/") and (".." not in string) and (len(string) > 1)
 
 
+# Everything which isn't allowed in a command name
+INVALID_COMMAND_CHARACTERS = re.compile(r"[^a-z0-9]")
+
 # Get a command and its arguments from a string. the command (case insensitive, alphanumeric) is element [0] and
 # element [1] is the list of arguments (case sensitive, any characters)
 def get_command(string):
-    valid_characters = "abcdefghijklmnopqrstuvwxyz1234567890"
     command = string.split(" ")
-    return [''.join([char for char in command[0][1:].lower() if char in valid_characters]), [arg.strip() for arg in command[1:] if arg.strip() != ""]]
+    return [INVALID_COMMAND_CHARACTERS.sub("", command[0][1:].lower()), [arg.strip() for arg in command[1:] if arg.strip() != ""]]
+
+# The command and arguments (as get_command) if a string is a command, otherwise None
+def parse_command(string):
+    if not is_command(string):
+        return None
+
+    return get_command(string)
 
 def get_arg_string(command):
     return " ".join(command)
@@ -0,0 +1,113 @@
+import datetime
+import logging
+import time
+
+import discord
+
+from helpers import rateHelpers
+
+logger = logging.getLogger(__name__)
+
+# Discord only bulk deletes messages younger than 14 days. Leave a margin so a message doesn't age out
+# between being queued and its batch being sent.
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14) - datetime.timedelta(hours=1)
+
+# Most messages discord will bulk delete in one request
+BULK_DELETE_SIZE = 100
+
+
+# Deletes messages from one channel as fast as discord allows. Messages are split by age (read from their
+# snowflake ids) as they are added: young ones are bulk deleted 100 at a time, and old ones are deleted one
+# at a time, with both paced by a token bucket which responds to rate limits instead of fixed sleeps.
+class DeletionEngine:
+
+    def __init__(self, channel, bulk_bucket=None, single_bucket=None):
+        self.channel = channel
+        self.bulk_bucket = bulk_bucket if bulk_bucket is not None else rateHelpers.TokenBucket(rate=1.0, max_rate=5.0)
+        self.single_bucket = single_bucket if single_bucket is not None else rateHelpers.TokenBucket(rate=2.0, max_rate=10.0)
+        self.bulk_queue = []
+
+        self.started = time.monotonic()
+        self.deleted_in_bulk = 0
+        self.deleted_singly = 0
+        self.failed = 0
+
+    def is_bulk_deletable(self, message):
+        cutoff = discord.utils.time_snowflake(datetime.datetime.utcnow() - BULK_DELETE_MAX_AGE)
+        return message.id > cutoff
+
+    async def add(self, message):
+        if self.is_bulk_deletable(message):
+            self.bulk_queue.append(message)
+
+            if len(self.bulk_queue) >= BULK_DELETE_SIZE:
+                await self.flush_bulk()
+        else:
+            await self.delete_single(message)
+
+    async def add_all(self, messages):
+        for message in messages:
+            await self.add(message)
+
+    async def flush_bulk(self):
+        batch, self.bulk_queue = self.bulk_queue, []
+
+        # Anything which aged out while it was queued has to go one at a time
+        stale = [message for message in batch if not self.is_bulk_deletable(message)]
+        batch = [message for message in batch if self.is_bulk_deletable(message)]
+
+        for message in stale:
+            await self.delete_single(message)
+
+        if len(batch) == 0:
+            return
+
+        # Bulk deleting needs at least 2 messages
+        if len(batch) == 1:
+            return await self.delete_single(batch[0])
+
+        try:
+            await self.bulk_bucket.call(self.channel.delete_messages, batch)
+            self.deleted_in_bulk += len(batch)
+        except discord.HTTPException as e:
+            logger.error("Error bulk deleting messages, deleting this batch one at a time: " + str(e))
+            for message in batch:
+                await self.delete_single(message)
+
+    async def delete_single(self, message):
+        try:
+            await self.single_bucket.call(message.delete)
+            self.deleted_singly += 1
+        except discord.NotFound:
+            pass  # someone got there first
+        except discord.HTTPException as e:
+            self.failed += 1
+            logger.error("Error deleting message: " + str(e))
+
+    # Delete anything still queued and report how it went
+    async def finish(self):
+        await self.flush_bulk()
+
+        logger.info(self.describe())
+        return self
+
+    @property
+    def deleted(self):
+        return self.deleted_in_bulk + self.deleted_singly
+
+    def describe(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.deleted / elapsed if elapsed > 0 else 0
+
+        return "Deleted " + str(self.deleted) + " messages from #" + str(self.channel) + " (" + \
+               str(self.deleted_in_bulk) + " in bulk, " + str(self.deleted_singly) + " one at a time, " + \
+               str(self.failed) + " failed) in " + str(round(elapsed, 1)) + "s, " + str(round(rate, 1)) + " messages/s"
+
+    # Use as a context manager to have discord.py's rate limit warnings slow the engine down
+    def __enter__(self):
+        rateHelpers.rateLimitListener.buckets.update((self.bulk_bucket, self.single_bucket))
+        return self
+
+    def __exit__(self, *args):
+        rateHelpers.rateLimitListener.buckets.discard(self.bulk_bucket)
+        rateHelpers.rateLimitListener.buckets.discard(self.single_bucket)
@@ -3,6 +3,8 @@ import string
 import asyncio
 import logging
 import config
+import deletionScheduler
+from helpers import sendHelpers
 
 logger = logging.getLogger(__name__)
 
@@ -20,34 +22,56 @@ else:
                         datefmt='%Y-%m-%d %H:%M:%S')
 
 
-def buildOnDeleteLogEmbed(message):
+# Log embeds are built from LoggedMessage records (see logHelpers.MessageStore) rather than discord Messages,
+# so they work for messages discord.py no longer has cached.
+def buildOnDeleteLogEmbed(message, channelName):
     embed = discord.Embed(title="Message Deleted",
                           type="rich",
                           description=string.Template("A message from $author was deleted from #$channel").substitute(
-                              author=message.author.name,
-                              channel=message.channel.name),
+                              author=message.author_name,
+                              channel=channelName),
                           colour=0xff0000)
 
-    if (message.content == ""):
-        message.content = "None"
-
-    addContextToLogEmbed(embed, message.author.id, message.channel.id)
-    addMessageToLogEmbed(embed, "Content", message.content, message.created_at, message.attachments)
+    addContextToLogEmbed(embed, message.author_id, message.channel_id)
+    addMessageToLogEmbed(embed, "Content", message.content or "None", message.timestamp, message.attachment_urls)
 
     return embed
 
 
-def buildOnEditLogEmbed(beforeMessage, afterMessage):
+def buildOnEditLogEmbed(beforeMessage, afterMessage, channelName):
     embed = discord.Embed(title="Message Edited",
                           type="rich",
                           description=string.Template("A message from $author was edited in #$channel").substitute(
-                              author=beforeMessage.author.name,
-                              channel=beforeMessage.channel.name),
+                              author=beforeMessage.author_name,
+                              channel=channelName),
                           colour=0xffff00)
 
-    addContextToLogEmbed(embed, beforeMessage.author.id, beforeMessage.channel.id)
-    addMessageToLogEmbed(embed, "Original message", beforeMessage.content, beforeMessage.created_at, beforeMessage.attachments)
-    addMessageToLogEmbed(embed, "Edited message", afterMessage.content, afterMessage.edited_at, afterMessage.attachments)
+    addContextToLogEmbed(embed, beforeMessage.author_id, beforeMessage.channel_id)
+    addMessageToLogEmbed(embed, "Original message", beforeMessage.content or "None", beforeMessage.timestamp, beforeMessage.attachment_urls)
+    addMessageToLogEmbed(embed, "Edited message", afterMessage.content or "None", afterMessage.timestamp, afterMessage.attachment_urls)
+
+    return embed
+
+
+def buildOnBulkDeleteLogEmbed(channel, messageCount, loggedMessages):
+    embed = discord.Embed(title="Messages Bulk Deleted",
+                          type="rich",
+                          description=string.Template("$count messages were deleted from #$channel").substitute(
+                              count=messageCount,
+                              channel=channel.name),
+                          colour=0xff0000)
+
+    embed.add_field(name="Channel", value="<#" + str(channel.id) + ">", inline=False)
+
+    # Only messages we still had stored can be attributed to a user
+    authors = {}
+    for message in loggedMessages:
+        authors[message.author_id] = authors.get(message.author_id, 0) + 1
+
+    if (len(authors) > 0):
+        breakdown = "\n".join("<@" + str(authorID) + ">: " + str(count) for authorID, count in
+                              sorted(authors.items(), key=lambda item: item[1], reverse=True)[:20])
+        embed.add_field(name="Authors (stored messages only)", value=breakdown, inline=False)
 
     return embed
 
@@ -58,58 +82,56 @@ def addContextToLogEmbed(embed, authorID, channelID):
     embed.add_field(name="Channel", value="<#" + str(channelID) + ">", inline=False)
 
 
-def addMessageToLogEmbed(embed, name, content, timestamp, attachments):
+def addMessageToLogEmbed(embed, name, content, timestamp, attachmentUrls):
     embed.add_field(name=name, value=content, inline=False)
     embed.add_field(name="Timestamp", value=str(timestamp), inline=False)
 
-    if (len(attachments) > 0):
-        for attachment in attachments:
-            embed.add_field(name="Attachment", value=attachment.proxy_url + "\n", inline=False)
+    for attachmentUrl in attachmentUrls:
+        embed.add_field(name="Attachment", value=attachmentUrl + "\n", inline=False)
 
 
 # Processes messages from commands and handles errors.
 def buildSendReply(message):
-    async def sendReply(text, edit=False, append=False, delete_after=None, file=None, **kwargs):
-        # Attempts to send a message up to MAX_RETRY times because sometimes discord is rubbish
-        MAX_RETRY = 3
-
-        async def attempt(count=0):
-            if (count < MAX_RETRY):
-                try:
-                    if (edit):
-                        return await edit.edit(content=text)
-                    elif (append):
-                        return await append.edit(content=message.content + text)
-                    elif (file):
-                        return await message.channel.send(text, file=discord.File(file))
-
-                    return await message.channel.send(text)
-                except discord.Forbidden as e:
-                    logger.error("Cannot send message - permission forbidden! " + str(e))
-                except discord.HTTPException as e:
-                    logger.warning("Failed to send or edit message. " + str(e))
-                    return await attempt(count + 1)
-
+    # Everything goes through the channel's send queue, which paces, prioritises and retries it (see sendHelpers)
+    async def sendReply(text, edit=False, append=False, delete_after=None, file=None, priority=None, **kwargs):
+        if text == "":
             return None
 
-        if text != "":
-            del_message = await attempt()
+        try:
+            if (edit or append):
+                # Edits are usually progress updates, so replies to other commands go first
+                target = edit or append
+                content = text if edit else message.content + text
+                sent = await sendHelpers.get_send_queue(target.channel).edit(
+                    target, content, priority=sendHelpers.PROGRESS if priority is None else priority)
+            else:
+                fileArgs = {"file": file} if file else {}
+                sent = await sendHelpers.get_send_queue(message.channel).send(
+                    text, priority=sendHelpers.REPLY if priority is None else priority, **fileArgs)
+        except discord.Forbidden as e:
+            logger.error("Cannot send message - permission forbidden! " + str(e))
+            return None
+        except discord.HTTPException as e:
+            logger.warning("Failed to send or edit message. " + str(e))
+            return None
 
-            if (delete_after is not None and del_message is not None):
-                await asyncio.sleep(delete_after)
-                await del_message.delete()
-                return None
-            return del_message
-        return None
+        # Deleted later by the scheduler, so the command doesn't wait around for it
+        if (delete_after is not None and sent is not None):
+            deletionScheduler.deletionScheduler.schedule(sent, delete_after)
+            return None
+        return sent
 
     return sendReply
 
+# config.approved_roles as sets, for quick lookups
+approvedRoleSets = {guild: frozenset(roles) for guild, roles in config.approved_roles.items()}
+
 def hasApprovedRole(discordUser):
-    for role in discordUser.roles:
-        if role.id in config.approved_roles.get(discordUser.guild.id, []):
-            return True
+    approvedRoles = approvedRoleSets.get(discordUser.guild.id)
+    if not approvedRoles:
+        return False
 
-    return False
+    return not approvedRoles.isdisjoint(role.id for role in discordUser.roles)
 
 def shouldProcessMessage(message):
     # runs only on debug channels if debug is enabled.
@@ -0,0 +1,113 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from helpers import managementHelpers
+
+logger = logging.getLogger(__name__)
+
+# Serialised messages are buffered up to this size, then handed to the writer thread in one go
+BUFFER_SIZE = 64 * 1024
+
+# Room left in each part for the gzip trailer and any compression overhead on incompressible data
+PART_SLACK = 16 * 1024
+
+# File writes happen here, in order, so they never block the event loop
+export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+
+
+# Streams messages into one or more (optionally gzipped) files, each small enough to upload to discord.
+# Every export gets its own files, so concurrent exports don't overwrite each other.
+class GDPRExporter:
+
+    def __init__(self, userid, directory="gdprdata", jsonl=False, compress=None, part_size=None):
+        self.jsonl = jsonl
+        self.compress = config.gdpr_compress_exports if compress is None else compress
+        self.part_size = config.max_upload_size if part_size is None else part_size
+        self.directory = directory
+        self.basename = "gdpr-" + str(userid) + "-" + uuid.uuid4().hex[:8]
+
+        self.buffer = []
+        self.buffered = 0
+        self.parts = []
+        self.raw_file = None
+        self.file = None
+        self.count = 0
+
+    async def write(self, message):
+        if self.jsonl:
+            entry = json.dumps(managementHelpers.messageToDict(message)) + "\n"
+        else:
+            entry = managementHelpers.messageToString(message)
+
+        entry = entry.encode("utf-8")
+        self.buffer.append(entry)
+        self.buffered += len(entry)
+        self.count += 1
+
+        if self.buffered >= BUFFER_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        data, self.buffer, self.buffered = b"".join(self.buffer), [], 0
+
+        if len(data) > 0:
+            await asyncio.get_event_loop().run_in_executor(export_executor, self.write_chunk, data)
+
+    # Returns the paths of every part written
+    async def close(self):
+        await self.flush()
+        await asyncio.get_event_loop().run_in_executor(export_executor, self.close_part)
+
+        return self.parts
+
+    # Remove the files once they have been delivered, so gdpr data doesn't sit around on disk
+    async def remove(self):
+        def removeParts():
+            for part in self.parts:
+                try:
+                    os.remove(part)
+                except OSError as e:
+                    logger.error("Unable to remove export " + part + ": " + str(e))
+
+        await asyncio.get_event_loop().run_in_executor(export_executor, removeParts)
+
+    # The methods below run on the export thread
+
+    def write_chunk(self, data):
+        # Start a new part if this chunk could take the current one over the upload limit
+        if self.raw_file is None or self.raw_file.tell() + len(data) + PART_SLACK > self.part_size:
+            self.close_part()
+            self.open_part()
+
+        self.file.write(data)
+
+        # Flush the compressor so the size on disk is accurate for the check above
+        self.file.flush()
+
+    def open_part(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+        extension = ".jsonl" if self.jsonl else ".txt"
+        if self.compress:
+            extension += ".gz"
+
+        path = os.path.join(self.directory, self.basename + "-part" + str(len(self.parts) + 1) + extension)
+        self.parts.append(path)
+
+        self.raw_file = open(path, "wb")
+        self.file = gzip.GzipFile(fileobj=self.raw_file, mode="wb") if self.compress else self.raw_file
+
+    def close_part(self):
+        if self.file is None:
+            return
+
+        if self.file is not self.raw_file:
+            self.file.close()
+        self.raw_file.close()
+        self.file = self.raw_file = None
@@ -1,3 +1,15 @@
+import bisect
+import mmap
+import os
+from array import array
+
+# Response files at least this big are indexed rather than read into memory
+INDEX_THRESHOLD = 1024 * 1024
+
+# Parsed response files keyed by (path, delimiter), each stored with the (mtime, size) it was parsed at
+corpora = {}
+
+
 # Take a file and read it into an array splitting on a given delimiter
 def parse_file_as_array(file, delimiter=None):
 
@@ -14,6 +26,133 @@ def parse_file_as_array(file, delimiter=None):
     return file_array
 
 
+# Get the entries of a response file (as parse_file_as_array would split them), parsing the file only when
+# it has changed. Small files are kept as a list; big ones as an IndexedFile, which reads entries on demand.
+# Either way the result supports len() and indexing.
+def get_corpus(file, delimiter=None):
+    stat = os.stat(file)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = corpora.get((file, delimiter))
+
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    if cached is not None and isinstance(cached[1], IndexedFile):
+        cached[1].close()
+
+    if stat.st_size >= INDEX_THRESHOLD:
+        corpus = IndexedFile(file, delimiter)
+    else:
+        corpus = parse_file_as_array(file, delimiter)
+
+    corpora[(file, delimiter)] = (version, corpus)
+    return corpus
+
+
+# A memory mapped response file with the byte offsets of each entry, so picking an entry only reads that entry
+class IndexedFile:
+
+    def __init__(self, file, delimiter=None):
+        with open(file, 'rb') as fileHandler:
+            self.map = mmap.mmap(fileHandler.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Entry offsets. Without a delimiter these are file offsets, otherwise they are offsets into the file
+        # with comments and blank lines removed (see spans).
+        self.starts = array('q')
+        self.ends = array('q')
+
+        # Runs of kept lines: where each starts in that filtered stream, and in the file
+        self.span_starts = array('q')
+        self.span_file_starts = array('q')
+
+        if delimiter is None:
+            self.index_lines()
+        else:
+            self.index_delimited(delimiter.encode('utf-8'))
+
+    # Yields (start, end) for every line which is not a comment or blank
+    def kept_lines(self):
+        position = 0
+        size = len(self.map)
+
+        while position < size:
+            newline = self.map.find(b"\n", position)
+            end = size if newline == -1 else newline + 1
+
+            line = self.map[position:end]
+            if not (line.strip() == b'' or line[0:2] == b"//"):
+                yield position, end
+
+            position = end
+
+    def index_lines(self):
+        for start, end in self.kept_lines():
+            self.starts.append(start)
+            self.ends.append(end)
+
+    def index_delimited(self, delimiter):
+        length = 0          # length of the filtered stream so far
+        search_from = 0     # stream offset where the next delimiter may start (matches don't overlap)
+        entry_start = 0
+        carry = b""         # the end of the stream, in case a delimiter spans two lines
+        last_file_end = -1
+
+        for start, end in self.kept_lines():
+            if start != last_file_end:
+                self.span_starts.append(length)
+                self.span_file_starts.append(start)
+            last_file_end = end
+
+            buffer = carry + self.map[start:end]
+            buffer_start = length - len(carry)
+
+            match = buffer.find(delimiter, max(0, search_from - buffer_start))
+            while match != -1:
+                self.starts.append(entry_start)
+                self.ends.append(buffer_start + match)
+                entry_start = search_from = buffer_start + match + len(delimiter)
+                match = buffer.find(delimiter, search_from - buffer_start)
+
+            length += end - start
+            carry = buffer[-(len(delimiter) - 1):] if len(delimiter) > 1 else b""
+
+        self.starts.append(entry_start)
+        self.ends.append(length)
+
+    def read(self, start, end):
+        if len(self.span_starts) == 0:
+            return self.map[start:end]
+
+        # Stitch the entry back together from the runs of kept lines it covers
+        data = []
+        span = bisect.bisect_right(self.span_starts, start) - 1
+
+        while start < end:
+            span_end = self.span_starts[span + 1] if span + 1 < len(self.span_starts) else end
+            file_start = self.span_file_starts[span] + start - self.span_starts[span]
+            read_end = min(end, span_end)
+
+            data.append(self.map[file_start:file_start + read_end - start])
+            start = read_end
+            span += 1
+
+        return b"".join(data)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("entry index out of range")
+
+        return self.read(self.starts[index], self.ends[index]).decode('utf-8', errors='replace').replace("\r\n", "\n")
+
+    def close(self):
+        self.map.close()
+
+
 # Determines whether a line is either blank or a comment
 def is_blank_or_comment(line):
     return line.strip() == '' or line[0:2] == "//"
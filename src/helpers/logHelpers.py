@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import random
+import sys
+from collections import OrderedDict
+
+import aiohttp
+import discord
+
+import config
+from helpers import metricsHelpers, sendHelpers
+
+logger = logging.getLogger(__name__)
+
+# Discord allows up to 10 embeds in one message
+MAX_EMBEDS_PER_MESSAGE = 10
+
+# Embeds waiting to be logged per guild. Anything past this is dropped (and counted) rather than
+# letting a spam wave eat memory.
+MAX_QUEUE_SIZE = 2000
+
+# How long to wait for more embeds to share a message with before sending a partial batch
+BATCH_WAIT = 0.5
+
+MAX_RETRY = 3
+
+
+# Whether a channel is its guild's log channel. Edits and deletes there (e.g log retention purging old entries)
+# aren't logged, as logging them would post into the channel being cleaned up.
+def is_log_channel(guild_id, channel_id):
+    return guild_id is not None and config.log_channels.get(int(guild_id)) == channel_id
+
+
+# Queues edit/delete log embeds per guild and sends them from a single worker per guild, so a burst of
+# events becomes a steady stream of sends instead of hundreds of concurrent requests on one bucket.
+class LogPipeline:
+
+    def __init__(self, client):
+        self.client = client
+        self.channels = {}  # guild id -> resolved log channel
+        self.webhooks = {}  # guild id -> log webhook, if one is configured
+        self.queues = {}
+        self.workers = {}
+        self.counters = {}
+        self.http_session = None
+
+    # Resolve the log channel for a guild once, then serve it from the index
+    def get_log_channel(self, guild):
+        channel = self.channels.get(guild.id)
+
+        if channel is None:
+            channel_id = config.log_channels.get(guild.id)
+            if channel_id is None:
+                return None
+
+            channel = guild.get_channel(channel_id)
+            if channel is not None:
+                self.channels[guild.id] = channel
+
+        return channel
+
+    # Forget resolved channels (e.g when channels are deleted or changed)
+    def invalidate(self, guild_id=None):
+        if guild_id is None:
+            self.channels.clear()
+        else:
+            self.channels.pop(guild_id, None)
+
+    def get_webhook(self, guild):
+        if guild.id in self.webhooks:
+            return self.webhooks[guild.id]
+
+        webhook = None
+        url = config.log_webhooks.get(guild.id)
+
+        if url is not None:
+            if self.http_session is None:
+                self.http_session = aiohttp.ClientSession()
+            webhook = discord.Webhook.from_url(url, adapter=discord.AsyncWebhookAdapter(self.http_session))
+
+        self.webhooks[guild.id] = webhook
+        return webhook
+
+    # Queue an embed to be posted in the guild's log channel. Never blocks.
+    def log(self, guild, embed):
+        if config.log_channels.get(guild.id) is None:
+            return
+
+        counters = self.get_counters(guild.id)
+        queue = self.queues.get(guild.id)
+
+        if queue is None:
+            queue = self.queues[guild.id] = asyncio.Queue(maxsize=MAX_QUEUE_SIZE)
+            self.workers[guild.id] = asyncio.ensure_future(self.run_worker(guild, queue))
+
+        try:
+            queue.put_nowait(embed)
+        except asyncio.QueueFull:
+            counters["dropped"] += 1
+            logger.warning("Log queue for " + str(guild.id) + " is full, dropping log entry")
+
+    def get_counters(self, guild_id):
+        counters = self.counters.get(guild_id)
+
+        if counters is None:
+            counters = self.counters[guild_id] = {"sent": 0, "dropped": 0, "failed": 0}
+
+        return counters
+
+    async def run_worker(self, guild, queue):
+        while True:
+            batch = [await queue.get()]
+
+            # Only webhooks can carry more than one embed per message, so only wait around for a batch when we have one
+            if self.get_webhook(guild) is not None:
+                loop = asyncio.get_event_loop()
+                deadline = loop.time() + BATCH_WAIT
+
+                while len(batch) < MAX_EMBEDS_PER_MESSAGE:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+            try:
+                await self.send_batch(guild, batch)
+            except Exception as e:
+                logger.error("Unexpected error sending log entries: " + str(e))
+                self.get_counters(guild.id)["failed"] += len(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def send_batch(self, guild, batch):
+        counters = self.get_counters(guild.id)
+        webhook = self.get_webhook(guild)
+
+        if webhook is not None:
+            sends = [batch]
+        else:
+            channel = self.get_log_channel(guild)
+            if channel is None:
+                logger.error("Unable to find log channel for " + str(guild.id))
+                counters["failed"] += len(batch)
+                return
+            sends = [[embed] for embed in batch]
+
+        for embeds in sends:
+            for count in range(MAX_RETRY):
+                try:
+                    if webhook is not None:
+                        with metricsHelpers.timer("rest", "log_webhook"):
+                            await webhook.send(embeds=embeds, username=config.bot_name)
+                    else:
+                        # Through the log channel's send queue, behind any replies to commands used there.
+                        # This loop already retries, so the queue doesn't.
+                        await sendHelpers.get_send_queue(channel).send(None, embed=embeds[0], priority=sendHelpers.LOG,
+                                                                       max_attempts=1)
+                    counters["sent"] += len(embeds)
+                    break
+                except discord.Forbidden as e:
+                    logger.error("Do not have permissions to log message. " + str(e))
+                    counters["failed"] += len(embeds)
+                    break
+                except discord.HTTPException as e:
+                    logger.warning("Could not log message. " + str(e))
+                    # discord.py already waits out 429s, so this is for other failures (e.g 5xx)
+                    await asyncio.sleep((2 ** count) + random.random())
+            else:
+                counters["failed"] += len(embeds)
+
+    # Queue depth and counters per guild
+    def stats(self):
+        return {guild_id: dict(counters, queued=self.queues[guild_id].qsize() if guild_id in self.queues else 0)
+                for guild_id, counters in self.counters.items()}
+
+    async def close(self):
+        for worker in self.workers.values():
+            worker.cancel()
+
+        if self.http_session is not None:
+            await self.http_session.close()
+
+
+# The parts of a message needed to log its edit or deletion, and nothing else
+class LoggedMessage:
+    __slots__ = ("message_id", "author_id", "author_name", "channel_id", "content", "attachment_urls", "edited_at")
+
+    def __init__(self, message_id, author_id, author_name, channel_id, content, attachment_urls=(), edited_at=None):
+        self.message_id = message_id
+        self.author_id = author_id
+        self.author_name = sys.intern(author_name)  # the same few authors post most messages
+        self.channel_id = channel_id
+        self.content = content
+        self.attachment_urls = attachment_urls
+        self.edited_at = edited_at
+
+    @classmethod
+    def from_message(cls, message):
+        return cls(message.id, message.author.id, message.author.name, message.channel.id, message.content,
+                   tuple(attachment.proxy_url for attachment in message.attachments))
+
+    # A copy of this message after a raw edit event (payload.data is the partial message from the gateway)
+    def edited(self, data):
+        if "attachments" in data:
+            attachment_urls = tuple(attachment["proxy_url"] for attachment in data["attachments"])
+        else:
+            attachment_urls = self.attachment_urls
+
+        edited_at = discord.utils.parse_time(data.get("edited_timestamp"))
+
+        return LoggedMessage(self.message_id, self.author_id, self.author_name, self.channel_id,
+                             data.get("content", self.content), attachment_urls, edited_at)
+
+    # When the message was sent, or last edited. The creation time is encoded in the id so isn't stored.
+    @property
+    def timestamp(self):
+        if self.edited_at is not None:
+            return self.edited_at
+        return discord.utils.snowflake_time(self.message_id)
+
+
+# A bounded, least recently used store of LoggedMessages keyed by message id (config.message_store_size by default)
+class MessageStore:
+
+    def __init__(self, max_size=None):
+        self.max_size = config.message_store_size if max_size is None else max_size
+        self.messages = OrderedDict()
+
+    def add(self, message):
+        self.put(message.id, LoggedMessage.from_message(message))
+
+    def put(self, message_id, loggedMessage):
+        self.messages[message_id] = loggedMessage
+        self.messages.move_to_end(message_id)
+
+        if len(self.messages) > self.max_size:
+            self.messages.popitem(last=False)
+
+    def get(self, message_id):
+        return self.messages.get(message_id)
+
+    def pop(self, message_id):
+        return self.messages.pop(message_id, None)
+
+    def __len__(self):
+        return len(self.messages)
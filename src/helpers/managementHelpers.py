@@ -1,6 +1,7 @@
 import logging
-import asyncio
 import config
+import messageMirror
+from helpers import deletionHelpers
 
 logger = logging.getLogger(__name__)
 
@@ -11,67 +12,32 @@ else:
     logging.basicConfig(level=logging.INFO)
 
 async def clearChannel(channel):
-    message_list = []
-    messg_count = 0
+    with deletionHelpers.DeletionEngine(channel) as engine:
+        async for message in channel.history(limit=None):
+            await engine.add(message)
 
-    async for message in channel.history(limit=None):
-        message_list.append(message)
-        messg_count += 1
-        
-        if len(message_list) == 99:
-            await doBulkDelete(message_list, channel)
-            message_list = []
-
-    await doBulkDelete(message_list, channel)
+        return await engine.finish()
 
 async def clearChannelOfUser(channel, userid):
-    message_list = []
-    messg_count = 0
+    # If the message mirror knows which messages are the user's, delete just those without paging the history
+    index = await messageMirror.messageMirror.find_messages(channel.guild, userid, include_mentions=False)
+    if index is not None:
+        message_ids = index.get(channel.id, [])
+        return await bulkDeleteAll([channel.get_partial_message(message_id) for message_id in message_ids], channel)
 
-    async for message in channel.history(limit=None):
-        if(userPostedMessage(message,userid)):
-            message_list.append(message)
-            messg_count += 1
-            
-            if len(message_list) == 99:
-                await doBulkDelete(message_list, channel)
-                message_list = []
+    with deletionHelpers.DeletionEngine(channel) as engine:
+        async for message in channel.history(limit=None):
+            if(userPostedMessage(message,userid)):
+                await engine.add(message)
 
-    await doBulkDelete(message_list, channel)
+        return await engine.finish()
 
 
 async def bulkDeleteAll(messages, channel):
-    message_list = []
-    messg_count = 0
-
-    for message in messages:
-        message_list.append(message)
-        messg_count += 1
-        
-        if len(message_list) == 99:
-            await doBulkDelete(message_list, channel)
-            message_list = []
-
-    await doBulkDelete(message_list, channel)
-
-async def doBulkDelete(message_list, channel):
-    try:
-        await channel.delete_messages(message_list)
-        await asyncio.sleep(1.5)
-    except Exception as e:
-        logger.error("Error bulk deleting messages: " + str(e))
-        await asyncio.sleep(1.5)
-        await doBulkDeleteOneAtATime(message_list)
-
-async def doBulkDeleteOneAtATime(message_list):
-    logger.info("Deleting messages one at a time, this will take a while")
-    try:
-        for message in message_list:
-            await message.delete()
-            await asyncio.sleep(1.5)
-    except Exception as e:
-        logger.error("Error deleting message: " + str(e))
-        
+    with deletionHelpers.DeletionEngine(channel) as engine:
+        await engine.add_all(messages)
+        return await engine.finish()
+
 def userPostedMessage(message, userid):
     return str(message.author.id) == str(userid)
 
@@ -91,3 +57,17 @@ def messageToString(message):
     terminator = "\n---------------------------------------\n"
 
     return basestring + attachments + embeds + terminator
+
+
+def messageToDict(message):
+    return {
+        "id": str(message.id),
+        "author": {"id": str(message.author.id), "name": str(message.author.name), "discriminator": str(message.author.discriminator)},
+        "server": str(message.guild.name),
+        "channel": str(message.channel.name),
+        "created_at": str(message.created_at),
+        "edited_at": None if message.edited_at is None else str(message.edited_at),
+        "content": message.content,
+        "attachments": [attachment.url for attachment in message.attachments],
+        "embeds": [embed.to_dict() for embed in message.embeds]
+    }
@@ -0,0 +1,154 @@
+import bisect
+import functools
+import logging
+import time
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+# Call count, error count and a latency histogram for one command, reaction, event handler or REST call
+class Timing:
+    __slots__ = ("calls", "errors", "total", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)  # the last bucket is everything over BUCKETS[-1]
+
+    def observe(self, seconds, error=False):
+        self.calls += 1
+        self.total += seconds
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        if error:
+            self.errors += 1
+
+    # The upper bound of the bucket the given fraction of calls fall within (e.g 0.99 for p99)
+    def percentile(self, fraction):
+        wanted = fraction * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= wanted and count:
+                return BUCKETS[index] if index < len(BUCKETS) else float("inf")
+        return 0.0
+
+
+# {(kind, name): Timing}, where kind is "command", "reaction", "tag_reactable", "event" or "rest"
+timings = {}
+
+
+def get_timing(kind, name):
+    timing = timings.get((kind, name))
+    if timing is None:
+        timing = timings[(kind, name)] = Timing()
+    return timing
+
+
+def observe(kind, name, seconds, error=False):
+    get_timing(kind, name).observe(seconds, error)
+
+
+# Times a block, counting it as an error if it raises. Works around awaits:
+#     with metricsHelpers.timer("command", "ping"):
+#         await ping(...)
+class timer:
+    __slots__ = ("timing", "started")
+
+    def __init__(self, kind, name):
+        self.timing = get_timing(kind, name)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timing.observe(time.perf_counter() - self.started, exc_type is not None)
+        return False
+
+
+# Decorator timing a client's event handler (e.g on_message) under its own name
+def timed_event(function):
+    timing = get_timing("event", function.__name__)
+
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        error = False
+        try:
+            return await function(*args, **kwargs)
+        except BaseException:
+            error = True
+            raise
+        finally:
+            timing.observe(time.perf_counter() - started, error)
+
+    return wrapper
+
+
+def format_seconds(seconds):
+    if seconds == float("inf"):
+        return ">" + str(BUCKETS[-1]) + "s"
+    return str(round(seconds * 1000, 1)) + "ms"
+
+
+# One line per timing, slowest (by total time) first
+def describe(kind=None, limit=20):
+    rows = sorted([(key, timing) for key, timing in timings.items() if kind is None or key[0] == kind],
+                  key=lambda row: row[1].total, reverse=True)
+
+    lines = []
+    for (timing_kind, name), timing in rows[:limit]:
+        lines.append(timing_kind + " " + name + ": " + str(timing.calls) + " calls, " + str(timing.errors) + " errors, avg " +
+                     format_seconds(timing.total / timing.calls if timing.calls else 0) + ", p50 <=" +
+                     format_seconds(timing.percentile(0.5)) + ", p99 <=" + format_seconds(timing.percentile(0.99)))
+
+    return lines
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# The timings in Prometheus' text exposition format
+def render_prometheus():
+    lines = ["# HELP evebot_seconds Time taken by commands, reactions, event handlers and REST calls.",
+             "# TYPE evebot_seconds histogram"]
+    errors = ["# HELP evebot_errors_total Calls which raised an exception.",
+              "# TYPE evebot_errors_total counter"]
+
+    for (kind, name), timing in sorted(timings.items()):
+        labels = 'kind="' + escape_label(kind) + '",name="' + escape_label(name) + '"'
+        cumulative = 0
+
+        for bound, count in zip(BUCKETS + ("+Inf",), timing.buckets):
+            cumulative += count
+            lines.append("evebot_seconds_bucket{" + labels + ',le="' + str(bound) + '"} ' + str(cumulative))
+
+        lines.append("evebot_seconds_sum{" + labels + "} " + repr(timing.total))
+        lines.append("evebot_seconds_count{" + labels + "} " + str(timing.calls))
+        errors.append("evebot_errors_total{" + labels + "} " + str(timing.errors))
+
+    return "\n".join(lines + errors) + "\n"
+
+
+async def handle_metrics(request):
+    return web.Response(text=render_prometheus(), content_type="text/plain", charset="utf-8")
+
+
+# Serve /metrics for Prometheus to scrape. Returns the runner, which should be cleaned up on close.
+async def start_metrics_server(host, port):
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+
+    logger.info("Serving metrics on http://" + host + ":" + str(port) + "/metrics")
+    return runner
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+# A token bucket shared by everything making a certain kind of API call. Its rate adapts to discord's
+# feedback: it backs off sharply whenever we get rate limited, then creeps back up while calls succeed.
+class TokenBucket:
+
+    def __init__(self, rate=10.0, capacity=None, min_rate=0.5, max_rate=50.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = asyncio.Lock()
+
+        self.calls = 0
+        self.rate_limits = 0
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Wait until a call may be made
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.calls += 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    # A call succeeded, additively increase the rate
+    def reward(self):
+        self.rate = min(self.max_rate, self.rate + 0.1)
+
+    # We were rate limited, halve the rate and stop everyone for as long as discord asked
+    def penalise(self, retry_after=None):
+        self.rate_limits += 1
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+
+        if retry_after is not None:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+        logger.debug("Rate limited, slowing down to " + str(round(self.rate, 2)) + " calls/s")
+
+    # Run a coroutine function under the bucket, feeding the result back into the rate
+    async def call(self, function, *args, **kwargs):
+        await self.acquire()
+
+        try:
+            result = await function(*args, **kwargs)
+        except discord.HTTPException as e:
+            if e.status == 429:
+                self.penalise()
+            raise
+
+        self.reward()
+        return result
+
+
+# discord.py waits out 429s internally and only tells us about them through a log warning, so listen
+# for that warning and pass it on to any buckets currently in use.
+class RateLimitListener(logging.Handler):
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.buckets = set()
+
+    def emit(self, record):
+        if "rate limited" not in str(record.msg):
+            return
+
+        retry_after = None
+        if record.args and isinstance(record.args[0], (int, float)):
+            retry_after = float(record.args[0])
+
+        for bucket in list(self.buckets):
+            bucket.penalise(retry_after)
+
+
+rateLimitListener = RateLimitListener()
+logging.getLogger("discord.http").addHandler(rateLimitListener)
+
+
+# Register a bucket to be slowed down by discord.py's rate limit warnings, for the duration of a with block
+class watch_rate_limits:
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def __enter__(self):
+        rateLimitListener.buckets.add(self.bucket)
+        return self.bucket
+
+    def __exit__(self, *args):
+        rateLimitListener.buckets.discard(self.bucket)
+
+
+# Page through a channel's history (newest first) with each page request going through the bucket
+async def history_pages(channel, bucket, page_size=100, **kwargs):
+    before = kwargs.pop("before", None)
+
+    while True:
+        page = await bucket.call(channel.history(limit=page_size, before=before, **kwargs).flatten)
+        if len(page) == 0:
+            return
+
+        yield page
+
+        if len(page) < page_size:
+            return
+        before = page[-1]
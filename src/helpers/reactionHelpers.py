@@ -0,0 +1,69 @@
+import re
+
+
+# A single reaction trigger, compiled once at registration time
+class ReactionEntry:
+    __slots__ = ("key", "regex")
+
+    def __init__(self, key):
+        self.key = key
+
+        try:
+            self.regex = re.compile(key, re.IGNORECASE)
+        except re.error:
+            # Not a valid regex, so it can only ever match as a literal
+            self.regex = None
+
+    # Matches in the same way do_reacts always has: a literal check against the lowered
+    # message, then a case insensitive regex search
+    def matches(self, message, lowered):
+        return self.key in lowered or (self.regex is not None and self.regex.search(message) is not None)
+
+
+# Matches a message against every registered reaction. All triggers are combined into one
+# alternation so the common case (nothing to react to) is a single pass over the message.
+# Registration order still decides which reaction wins when several match.
+class ReactionMatcher:
+
+    def __init__(self, keys=()):
+        self.entries = [ReactionEntry(key) for key in keys]
+        self.standalone = []
+        self.combined = None
+
+        branches = []
+        for index, entry in enumerate(self.entries):
+            # Triggers with their own groups (or backreferences) can't be safely merged
+            # into the alternation, so they are always checked on their own
+            if entry.regex is not None and entry.regex.groups > 0:
+                self.standalone.append(index)
+                continue
+
+            branch = re.escape(entry.key)
+            if entry.regex is not None:
+                branch += "|" + entry.key
+            branches.append("(?:" + branch + ")")
+
+        if branches:
+            try:
+                self.combined = re.compile("|".join(branches), re.IGNORECASE)
+            except re.error:
+                # e.g. a trigger using inline flags, fall back to checking every entry
+                self.combined = None
+
+    # Returns the key of the first registered reaction matching the message, or None
+    def match(self, message):
+        lowered = message.lower()
+
+        if self.combined is None:
+            candidates = range(len(self.entries))
+        elif self.combined.search(message) is None:
+            candidates = self.standalone
+        else:
+            candidates = range(len(self.entries))
+
+        for index in candidates:
+            entry = self.entries[index]
+            if entry.matches(message, lowered):
+                return entry.key
+
+        return None
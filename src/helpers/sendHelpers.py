@@ -0,0 +1,197 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+
+import discord
+
+from helpers import metricsHelpers, rateHelpers
+
+logger = logging.getLogger(__name__)
+
+# Priorities, lowest first: command replies go before progress edits, which go before log entries
+REPLY = 0
+PROGRESS = 1
+LOG = 2
+
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 1  # seconds, doubled for each further attempt and jittered
+
+# Discord lets a channel have around 5 messages sent every 5 seconds
+CHANNEL_RATE = 1.0
+CHANNEL_BURST = 5
+
+# A drained queue is dropped once it has been idle long enough for its bucket to refill
+IDLE_TIMEOUT = CHANNEL_BURST / CHANNEL_RATE
+
+
+# One message to send (or edit), and everyone waiting for it
+class SendJob:
+    __slots__ = ("kind", "text", "target", "kwargs", "max_attempts", "attempts", "futures")
+
+    def __init__(self, kind, text, target, kwargs, max_attempts):
+        self.kind = kind
+        self.text = text
+        self.target = target
+        self.kwargs = kwargs
+        self.max_attempts = max_attempts
+        self.attempts = 0
+        self.futures = [asyncio.get_event_loop().create_future()]
+
+    async def run(self, channel):
+        if self.kind == "edit_message":
+            return await self.target.edit(content=self.text)
+
+        kwargs = dict(self.kwargs)
+        if "file" in kwargs:
+            # discord.File is used up by sending it, so make a new one for each attempt
+            kwargs["file"] = discord.File(kwargs["file"])
+
+        return await channel.send(self.text, **kwargs)
+
+    def succeed(self, result):
+        for future in self.futures:
+            if not future.done():
+                future.set_result(result)
+
+    def fail(self, exception):
+        for future in self.futures:
+            if not future.done():
+                future.set_exception(exception)
+
+
+# Everything sent to one channel, in priority order, at a pace the channel's rate limit allows. Edits to a
+# message which is already waiting to be edited replace the waiting content, so only the latest is sent.
+class SendQueue:
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.heap = []
+        self.order = itertools.count()
+        self.pending_edits = {}  # message id -> the edit job waiting for it
+        self.bucket = rateHelpers.TokenBucket(rate=CHANNEL_RATE, capacity=CHANNEL_BURST, max_rate=CHANNEL_RATE)
+        self.worker = None
+        self.retrying = 0  # failed jobs waiting out their backoff before going back on the heap
+        self.idle_handle = None
+        self.coalesced = 0
+
+    def submit(self, job, priority):
+        heapq.heappush(self.heap, (priority, next(self.order), job))
+        self.start_worker()
+
+        return job.futures[0]
+
+    def start_worker(self):
+        if self.idle_handle is not None:
+            self.idle_handle.cancel()
+            self.idle_handle = None
+
+        if self.worker is None:
+            self.worker = asyncio.ensure_future(self.run())
+
+    async def send(self, text, priority=REPLY, max_attempts=MAX_ATTEMPTS, **kwargs):
+        job = SendJob("send_file" if "file" in kwargs else "send_message", text, None, kwargs, max_attempts)
+        return await self.submit(job, priority)
+
+    async def edit(self, message, text, priority=PROGRESS, max_attempts=MAX_ATTEMPTS):
+        job = self.pending_edits.get(message.id)
+
+        if job is not None:
+            job.text = text
+            future = asyncio.get_event_loop().create_future()
+            job.futures.append(future)
+            self.coalesced += 1
+
+            # Bring the waiting edit forward if this one is more urgent
+            if priority < self.priority_of(job):
+                self.heap = [(min(entry[0], priority), entry[1], entry[2]) if entry[2] is job else entry for entry in self.heap]
+                heapq.heapify(self.heap)
+
+            return await future
+
+        job = self.pending_edits[message.id] = SendJob("edit_message", text, message, {}, max_attempts)
+        return await self.submit(job, priority)
+
+    def priority_of(self, job):
+        return next(entry[0] for entry in self.heap if entry[2] is job)
+
+    async def run(self):
+        try:
+            while self.heap:
+                priority, order, job = heapq.heappop(self.heap)
+
+                if job.target is not None and self.pending_edits.get(job.target.id) is job:
+                    del self.pending_edits[job.target.id]
+
+                await self.execute(job, priority)
+        finally:
+            self.worker = None
+            self.schedule_eviction()
+
+    async def execute(self, job, priority):
+        job.attempts += 1
+
+        try:
+            with metricsHelpers.timer("rest", job.kind):
+                result = await self.bucket.call(job.run, self.channel)
+        except discord.Forbidden as e:
+            job.fail(e)
+        except discord.HTTPException as e:
+            # Only rate limits and discord's own errors are worth trying again
+            if job.attempts >= job.max_attempts or (e.status < 500 and e.status != 429):
+                return job.fail(e)
+
+            # Back off without holding up everything else waiting for this channel
+            logger.warning("Failed to send or edit message, retrying. " + str(e))
+            delay = RETRY_BACKOFF * (2 ** (job.attempts - 1)) * (1 + random.random())
+            self.retrying += 1
+            asyncio.get_event_loop().call_later(delay, self.retry, job, priority)
+        except Exception as e:
+            job.fail(e)
+        else:
+            job.succeed(result)
+
+    def retry(self, job, priority):
+        self.retrying -= 1
+
+        if job.target is not None:
+            newer = self.pending_edits.get(job.target.id)
+
+            # The message has a newer edit waiting, which replaces this one
+            if newer is not None:
+                newer.futures.extend(job.futures)
+                return
+
+            self.pending_edits[job.target.id] = job
+
+        self.submit(job, priority)
+
+    def schedule_eviction(self):
+        if not self.heap and not self.retrying and self.idle_handle is None:
+            self.idle_handle = asyncio.get_event_loop().call_later(IDLE_TIMEOUT, self.evict)
+
+    # Drop this queue if it has stayed idle, so channels which were only ever replied to once don't keep one
+    def evict(self):
+        self.idle_handle = None
+
+        if self.worker is None and not self.heap and not self.retrying and sendQueues.get(self.channel.id) is self:
+            del sendQueues[self.channel.id]
+
+    def __len__(self):
+        return len(self.heap)
+
+
+# channel id -> SendQueue
+sendQueues = {}
+
+
+def get_send_queue(channel):
+    queue = sendQueues.get(channel.id)
+
+    if queue is None:
+        queue = sendQueues[channel.id] = SendQueue(channel)
+    else:
+        queue.channel = channel  # channel objects are replaced when discord.py reconnects
+
+    return queue
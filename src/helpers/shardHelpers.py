@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+# Discord allows one IDENTIFY every 5 seconds, so processes are started this far apart per shard they run
+IDENTIFY_INTERVAL = 5
+
+
+# The shard discord sends a guild's events to
+def shard_for_guild(guild_id, shard_count):
+    return (guild_id >> 22) % shard_count
+
+
+# Split shards 0..shard_count-1 into (at most) the given number of contiguous, evenly sized ranges
+def shard_ranges(shard_count, processes):
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+
+    ranges = []
+    start = 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+
+    return ranges
+
+
+# Parse shard ids given on the command line, e.g "0,1,2" or "0-2"
+def parse_shard_ids(text):
+    shard_ids = []
+
+    for part in text.split(","):
+        if "-" in part:
+            start, end = part.split("-")
+            shard_ids.extend(range(int(start), int(end) + 1))
+        else:
+            shard_ids.append(int(part))
+
+    return shard_ids
+
+
+def format_shard_ids(shard_ids):
+    return ",".join(str(shard_id) for shard_id in shard_ids)
+
+
+# Runs one runDiscord.py process per shard range, restarting any which exit until stopped
+class ShardSupervisor:
+
+    def __init__(self, script, shard_count, processes, restart_delay=5, identify_interval=IDENTIFY_INTERVAL):
+        self.script = script
+        self.shard_count = shard_count
+        self.ranges = shard_ranges(shard_count, processes)
+        self.restart_delay = restart_delay
+        self.identify_interval = identify_interval
+        self.processes = {}
+        self.restarts = 0
+        self.stopping = False
+
+    def command(self, shard_ids):
+        return [sys.executable, self.script, "--shard-count", str(self.shard_count),
+                "--shard-ids", format_shard_ids(shard_ids)]
+
+    async def run_range(self, index, shard_ids):
+        # Stagger the first start so each process gets its turn to identify
+        await asyncio.sleep(index * len(shard_ids) * self.identify_interval)
+
+        while not self.stopping:
+            logger.info("Starting shards " + format_shard_ids(shard_ids) + " of " + str(self.shard_count))
+            process = self.processes[index] = await asyncio.create_subprocess_exec(*self.command(shard_ids))
+            code = await process.wait()
+
+            if self.stopping:
+                break
+
+            logger.error("Shards " + format_shard_ids(shard_ids) + " exited with " + str(code) + ", restarting")
+            self.restarts += 1
+            await asyncio.sleep(self.restart_delay)
+
+    async def run(self):
+        await asyncio.gather(*[self.run_range(index, shard_ids) for index, shard_ids in enumerate(self.ranges)])
+
+    def stop(self):
+        self.stopping = True
+
+        for process in self.processes.values():
+            if process.returncode is None:
+                process.terminate()
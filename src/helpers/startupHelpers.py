@@ -0,0 +1,47 @@
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Import this first in a run script so the report covers (nearly) everything after the interpreter starts
+STARTED = time.perf_counter()
+
+# (phase name, seconds) in the order they happened
+phases = []
+last_mark = STARTED
+
+
+# Record the time since the previous mark as a phase (e.g "imports")
+def mark(name):
+    global last_mark
+
+    now = time.perf_counter()
+    phases.append((name, now - last_mark))
+    last_mark = now
+
+
+# Time a block as its own phase
+@contextmanager
+def timed(name):
+    global last_mark
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        now = time.perf_counter()
+        phases.append((name, now - started))
+        last_mark = now
+
+
+def report():
+    parts = [name + " " + str(round(seconds * 1000)) + "ms" for name, seconds in phases]
+    total = time.perf_counter() - STARTED
+
+    return "Startup took " + str(round(total * 1000)) + "ms (" + ", ".join(parts) + "). " \
+           "For a per-module breakdown run with python -X importtime."
+
+
+def log_report():
+    logger.info(report())
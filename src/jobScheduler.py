@@ -0,0 +1,180 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
+
+import config
+from helpers import sendHelpers
+
+logger = logging.getLogger(__name__)
+
+# How many finished jobs are remembered for the jobs command
+FINISHED_HISTORY = 20
+
+
+class JobLimitError(Exception):
+    pass
+
+
+# A long running admin command (e.g regenroles, gdpr) running in the background
+class Job:
+    __slots__ = ("id", "guild_id", "name", "status", "progress", "created", "started", "finished", "timeout", "task",
+                 "sendReply", "queued", "timer", "timed_out")
+
+    def __init__(self, id, guild_id, name, timeout, sendReply, queued=False):
+        self.id = id
+        self.guild_id = guild_id
+        self.name = name
+        self.status = "queued"
+        self.progress = None
+        self.created = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.timeout = timeout
+        self.task = None
+        self.sendReply = sendReply
+        self.queued = queued
+        self.timer = None
+        self.timed_out = False
+
+    # A sendReply for the job's own use, which also keeps the last thing it said as its progress. What jobs send
+    # waits behind replies to other commands.
+    def buildSendReply(self):
+        async def sendReply(text, *args, **kwargs):
+            if text:
+                self.progress = text
+            kwargs.setdefault("priority", sendHelpers.PROGRESS)
+            return await self.sendReply(text, *args, **kwargs)
+
+        return sendReply
+
+    @property
+    def done(self):
+        return self.finished is not None
+
+    def describe(self):
+        if self.started is None:
+            elapsed = "waiting " + str(round(time.monotonic() - self.created)) + "s"
+        else:
+            elapsed = str(round((self.finished or time.monotonic()) - self.started)) + "s"
+
+        description = "#" + str(self.id) + " " + self.name + ": " + self.status + " (" + elapsed + ")"
+        if self.progress and not self.done:
+            description += " - " + self.progress.splitlines()[0][:100]
+
+        return description
+
+
+# Runs jobs as their own tasks, so the command which started them returns straight away. Each guild may only run
+# config.jobs_per_guild at once (and config.job_concurrency overall), the rest wait their turn. Jobs can be
+# listed, cancelled, and are cancelled if they run for longer than their timeout.
+#
+# Queued jobs wait in a queue of their own instead (e.g the gdpr worker's, which runs one at a time), so they don't
+# take up a slot while they wait. They are called as function(sendReply, started) and call started() once they
+# are picked up, which is when their timeout starts.
+class JobScheduler:
+
+    def __init__(self):
+        self.ids = itertools.count(1)
+        self.jobs = OrderedDict()  # id -> Job, running and waiting jobs plus recently finished ones
+        self.guild_semaphores = {}
+        self.semaphore = None
+
+    # Start running function(sendReply) as a job, returns the Job. Raises JobLimitError if the guild already
+    # has too many jobs waiting.
+    def submit(self, guild_id, name, function, sendReply, timeout=None, queued=False):
+        if len([job for job in self.guild_jobs(guild_id) if not job.done]) >= config.max_jobs_per_guild:
+            raise JobLimitError("Too many jobs are already running or waiting, try again later.")
+
+        if timeout is None:
+            timeout = config.job_timeouts.get(name, config.job_timeout)
+
+        job = Job(next(self.ids), guild_id, name, timeout, sendReply, queued)
+        self.jobs[job.id] = job
+        job.task = asyncio.ensure_future(self.run(job, function))
+
+        return job
+
+    async def run(self, job, function):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(config.job_concurrency)
+        guild_semaphore = self.guild_semaphores.setdefault(job.guild_id, asyncio.Semaphore(config.jobs_per_guild))
+
+        try:
+            if job.queued:
+                await function(job.buildSendReply(), lambda: self.start(job))
+            else:
+                # Always the guild's then the global semaphore, so jobs can't hold each other up
+                async with guild_semaphore, self.semaphore:
+                    self.start(job)
+                    await function(job.buildSendReply())
+
+            job.status = "done"
+        except asyncio.CancelledError:
+            if job.timed_out:
+                job.status = "timed out"
+                await self.notify(job, "Job #" + str(job.id) + " (" + job.name + ") timed out after " + str(job.timeout) + "s.")
+            else:
+                job.status = "cancelled"
+                await self.notify(job, "Job #" + str(job.id) + " (" + job.name + ") was cancelled.")
+        except Exception as e:
+            job.status = "failed"
+
+            # Some errors have already been reported to the channel by whatever raised them
+            if not getattr(e, "reported", False):
+                logger.exception(e)
+                await self.notify(job, "Job #" + str(job.id) + " (" + job.name + ") failed: " + str(e))
+        finally:
+            if job.timer is not None:
+                job.timer.cancel()
+            job.finished = time.monotonic()
+            self.forget_finished()
+
+    # The job has started running, its timeout starts now
+    def start(self, job):
+        if job.started is not None:
+            return
+
+        job.status = "running"
+        job.started = time.monotonic()
+        job.timer = asyncio.get_event_loop().call_later(job.timeout, self.expire, job)
+
+    def expire(self, job):
+        job.timer = None
+        if not job.done:
+            job.timed_out = True
+            job.task.cancel()
+
+    async def notify(self, job, text):
+        try:
+            await job.sendReply(text)
+        except Exception as e:
+            logger.error("Couldn't report on job " + str(job.id) + ": " + str(e))
+
+    def forget_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:-FINISHED_HISTORY]:
+            del self.jobs[job_id]
+
+    def guild_jobs(self, guild_id):
+        return [job for job in self.jobs.values() if job.guild_id == guild_id]
+
+    # Cancel a guild's job, returns whether there was one to cancel
+    def cancel(self, guild_id, job_id):
+        job = self.jobs.get(job_id)
+
+        if job is None or job.guild_id != guild_id or job.done:
+            return False
+
+        job.task.cancel()
+        return True
+
+    def cancel_all(self):
+        for job in self.jobs.values():
+            if not job.done:
+                job.task.cancel()
+
+
+# Process wide scheduler, used by the management commands
+jobScheduler = JobScheduler()
@@ -0,0 +1,75 @@
+import asyncio
+import datetime
+import logging
+
+import discord
+
+import config
+from helpers import deletionHelpers
+from models import RetentionCheckpoint, run_in_db
+
+logger = logging.getLogger(__name__)
+
+
+# Delete everything in a log channel which has expired since the last run. The cutoff time is turned into
+# a snowflake and used as the history's before= bound, so recent messages are never even fetched. History is
+# paged newest first from there, stopping at the previous cutoff, since everything older was already cleaned up.
+# (Giving history an after= would page oldest first from the checkpoint up to the newest message instead.)
+async def purgeExpiredLogs(channel):
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=config.log_retention)
+    cutoff_id = discord.utils.time_snowflake(cutoff)
+    checkpoint = await run_in_db(getCheckpoint, channel.id)
+
+    checkpoint_id = None if checkpoint is None else int(checkpoint)
+
+    with deletionHelpers.DeletionEngine(channel) as engine:
+        async for message in channel.history(limit=None, before=discord.Object(cutoff_id)):
+            if checkpoint_id is not None and message.id <= checkpoint_id:
+                break
+
+            await engine.add(message)
+
+        await engine.finish()
+
+    # Only move the checkpoint on if nothing was left behind, so failures are retried next time
+    if engine.failed == 0:
+        await run_in_db(setCheckpoint, channel.id, cutoff_id)
+
+    return engine
+
+
+async def purgeAllExpiredLogs(client):
+    for guild_id, channel_id in config.log_channels.items():
+        # When sharded, the guild's own shard process cleans up its log channel
+        if client.get_guild(guild_id) is None:
+            logger.debug("Skipping log channel for " + str(guild_id) + ", not connected to that guild")
+            continue
+
+        channel = client.get_channel(channel_id)
+
+        if channel is None:
+            logger.error("Unable to find log channel " + str(channel_id) + " for " + str(guild_id))
+            continue
+
+        try:
+            await purgeExpiredLogs(channel)
+        except Exception as e:
+            logger.error("Error cleaning up log channel " + str(channel_id) + ": " + str(e))
+
+
+# Runs log retention for every log channel, forever
+async def runLogRetention(client):
+    await client.wait_until_ready()
+
+    while not client.is_closed():
+        await purgeAllExpiredLogs(client)
+        await asyncio.sleep(config.log_retention_interval)
+
+
+def getCheckpoint(session, channel_id):
+    checkpoint = session.query(RetentionCheckpoint).filter_by(channel_id=str(channel_id)).first()
+    return None if checkpoint is None else checkpoint.before_message_id
+
+
+def setCheckpoint(session, channel_id, before_message_id):
+    session.merge(RetentionCheckpoint(channel_id=str(channel_id), before_message_id=str(before_message_id)))
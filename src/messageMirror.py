@@ -0,0 +1,195 @@
+import asyncio
+import logging
+
+import discord
+from discord import ChannelType
+
+import config
+from helpers import rateHelpers
+from models import MirroredMessage, MirroredMention, MirrorCheckpoint, run_in_db
+
+logger = logging.getLogger(__name__)
+
+# Live messages are written in batches, whenever this many are waiting or this many seconds have passed
+FLUSH_SIZE = 500
+FLUSH_INTERVAL = 2
+
+PAGE_SIZE = 100
+
+
+# Keeps the mirror tables up to date from gateway events, and backfills channels from their history
+class MessageMirror:
+
+    def __init__(self):
+        self.pending = {}  # message id -> (guild id, channel id, author id, mentioned user ids)
+        self.pending_deletes = set()
+        self.flush_task = None
+        self.backfilled = set()  # channels which are caught up since this process started
+
+    def record(self, message):
+        if message.guild is None:
+            return
+
+        self.pending[message.id] = messageRow(message)
+        self.schedule_flush()
+
+    # Edits can add or remove mentions. data is the partial message from a raw edit event.
+    def record_edit(self, message_id, data):
+        if "mentions" not in data or "author" not in data or "guild_id" not in data:
+            return
+
+        self.pending[message_id] = (int(data["guild_id"]), int(data["channel_id"]), int(data["author"]["id"]),
+                                    [int(user["id"]) for user in data["mentions"]])
+        self.schedule_flush()
+
+    def record_delete(self, message_ids):
+        for message_id in message_ids:
+            self.pending.pop(message_id, None)
+            self.pending_deletes.add(message_id)
+
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        if len(self.pending) + len(self.pending_deletes) >= FLUSH_SIZE:
+            asyncio.ensure_future(self.flush())
+        elif self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(FLUSH_INTERVAL)
+        self.flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        rows, deletes = self.pending, self.pending_deletes
+        self.pending, self.pending_deletes = {}, set()
+
+        if len(rows) == 0 and len(deletes) == 0:
+            return
+
+        try:
+            await run_in_db(storeMessages, rows, deletes)
+        except Exception as e:
+            logger.error("Unable to write to message mirror: " + str(e))
+
+    # Fetch everything sent in a channel since it was last backfilled
+    async def backfill_channel(self, channel, bucket):
+        checkpoint = await run_in_db(getCheckpoint, channel.id)
+        after = None if checkpoint is None else discord.Object(int(checkpoint))
+        count = 0
+
+        while True:
+            page = await bucket.call(channel.history(limit=PAGE_SIZE, after=after, oldest_first=True).flatten)
+            if len(page) == 0:
+                break
+
+            rows = {message.id: messageRow(message) for message in page}
+            await run_in_db(storeMessages, rows, (), (channel.guild.id, channel.id, page[-1].id))
+            count += len(page)
+
+            if len(page) < PAGE_SIZE:
+                break
+            after = page[-1]
+
+        # Empty channels still need a checkpoint, so the channel is known to have been backfilled
+        if checkpoint is None and count == 0:
+            await run_in_db(storeMessages, {}, (), (channel.guild.id, channel.id, 0))
+
+        self.backfilled.add(channel.id)
+        return count
+
+    async def backfill(self, guilds):
+        bucket = rateHelpers.TokenBucket(rate=config.gdpr_requests_per_second)
+        semaphore = asyncio.Semaphore(config.gdpr_channel_concurrency)
+
+        async def backfillChannel(channel):
+            async with semaphore:
+                try:
+                    count = await self.backfill_channel(channel, bucket)
+                    logger.debug("Backfilled " + str(count) + " messages from " + str(channel))
+                except Exception as e:
+                    logger.error("Unable to backfill " + str(channel) + ": " + str(e))
+
+        channels = [channel for guild in guilds for channel in readableChannels(guild)]
+
+        logger.info("Backfilling message mirror for " + str(len(channels)) + " channels")
+        with rateHelpers.watch_rate_limits(bucket):
+            await asyncio.gather(*[backfillChannel(channel) for channel in channels])
+        logger.info("Message mirror backfill complete")
+
+    # A channel created since the bot started has had every message in it recorded live, so there's nothing
+    # to backfill
+    def mark_backfilled(self, channel):
+        if channel.type == ChannelType.text:
+            self.backfilled.add(channel.id)
+
+    # Returns {channel id: [message ids]} for messages in a guild sent by (or, optionally, mentioning) a user,
+    # or None if the mirror can't answer for every text channel in the guild that can be read.
+    async def find_messages(self, guild, userid, include_mentions=True):
+        if not config.message_mirror_enabled:
+            return None
+
+        if any(channel.id not in self.backfilled for channel in readableChannels(guild)):
+            return None
+
+        await self.flush()
+        return await run_in_db(findMessages, guild.id, userid, include_mentions)
+
+
+# The text channels in a guild whose history can be read, which are the ones the mirror backfills
+def readableChannels(guild):
+    return [channel for channel in guild.channels
+            if channel.type == ChannelType.text and channel.permissions_for(guild.me).read_message_history]
+
+
+def messageRow(message):
+    return message.guild.id, message.channel.id, message.author.id, [user.id for user in message.mentions]
+
+
+def storeMessages(session, rows, deletes, checkpoint=None):
+    if len(rows) > 0:
+        session.execute(MirroredMessage.__table__.insert().prefix_with("OR REPLACE"),
+                        [{"id": str(message_id), "guild_id": str(row[0]), "channel_id": str(row[1]), "author_id": str(row[2])}
+                         for message_id, row in rows.items()])
+        session.query(MirroredMention).filter(MirroredMention.message_id.in_([str(message_id) for message_id in rows])) \
+            .delete(synchronize_session=False)
+
+        mentions = [{"message_id": str(message_id), "user_id": str(user_id)}
+                    for message_id, row in rows.items() for user_id in set(row[3])]
+        if len(mentions) > 0:
+            session.execute(MirroredMention.__table__.insert(), mentions)
+
+    if len(deletes) > 0:
+        message_ids = [str(message_id) for message_id in deletes]
+        session.query(MirroredMention).filter(MirroredMention.message_id.in_(message_ids)).delete(synchronize_session=False)
+        session.query(MirroredMessage).filter(MirroredMessage.id.in_(message_ids)).delete(synchronize_session=False)
+
+    if checkpoint is not None:
+        guild_id, channel_id, last_message_id = checkpoint
+        session.merge(MirrorCheckpoint(channel_id=str(channel_id), guild_id=str(guild_id), last_message_id=str(last_message_id)))
+
+
+def getCheckpoint(session, channel_id):
+    checkpoint = session.query(MirrorCheckpoint).filter_by(channel_id=str(channel_id)).first()
+    return None if checkpoint is None else checkpoint.last_message_id
+
+
+def findMessages(session, guild_id, userid, include_mentions):
+    query = session.query(MirroredMessage.channel_id, MirroredMessage.id) \
+        .filter(MirroredMessage.guild_id == str(guild_id), MirroredMessage.author_id == str(userid))
+
+    if include_mentions:
+        mentioned = session.query(MirroredMessage.channel_id, MirroredMessage.id) \
+            .join(MirroredMention, MirroredMention.message_id == MirroredMessage.id) \
+            .filter(MirroredMessage.guild_id == str(guild_id), MirroredMention.user_id == str(userid))
+        query = query.union(mentioned)
+
+    messages = {}
+    for channel_id, message_id in query:
+        messages.setdefault(int(channel_id), []).append(int(message_id))
+
+    return messages
+
+
+# Process wide mirror, fed by the main client's events
+messageMirror = MessageMirror()
@@ -0,0 +1,59 @@
+from collections import namedtuple
+from functools import lru_cache
+
+# Plain records mirroring the Server, User and Chat models. Metadata only needs their fields, not the ORM.
+ServerData = namedtuple("ServerData", ["id", "service_id", "server_name"])
+UserData = namedtuple("UserData", ["id", "service_id", "username"])
+ChatData = namedtuple("ChatData", ["id", "server_id", "chat_name", "nsfw"])
+
+
+# Guilds and channels are the same for every message sent in them, so reuse their records.
+# The names are part of the key so a rename produces a fresh record.
+@lru_cache(maxsize=256)
+def server_data(server_id, service_id, server_name):
+    return ServerData(server_id, service_id, server_name)
+
+
+@lru_cache(maxsize=4096)
+def chat_data(chat_id, server_id, chat_name, nsfw):
+    return ChatData(chat_id, server_id, chat_name, nsfw)
+
+
+# Marks a Metadata key which hasn't been given, as the dicts it replaced simply didn't have those keys
+UNSET = object()
+
+
+# Metadata passed to commands and reactions. Supports the same dict style access
+# (metadata["server"], metadata.get("user"), metadata["user"] = ..., "event" in metadata) commands already use.
+class Metadata:
+    __slots__ = ("service", "user", "server", "chat", "message", "client", "event")
+
+    KEYS = frozenset(__slots__)
+
+    def __init__(self, service=UNSET, user=UNSET, server=UNSET, chat=UNSET, message=UNSET, client=UNSET, event=UNSET):
+        for key, value in (("service", service), ("user", user), ("server", server), ("chat", chat),
+                           ("message", message), ("client", client), ("event", event)):
+            if value is not UNSET:
+                setattr(self, key, value)
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    # Only keys which have been assigned, like a dict
+    def __contains__(self, key):
+        return key in self.KEYS and hasattr(self, key)
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        return getattr(self, key)
+
+    def __repr__(self):
+        return "<Metadata(server='%s', chat='%s', user='%s')>" % (self.get("server"), self.get("chat"), self.get("user"))
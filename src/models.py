@@ -1,12 +1,63 @@
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Boolean, DateTime
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event, Column, Integer, String, ForeignKey, Boolean, DateTime
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
 
+# The database can be moved (e.g for testing) by setting an environment variable
+DATABASE_URL = os.environ.get('BOT_DATABASE', 'sqlite:///sqlite.db')
+
 Base = declarative_base()
-engine = create_engine('sqlite:///sqlite.db', echo=False, pool_recycle=3600)
-sessionfactory = sessionmaker(bind=engine)
+engine = create_engine(DATABASE_URL, echo=False, pool_recycle=3600)
+sessionfactory = sessionmaker(bind=engine, expire_on_commit=False)
 Session = scoped_session(sessionfactory)
 
+# All database work from the event loop runs on this single thread, so sqlite never blocks the
+# gateway and writes are naturally serialised.
+db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")    # readers don't block the writer (and vice versa)
+    cursor.execute("PRAGMA synchronous=NORMAL")  # safe with WAL, and avoids an fsync per commit
+    cursor.execute("PRAGMA busy_timeout=5000")   # other processes (e.g cleanup scripts) may hold the lock briefly
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-16000")   # 16MB page cache
+    cursor.close()
+
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", set_sqlite_pragmas)
+
+
+# A unit of work: a fresh session which is committed on success, rolled back on error and always closed
+@contextmanager
+def session_scope():
+    session = sessionfactory()
+
+    try:
+        yield session
+        session.commit()
+    except:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+# Run function(session, *args, **kwargs) in its own unit of work on the database thread, without blocking the event loop
+async def run_in_db(function, *args, **kwargs):
+    def unit_of_work():
+        with session_scope() as session:
+            return function(session, *args, **kwargs)
+
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(db_executor, unit_of_work)
+
 
 # A service which contains servers, chats, and users (e.g, 'discord' or 'irc')
 class Service(Base):
@@ -70,6 +121,59 @@ class Warning(Base):
     user = Column(ForeignKey('user.id'))
     reason = Column(String(500))
 
+# A local index of messages (no content) for finding a user's messages without paging through every
+# channel's history. Only populated when config.message_mirror_enabled is set.
+class MirroredMessage(Base):
+    __tablename__ = "mirroredmessage"
+
+    id = Column(String(20), primary_key=True)
+    guild_id = Column(String(20))
+    channel_id = Column(String(20))
+    author_id = Column(String(20), index=True)
+
+
+class MirroredMention(Base):
+    __tablename__ = "mirroredmention"
+
+    message_id = Column(ForeignKey('mirroredmessage.id'), primary_key=True)
+    user_id = Column(String(20), primary_key=True, index=True)
+
+
+# The newest message backfilled into the mirror for each channel
+class MirrorCheckpoint(Base):
+    __tablename__ = "mirrorcheckpoint"
+
+    channel_id = Column(String(20), primary_key=True)
+    guild_id = Column(String(20))
+    last_message_id = Column(String(20))
+
+
+# How far log retention has got in each log channel (everything before this message id has been cleaned up)
+class RetentionCheckpoint(Base):
+    __tablename__ = "retentioncheckpoint"
+
+    channel_id = Column(String(20), primary_key=True)
+    before_message_id = Column(String(20))
+
+
+# How far an interrupted role reconciliation got in a guild (every member up to this id has been handled)
+class RoleReconcileCursor(Base):
+    __tablename__ = "rolereconcilecursor"
+
+    guild_id = Column(String(20), primary_key=True)
+    last_member_id = Column(String(20))
+
+
+# A message waiting to be deleted (see deletionScheduler), kept here so the deletion survives a restart
+class ScheduledDeletion(Base):
+    __tablename__ = "scheduleddeletion"
+
+    message_id = Column(String(20), primary_key=True)
+    channel_id = Column(String(20))
+    guild_id = Column(String(20))
+    due_at = Column(DateTime, index=True)
+
+
 def get_or_create(session, model, **kwargs):
     instance = session.query(model).filter_by(**kwargs).first()
     if instance:
@@ -86,4 +190,6 @@ def get_or_create(session, model, **kwargs):
         return instance
 
 
-Base.metadata.create_all(engine)
+# Create any missing tables. Run scripts call this once at startup, rather than it happening on import.
+def create_schema():
+    Base.metadata.create_all(engine)
@@ -0,0 +1,55 @@
+import logging
+
+from models import TagReactables, run_in_db
+
+logger = logging.getLogger(__name__)
+
+# In memory copy of the tagreactables table, keyed by message id (as an int), so reaction events
+# on messages that aren't reactable can be dropped without touching discord or the database
+reactablesDict = {}
+
+
+# Load every reactable message from the database, replacing anything already cached
+async def load_reactables():
+    reactables = await run_in_db(query_reactables)
+
+    reactablesDict.clear()
+    reactablesDict.update(reactables)
+    logger.info("Loaded " + str(len(reactablesDict)) + " reactable messages")
+
+
+def is_reactable(message_id):
+    return int(message_id) in reactablesDict
+
+
+# Returns (function_name, function_args) for a reactable message, or None
+def get_reactable(message_id):
+    return reactablesDict.get(int(message_id))
+
+
+# Write a reactable message through to the database, then to the cache once it has been committed
+async def set_reactable(message_id, function_name, function_args):
+    try:
+        await run_in_db(store_reactable, message_id, function_name, function_args)
+    except Exception as e:
+        logger.error("Unable to commit to database: " + str(e))
+        return False
+
+    reactablesDict[int(message_id)] = (function_name, str(function_args))
+    return True
+
+
+def query_reactables(session):
+    return {int(reactable.message_id): (reactable.function_name, reactable.function_args)
+            for reactable in session.query(TagReactables).all()}
+
+
+def store_reactable(session, message_id, function_name, function_args):
+    instance = session.query(TagReactables).filter_by(message_id=str(message_id)).first()
+
+    if instance:
+        instance.function_name = function_name
+        instance.function_args = str(function_args)
+    else:
+        instance = TagReactables(message_id=str(message_id), function_name=function_name, function_args=str(function_args))
+    session.add(instance)
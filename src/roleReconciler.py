@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from collections import namedtuple
+
+import config
+from helpers import rateHelpers
+from models import RoleReconcileCursor, run_in_db
+
+logger = logging.getLogger(__name__)
+
+# Save the cursor after this many changes have been applied
+CURSOR_SAVE_INTERVAL = 25
+
+RoleChange = namedtuple("RoleChange", ["member", "role", "add"])
+
+
+# Work out every role change needed in a guild from the member cache, without making any API calls.
+# Members are handled in id order, so a run can be resumed from the id of the last member it finished.
+def planRoleChanges(guild, after_member_id=None):
+    role_id, blocking_role_id = config.reconcile_roles[guild.id]
+    role = guild.get_role(role_id)
+    blocking_role = guild.get_role(blocking_role_id)
+
+    plan = []
+    for member in sorted(guild.members, key=lambda member: member.id):
+        if after_member_id is not None and member.id <= after_member_id:
+            continue
+
+        has_role = role in member.roles
+
+        if blocking_role not in member.roles:
+            if not has_role:
+                plan.append(RoleChange(member, role, True))
+        elif has_role:
+            plan.append(RoleChange(member, role, False))
+
+    return plan
+
+
+def describePlan(plan):
+    additions = sum(1 for change in plan if change.add)
+    return str(additions) + " members to add roles to, " + str(len(plan) - additions) + " members to remove roles from"
+
+
+# Apply a plan with a few changes in flight at once, paced by rate limits, saving a cursor as it goes so an
+# interrupted run can pick up where it left off.
+async def applyRoleChanges(guild, plan, concurrency=None, bucket=None):
+    concurrency = config.reconcile_concurrency if concurrency is None else concurrency
+    bucket = rateHelpers.TokenBucket(rate=2.0, max_rate=10.0) if bucket is None else bucket
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # The cursor only moves past a member once they and everyone before them in the plan are done
+    finished = [False] * len(plan)
+    state = {"watermark": 0, "unsaved": 0, "applied": 0, "failed": 0}
+
+    async def saveCursor():
+        if state["watermark"] > 0:
+            await run_in_db(setCursor, guild.id, plan[state["watermark"] - 1].member.id)
+        state["unsaved"] = 0
+
+    async def applyChange(index, change):
+        async with semaphore:
+            try:
+                if change.add:
+                    await bucket.call(change.member.add_roles, change.role, reason="Role reconciliation")
+                    logger.info("Added role to " + change.member.name)
+                else:
+                    await bucket.call(change.member.remove_roles, change.role, reason="Role reconciliation")
+                    logger.info("Removed role from " + change.member.name)
+                state["applied"] += 1
+            except Exception as e:
+                state["failed"] += 1
+                logger.error("Unable to update roles for " + change.member.name + ": " + str(e))
+
+            finished[index] = True
+            while state["watermark"] < len(plan) and finished[state["watermark"]]:
+                state["watermark"] += 1
+
+            state["unsaved"] += 1
+            if state["unsaved"] >= CURSOR_SAVE_INTERVAL:
+                await saveCursor()
+
+    with rateHelpers.watch_rate_limits(bucket):
+        try:
+            await asyncio.gather(*[applyChange(index, change) for index, change in enumerate(plan)])
+        finally:
+            await saveCursor()
+
+    # Finished, so the next run starts from scratch
+    await run_in_db(clearCursor, guild.id)
+
+    return state["applied"], state["failed"]
+
+
+async def getCursor(guild_id):
+    return await run_in_db(readCursor, guild_id)
+
+
+def readCursor(session, guild_id):
+    cursor = session.query(RoleReconcileCursor).filter_by(guild_id=str(guild_id)).first()
+    return None if cursor is None else int(cursor.last_member_id)
+
+
+def setCursor(session, guild_id, member_id):
+    session.merge(RoleReconcileCursor(guild_id=str(guild_id), last_member_id=str(member_id)))
+
+
+def clearCursor(session, guild_id):
+    session.query(RoleReconcileCursor).filter_by(guild_id=str(guild_id)).delete()
@@ -1,13 +1,26 @@
 # Run the bot as a discord client
+#
+# python runDiscord.py [--shard-count N --shard-ids 0-3]
+#   Runs only the given shards (runSharded.py starts one of these per range of shards)
+from helpers import startupHelpers  # first, so startup timing covers the other imports
+import argparse
+import asyncio
 import logging
 
 import discord
 
-import apikeys
 import config
+import deletionScheduler
 import evebot
-from helpers import commandHelpers, discordHelpers
-from models import Service, Server, Chat, User, Session, get_or_create
+import gdprWorker
+import jobScheduler
+import logRetention
+import messageMirror
+import metadata
+import reactableRegistry
+from helpers import commandHelpers, discordHelpers, logHelpers, metricsHelpers, shardHelpers
+import models
+from models import Service, User, get_or_create, run_in_db
 
 logger = logging.getLogger(__name__)
 
@@ -24,11 +37,20 @@ else:
                         format='%(asctime)s %(levelname)-8s %(message)s', 
                         datefmt='%Y-%m-%d %H:%M:%S')
 
+startupHelpers.mark("imports")
+
 
 class DiscordClient(discord.Client):
     def __init__(self, **kwargs):
         self.eve = None
         self.service = None
+        self.log_pipeline = logHelpers.LogPipeline(self)
+        self.message_store = logHelpers.MessageStore()
+        self.retention_task = None
+        self.metrics_runner = None
+
+        # Edits and deletes are logged from the message store, so discord.py's own message cache isn't needed
+        kwargs.setdefault("max_messages", None)
         super().__init__(**kwargs)
 
     # Sets up the bot and makes sure it knows who it is.
@@ -36,98 +58,173 @@ class DiscordClient(discord.Client):
         logger.info('Logged in as')
         logger.info(client.user.name)
         logger.info(client.user.id)
+        if getattr(self, "shard_ids", None) is not None:
+            logger.info("Shards " + shardHelpers.format_shard_ids(self.shard_ids) + " of " + str(self.shard_count))
         logger.info('------')
 
-        session = Session()
-        session.expire_on_commit = False
-        self.service = get_or_create(session, Service, name="discord")
-        database_user = get_or_create(session, User, id=client.user.id, service_id=self.service.id)
-        database_user.username = client.user.display_name
+        database_user = await self.load_bot_user()
 
         try:
-            session.commit()
-        except:
-            logger.error("Couldn't commit bot user to database!")
-            session.rollback()
-        finally:
-            session.close()
+            await reactableRegistry.load_reactables()
+        except Exception as e:
+            logger.error("Couldn't load reactable messages! " + str(e))
+
+        # on_ready is called again after reconnecting, only report the first (cold) start
+        if self.eve is None:
+            startupHelpers.mark("login")
+            startupHelpers.log_report()
 
         self.eve = evebot.EveBot(database_user)
 
+        # on_ready is called again after reconnecting, so only start this once
+        if self.retention_task is None:
+            self.retention_task = asyncio.ensure_future(logRetention.runLogRetention(self))
+            await deletionScheduler.deletionScheduler.start(self)
+            gdprWorker.gdprWorker.start()
+
+        if config.metrics_port is not None and self.metrics_runner is None:
+            # Each shard process serves its own metrics, on consecutive ports
+            port = config.metrics_port + min(getattr(self, "shard_ids", None) or [0])
+            try:
+                self.metrics_runner = await metricsHelpers.start_metrics_server(config.metrics_host, port)
+            except OSError as e:
+                logger.error("Couldn't serve metrics on port " + str(port) + ": " + str(e))
+
+        # Catch the message mirror up with anything sent while we were offline
+        if config.message_mirror_enabled:
+            asyncio.ensure_future(messageMirror.messageMirror.backfill(self.guilds))
+
+    # Makes sure the bot user is in the database. If it can't be saved the bot still runs, as the same (unsaved) user.
+    async def load_bot_user(self):
+        try:
+            self.service, database_user = await run_in_db(store_bot_user, self.user.id, self.user.display_name)
+        except Exception as e:
+            logger.error("Couldn't commit bot user to database! " + str(e))
+
+            if self.service is None:
+                self.service = Service(name="discord")
+            database_user = User(id=self.user.id, service_id=self.service.id, username=self.user.display_name)
+
+        return database_user
+
     # Processes messages by checking for commands and reactions
+    @metricsHelpers.timed_event
     async def on_message(self, message):
 
+        if config.message_mirror_enabled:
+            messageMirror.messageMirror.record(message)
+
         if not discordHelpers.shouldProcessMessage(message):
             return
 
+        # Remember what was said in logged guilds, in case it is later edited or deleted
+        if message.guild is not None and message.guild.id in config.log_channels:
+            self.message_store.add(message)
+
         # if someone trying to run a command is not authorised, return
         if commandHelpers.is_command(message.content) and not discordHelpers.hasApprovedRole(message.author):
             return
 
         if self.eve:
-            metadata = await self.construct_metadata(message)
-            if metadata is None:
+            message_metadata = await self.construct_metadata(message)
+            if message_metadata is None:
                 return
 
             sendReply = discordHelpers.buildSendReply(message)
 
             # Actually process the message
             try:
-                await self.eve.read(message.content, metadata, sendReply)
+                await self.eve.read(message.content, message_metadata, sendReply)
             except Exception as e:
                 logger.error("Error reading message: " + str(e))
 
-    async def on_message_delete(self, message):
+    # Edits and deletes are handled from raw events, using our own store of recent messages rather than
+    # discord.py's message cache, so we can log far more history for far less memory
+    @metricsHelpers.timed_event
+    async def on_raw_message_delete(self, event):
+        if config.message_mirror_enabled:
+            messageMirror.messageMirror.record_delete([event.message_id])
 
-        if not discordHelpers.shouldProcessMessage(message):
+        loggedMessage = self.message_store.pop(event.message_id)
+        if loggedMessage is None or logHelpers.is_log_channel(event.guild_id, event.channel_id):
             return
 
-        log_channel_id = config.log_channels.get(message.guild.id)
-        log_channel = discord.utils.get(message.guild.text_channels, id=log_channel_id)
+        # Only messages from guild channels are stored, so the channel will have a guild
+        channel = self.get_channel(event.channel_id)
+        if channel is None:
+            return
 
-        embed = discordHelpers.buildOnDeleteLogEmbed(message)
-        
-        try:
-            await log_channel.send(embed=embed)
-        except discord.Forbidden as e:
-            logger.error("Do not have permissions to log deleted message. " + str(e))
-        except discord.HTTPException as e:
-            logger.error("Could not log deleted message. " + str(e))
+        embed = discordHelpers.buildOnDeleteLogEmbed(loggedMessage, channel.name)
+        self.log_pipeline.log(channel.guild, embed)
+
+    # Bulk deletes (purges) are logged as a single summary entry rather than one entry per message
+    @metricsHelpers.timed_event
+    async def on_raw_bulk_message_delete(self, event):
+        if config.message_mirror_enabled:
+            messageMirror.messageMirror.record_delete(event.message_ids)
 
-    async def on_message_edit(self, before, after):
+        if event.guild_id is None:
+            return
 
-        if not discordHelpers.shouldProcessMessage(before):
+        # runs only on debug channels if debug is enabled.
+        if config.DEBUG and event.channel_id not in config.debug_channel_ids:
             return
 
-        # Work around for weird behaviour where the edit event
-        # gets called twice (the second time with blank message content)
-        if before.content == "" and after.content == "":
-            before.content = "None"
-            after.content = "None"
+        loggedMessages = [self.message_store.pop(message_id) for message_id in event.message_ids]
 
-        # Work around for weird behaviour where the edit event gets called after discord updates link previews
-        if before.content == after.content:
+        if logHelpers.is_log_channel(event.guild_id, event.channel_id):
             return
-        
-        log_channel_id = config.log_channels.get(before.guild.id)
-        log_channel = discord.utils.get(before.guild.text_channels, id=log_channel_id)
 
-        embed = discordHelpers.buildOnEditLogEmbed(before, after)
-        
-        try:
-            await log_channel.send(embed=embed)
-        except discord.Forbidden as e:
-            logger.error("Do not have permissions to log edited message. " + str(e))
-        except discord.HTTPException as e:
-            logger.error("Could not log edited message. " + str(e))
+        guild = self.get_guild(event.guild_id)
+        channel = self.get_channel(event.channel_id)
+        if guild is None or channel is None:
+            return
+
+        embed = discordHelpers.buildOnBulkDeleteLogEmbed(channel, len(event.message_ids),
+                                                         [loggedMessage for loggedMessage in loggedMessages if loggedMessage is not None])
+        self.log_pipeline.log(guild, embed)
 
+    @metricsHelpers.timed_event
+    async def on_raw_message_edit(self, event):
+        if config.message_mirror_enabled:
+            messageMirror.messageMirror.record_edit(event.message_id, event.data)
+
+        # Work around for discord sending edit events when it updates link previews (these have no content)
+        if "content" not in event.data:
+            return
+
+        before = self.message_store.get(event.message_id)
+        if before is None:
+            return
+
+        after = before.edited(event.data)
+        self.message_store.put(event.message_id, after)
+
+        # Work around for edit events that don't change the content (e.g the second of a pair of blank edits)
+        if before.content == after.content or logHelpers.is_log_channel(event.data.get("guild_id"), event.channel_id):
+            return
+
+        # Only messages from guild channels are stored, so the channel will have a guild
+        channel = self.get_channel(event.channel_id)
+        if channel is None:
+            return
+
+        embed = discordHelpers.buildOnEditLogEmbed(before, after, channel.name)
+        self.log_pipeline.log(channel.guild, embed)
+
+    @metricsHelpers.timed_event
     async def on_raw_reaction_add(self, event):
         await self.do_raw_reactions(event, "REACTION_ADD")
         
+    @metricsHelpers.timed_event
     async def on_raw_reaction_remove(self, event):
         await self.do_raw_reactions(event, "REACTION_REMOVE")
 
     async def do_raw_reactions(self, event, event_type):
+        # Most reactions are on messages we don't care about, drop them before any API call
+        if not reactableRegistry.is_reactable(event.message_id):
+            return
+
         channel = self.get_channel(event.channel_id)
         if channel is None:
             return
@@ -157,19 +254,40 @@ class DiscordClient(discord.Client):
 
         if self.eve:
             
-            metadata = await self.construct_metadata(message)
-            if metadata is None:
+            message_metadata = await self.construct_metadata(message)
+            if message_metadata is None:
                 return
 
-            metadata["user"] = user
-            metadata["event"] = event
+            message_metadata["user"] = user
+            message_metadata["event"] = event
 
             # Actually process the message
             try:
-                await self.eve.do_tag_reacts(event_type, metadata)
+                await self.eve.do_tag_reacts(event_type, message_metadata)
             except Exception as e:
                 logger.error("Error processing tag reaction: " + str(e))
 
+    async def on_guild_channel_create(self, channel):
+        if config.message_mirror_enabled:
+            messageMirror.messageMirror.mark_backfilled(channel)
+
+    async def on_guild_channel_delete(self, channel):
+        self.log_pipeline.invalidate(channel.guild.id)
+
+    async def on_guild_channel_update(self, before, after):
+        self.log_pipeline.invalidate(after.guild.id)
+
+    async def close(self):
+        if self.retention_task is not None:
+            self.retention_task.cancel()
+        deletionScheduler.deletionScheduler.stop()
+        jobScheduler.jobScheduler.cancel_all()
+        await gdprWorker.gdprWorker.stop()
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        await self.log_pipeline.close()
+        await super().close()
+
     async def on_member_join(self, member):
         pass
 
@@ -178,32 +296,56 @@ class DiscordClient(discord.Client):
 
     async def construct_metadata(self, message):
         try:
-            session = Session()
-            session.expire_on_commit = False
-
             if message.guild:
-                current_server = Server(id=message.guild.id, service_id=self.service.id, server_name=message.guild.name)
+                current_server = metadata.server_data(message.guild.id, self.service.id, message.guild.name)
             else:
                 current_server = None
 
-            current_user = User(id=message.author.id, service_id=self.service.id, username=message.author.display_name)
+            current_user = metadata.UserData(message.author.id, self.service.id, message.author.display_name)
 
-            if message.channel.name:
-                current_channel = Chat(id=message.channel.id, server_id=current_server.id, chat_name=message.channel.name, nsfw=message.channel.is_nsfw())
-            else:
-                current_channel = get_or_create(session, Chat, id=message.channel.id, server_id=current_server.id, chat_name=message.channel.id)
+            # Channels without a name fall back to using their id as the name
+            chat_name = message.channel.name or message.channel.id
+            current_channel = metadata.chat_data(message.channel.id, current_server.id, chat_name, message.channel.is_nsfw())
 
         except Exception as e:
             logger.error("Couldn't get data from message! " + str(e))
             return None
         
         # Metadata for use by commands and reactions
-        metadata = {"service": self.service, "user":current_user, "server":current_server, "chat":current_channel, "message":message, "client":self}
-        return metadata
+        return metadata.Metadata(service=self.service, user=current_user, server=current_server,
+                                 chat=current_channel, message=message, client=self)
+
+# The same client connected to only some shards. Each guild's events all arrive on one shard, so the in
+# memory state (message store, reactables, log queues) of a process only ever concerns its own guilds.
+class ShardedDiscordClient(DiscordClient, discord.AutoShardedClient):
+    pass
+
+
+def store_bot_user(session, user_id, display_name):
+    service = get_or_create(session, Service, name="discord")
+    database_user = get_or_create(session, User, id=user_id, service_id=service.id)
+    database_user.username = display_name
+
+    return service, database_user
 
 
 if __name__ == "__main__":
+    import apikeys
+
+    with startupHelpers.timed("schema"):
+        models.create_schema()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shard-count", type=int)
+    parser.add_argument("--shard-ids", type=shardHelpers.parse_shard_ids)
+    args = parser.parse_args()
+
     intents = discord.Intents.default()
     intents.members = True
-    client = DiscordClient(intents=intents)
+
+    if args.shard_count:
+        client = ShardedDiscordClient(intents=intents, shard_count=args.shard_count, shard_ids=args.shard_ids)
+    else:
+        client = DiscordClient(intents=intents)
+
     client.run(apikeys.discordkey)
@@ -1,10 +1,27 @@
+# Run the bot locally, on the commandline
+#
+# python runLocal.py [--replay corpus.jsonl [--rate N] [--concurrency N] [--repeat N]]
+#   --replay       replay a corpus of events (see eventReplay.py) instead, and report throughput and latency.
+#                  Use "synthetic:N" for N generated events.
+#   --rate         events started per second (default: as fast as possible)
+#   --concurrency  most events in flight at once when replaying as fast as possible
+#   --repeat       replay the corpus this many times
+from helpers import startupHelpers  # first, so startup timing covers the other imports
+import argparse
 import evebot
+import eventReplay
 import asyncio
 import traceback
+import models
 from models import User, Chat, Server, Service, Session, get_or_create
 
+startupHelpers.mark("imports")
+
 # A local client for testing commands out
 def run():
+    with startupHelpers.timed("schema"):
+        models.create_schema()
+
     eve = evebot.EveBot(User(id=0, username="Eve"))
 
     if(eve):
@@ -13,6 +30,7 @@ def run():
             print("Eve: " + text)
 
         print("Running Locally")
+        print(startupHelpers.report())
         loop = asyncio.get_event_loop()
 
         while(1):
@@ -42,5 +60,25 @@ def run():
                 session.close()
         loop.close()
 
+def replay(path, rate=None, concurrency=100, repeat=1):
+    if path.startswith("synthetic:"):
+        events = eventReplay.generate_corpus(int(path[len("synthetic:"):]))
+    else:
+        events = eventReplay.read_corpus(path)
+
+    replayer = eventReplay.Replayer()
+    report = asyncio.get_event_loop().run_until_complete(replayer.run(events * repeat, rate=rate, concurrency=concurrency))
+    print(report.describe())
+
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replay")
+    parser.add_argument("--rate", type=float)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.replay:
+        replay(args.replay, rate=args.rate, concurrency=args.concurrency, repeat=args.repeat)
+    else:
+        run()
@@ -1,9 +1,13 @@
-import datetime
+# Run log retention once, for every log channel, and exit. The main bot already does this on a schedule
+# (see logRetention.py), so this is only needed to clean up by hand.
+import logging
+
 import discord
+
 import apikeys
-import logging
-import config 
-import time
+import config
+import logRetention
+import models
 
 logger = logging.getLogger(__name__)
 
@@ -16,39 +20,11 @@ else:
 class CleanupClient(discord.Client):
     async def on_ready(self):
         logger.info("Initiating log cleanup.")
-        channel = self.get_channel(config.log_channels.get(config.servers.get("TMHC")))
-        if(channel is None):
-            logger.error("Unable to find log channel!")
-        messg_count = 0 
-        message_list = []
-
-        async for message in channel.history(limit=None):
-            if(datetime.datetime.now().timestamp() - message.created_at.timestamp() > 86400):
-                message_list.append(message)
-                messg_count += 1
-            if len(message_list) == 99:
-                try:
-                    await channel.delete_messages(message_list)
-                    time.sleep(1)
-                except Exception as e:
-                    logger.error(e)
-                    for message in message_list:
-                        await message.delete()
-                        time.sleep(1)
-                message_list = []
-        try:
-            await channel.delete_messages(message_list)
-            time.sleep(1)
-        except Exception as e:
-            logger.error(e)
-            for message in message_list:
-                await message.delete()
-                time.sleep(1)
-        message_list = []
-
-        logger.info(str(messg_count) + " messages deleted.")
+        await logRetention.purgeAllExpiredLogs(self)
         await self.close()
 
 if(__name__ == "__main__"):
+    models.create_schema()
+
     client = CleanupClient()
     client.run(apikeys.workerkey)
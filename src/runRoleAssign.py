@@ -1,11 +1,16 @@
-# Assign a role to all members in the discord
+# Make sure every member has the right roles (see config.reconcile_roles)
 # Use when someone fucks the roles again
-import datetime
+#
+# python runRoleAssign.py [--dry-run] [--restart]
+#   --dry-run  only print the changes which would be made
+#   --restart  ignore the cursor left by an interrupted run and start from the first member
+import argparse
 import discord
 import apikeys
 import logging
-import config 
-import asyncio
+import config
+import models
+import roleReconciler
 
 logger = logging.getLogger(__name__)
 
@@ -16,32 +21,41 @@ else:
     logging.basicConfig(level=logging.INFO)
 
 class RoleClient(discord.Client):
+    def __init__(self, dry_run=False, restart=False, **kwargs):
+        self.dry_run = dry_run
+        self.restart = restart
+        super().__init__(**kwargs)
+
     async def on_ready(self):
         logger.info("Initiating role assignment..")
         guild = self.get_guild(config.servers.get("TMHC"))
-        role = guild.get_role(config.roles["TMHC"]["Member"])
-        badrole = guild.get_role(config.roles["TMHC"]["404"])
-        user_count = 0 
-
-        for member in guild.members[700:]:
-            try:
-                if(badrole not in member.roles):
-                    if(role not in member.roles):
-                        logger.info("Added role to " + member.name)
-                        await member.add_roles(role) 
-                        await asyncio.sleep(1)
-                        user_count += 1
-                else:
-                    if(role in member.roles):
-                        await member.remove_roles(role)
-                        logger.info("Removed role from " + member.name)
-                        await asyncio.sleep(1)
-            except Exception as e:
-                logger.error(e)
-
-        logger.info(str(user_count) + " users updated.")
+
+        cursor = None if self.restart else await roleReconciler.getCursor(guild.id)
+        if cursor is not None:
+            logger.info("Resuming from member " + str(cursor))
+
+        plan = roleReconciler.planRoleChanges(guild, after_member_id=cursor)
+        logger.info("Plan: " + roleReconciler.describePlan(plan))
+
+        if self.dry_run:
+            for change in plan:
+                logger.info(("Add " if change.add else "Remove ") + change.role.name + ": " + change.member.name)
+        else:
+            applied, failed = await roleReconciler.applyRoleChanges(guild, plan)
+            logger.info(str(applied) + " users updated, " + str(failed) + " failed.")
+
         await self.close()
 
 if(__name__ == "__main__"):
-    client = RoleClient()
+    models.create_schema()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--restart", action="store_true")
+    args = parser.parse_args()
+
+    # The member list is needed to plan the changes
+    intents = discord.Intents.default()
+    intents.members = True
+    client = RoleClient(dry_run=args.dry_run, restart=args.restart, intents=intents)
     client.run(apikeys.discordkey)
@@ -0,0 +1,43 @@
+# Run the bot as several processes, each connected to a range of shards (see config.shard_count)
+#
+# python runSharded.py [--shards N] [--processes P]
+#
+# Each process is a normal runDiscord.py, so they only share state through the database.
+import argparse
+import asyncio
+import logging
+import os
+import signal
+
+import config
+import models
+from helpers import shardHelpers
+
+logger = logging.getLogger(__name__)
+
+# Only log debug messages in debug mode
+if (config.DEBUG):
+    logging.basicConfig(level=logging.DEBUG)
+else:
+    logging.basicConfig(level=logging.INFO)
+
+if(__name__ == "__main__"):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, default=config.shard_count)
+    parser.add_argument("--processes", type=int, default=config.shard_processes)
+    args = parser.parse_args()
+
+    if not args.shards:
+        parser.error("set shard_count in config.py, or pass --shards")
+
+    # Create the tables once, before the processes race to do it
+    models.create_schema()
+
+    supervisor = shardHelpers.ShardSupervisor(os.path.join(config.ROOT_DIR, "runDiscord.py"), args.shards, args.processes,
+                                              restart_delay=config.shard_restart_delay)
+
+    loop = asyncio.get_event_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, supervisor.stop)
+
+    loop.run_until_complete(supervisor.run())
@@ -0,0 +1,74 @@
+import os
+import random
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from helpers.basicResponseHelpers import split_message, MAX_MESSAGE_SIZE
+
+
+def random_text(size):
+    words = ["lorem", "ipsum", "dolor", "sit", "amet.", "consectetur\n", "<@123456789012345678>", "adipiscing", "elit!"]
+    parts = []
+    length = 0
+
+    while length < size:
+        word = random.choice(words)
+        parts.append(word)
+        length += len(word) + 1
+
+    return " ".join(parts)[:size]
+
+
+class SplitMessageTestCase(unittest.TestCase):
+    def assertValidChunks(self, message, chunks):
+        self.assertEqual("".join(chunks), message)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), MAX_MESSAGE_SIZE)
+
+    def test_short_message_is_not_split(self):
+        self.assertEqual(split_message("hello"), ["hello"])
+
+    def test_prefers_sentence_breaks(self):
+        message = ("a" * 1500) + ". " + ("b " * 400)
+        chunks = split_message(message)
+
+        self.assertValidChunks(message, chunks)
+        self.assertTrue(chunks[0].endswith(". "))
+
+    def test_never_splits_code_blocks_or_mentions(self):
+        block = "```" + ("code line\n" * 50) + "```"
+        mention = "<@!123456789012345678>"
+        message = ("word " * 300) + block + " " + ("word " * 200) + mention + (" word" * 300)
+        chunks = split_message(message)
+
+        self.assertValidChunks(message, chunks)
+        self.assertTrue(any(block in chunk for chunk in chunks))
+        self.assertTrue(any(mention in chunk for chunk in chunks))
+
+    def test_hard_splits_text_without_breaks(self):
+        message = "x" * (MAX_MESSAGE_SIZE * 3 + 5)
+        chunks = split_message(message)
+
+        self.assertValidChunks(message, chunks)
+        self.assertEqual(len(chunks), 4)
+
+    def test_benchmark_1mb(self):
+        random.seed(0)
+        message = random_text(1000 * 1000)
+
+        started = time.perf_counter()
+        chunks = split_message(message)
+        elapsed = time.perf_counter() - started
+
+        self.assertValidChunks(message, chunks)
+        # Splits at a break near the limit, rather than leaving lots of short messages
+        self.assertGreaterEqual(len(chunks), len(message) // MAX_MESSAGE_SIZE)
+        self.assertLess(len(chunks), len(message) // (MAX_MESSAGE_SIZE // 2))
+        self.assertLess(elapsed, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
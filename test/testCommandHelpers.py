@@ -0,0 +1,37 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from helpers import commandHelpers
+
+MESSAGES = [None, "", ".", "/", "..ping", "ping", ".ping", "/PING", ".Pi-ng!", ".ping  Some   Args ", ".gdpr 1234 jsonl",
+            ".héllo wörld", ".İstanbul", ".roll 2d6", "/8ball will it work?", ". ping", ".ping\targ", "hello .ping"]
+
+
+# How commands were parsed before: checked, then split, keeping the command's allowed characters one at a time
+def old_parse_command(string):
+    if not commandHelpers.is_command(string):
+        return None
+
+    valid_characters = "abcdefghijklmnopqrstuvwxyz1234567890"
+    command = string.split(" ")
+    return [''.join([char for char in command[0][1:].lower() if char in valid_characters]),
+            [arg.strip() for arg in command[1:] if arg.strip() != ""]]
+
+
+class ParseCommandTestCase(unittest.TestCase):
+    def test_parses_the_same_as_before(self):
+        for message in MESSAGES:
+            with self.subTest(message=message):
+                self.assertEqual(commandHelpers.parse_command(message), old_parse_command(message))
+
+    def test_examples(self):
+        self.assertEqual(commandHelpers.parse_command(".Pi-ng!  Some Args "), ["ping", ["Some", "Args"]])
+        self.assertIsNone(commandHelpers.parse_command("..ping"))
+        self.assertIsNone(commandHelpers.parse_command("ping"))
+
+
+if __name__ == '__main__':
+    unittest.main()
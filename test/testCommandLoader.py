@@ -0,0 +1,199 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import commandRegistry
+import commandLoader
+import commands
+import config
+
+MODULE_NAME = "testLoaderCommands"
+
+# A command module as the loader sees them: registrations made by decorators with literal arguments
+MODULE_SOURCE = '''import commandRegistry
+
+command = commandRegistry.command
+help_text = commandRegistry.help_text
+restrictions = commandRegistry.restrictions
+
+
+@restrictions(1)
+@help_text("Replies with the module version")
+@command("loaderversion", "lv")
+async def loaderversion(command_data, metadata, send_reply):
+    return "{version}"
+'''
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+# Runs the loader against a command module in a temporary directory rather than src/commands
+class TemporaryModuleTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, MODULE_NAME + ".py")
+
+        for patcher in (mock.patch.object(commands, "__path__", list(commands.__path__) + [self.directory]),
+                        mock.patch.object(commands, "find_modules", self.find_modules),
+                        mock.patch.object(commandLoader, "module_path", self.module_path)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.addCleanup(self.forget_module)
+
+    def find_modules(self):
+        found = [name for name in commands.__all__ if name != MODULE_NAME]
+        return found + ([MODULE_NAME] if os.path.isfile(self.path) else [])
+
+    def module_path(self, module_name):
+        if module_name == MODULE_NAME:
+            return self.path
+        return os.path.join(os.path.dirname(commands.__file__), module_name + ".py")
+
+    def write_module(self, source):
+        with open(self.path, "w") as fileHandler:
+            fileHandler.write(source)
+
+    def forget_module(self):
+        commandLoader.unregister_module(MODULE_NAME)
+        sys.modules.pop(commands.__name__ + "." + MODULE_NAME, None)
+        if hasattr(commands, MODULE_NAME):
+            delattr(commands, MODULE_NAME)
+        commandLoader.fileVersions.pop(self.path, None)
+        commandRegistry.registry_changed()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def call(self, server, name):
+        return run(commandRegistry.get_dispatch_table(server)[name](["", []], {}, None))
+
+
+class LazyLoadingTestCase(TemporaryModuleTestCase):
+    def test_module_is_registered_without_importing_it(self):
+        self.write_module(MODULE_SOURCE.format(version="1"))
+
+        with mock.patch.object(config, "lazy_load_commands", True):
+            self.assertTrue(commandLoader.register_module(MODULE_NAME))
+
+        proxy = commandRegistry.commandsDict["loaderversion"]
+        self.assertIsInstance(proxy, commandLoader.LazyFunction)
+        self.assertIs(commandRegistry.commandsDict["lv"], proxy)
+        self.assertEqual(commandRegistry.restrictionsDict[proxy], frozenset([1]))
+        self.assertEqual(commandRegistry.help_texts["loaderversion"], "Replies with the module version")
+        self.assertNotIn(commands.__name__ + "." + MODULE_NAME, sys.modules)
+
+        # Restrictions apply before the module is ever imported
+        self.assertNotIn("loaderversion", commandRegistry.get_dispatch_table(2))
+
+        # The first call imports the module, which registers the real function in place of the proxy
+        self.assertEqual(self.call(1, "loaderversion"), "1")
+        self.assertIn(commands.__name__ + "." + MODULE_NAME, sys.modules)
+
+        function = commandRegistry.commandsDict["loaderversion"]
+        self.assertNotIsInstance(function, commandLoader.LazyFunction)
+        self.assertEqual(commandRegistry.restrictionsDict[function], frozenset([1]))
+        self.assertFalse(any(isinstance(registered, commandLoader.LazyFunction) and registered.module_name == MODULE_NAME
+                             for registered in commandRegistry.restrictionsDict))
+        self.assertIs(commandRegistry.get_dispatch_table(1)["lv"], function)
+
+    def test_modules_with_dynamic_registrations_are_imported_straight_away(self):
+        self.write_module(MODULE_SOURCE.format(version="1").replace('@command("loaderversion", "lv")',
+                                                                    '@command(*["loaderversion", "lv"][:1])'))
+
+        with mock.patch.object(config, "lazy_load_commands", True):
+            self.assertFalse(commandLoader.register_module(MODULE_NAME))
+
+        self.assertIn(commands.__name__ + "." + MODULE_NAME, sys.modules)
+        self.assertNotIsInstance(commandRegistry.commandsDict["loaderversion"], commandLoader.LazyFunction)
+
+    def test_restrictions_from_config_are_resolved_without_importing(self):
+        self.write_module(MODULE_SOURCE.format(version="1").replace("@restrictions(1)",
+                                                                    '@restrictions(config.servers.get("LoaderTest"), config.servers.get("Missing"))')
+                          .replace("import commandRegistry", "import commandRegistry\nimport config"))
+
+        with mock.patch.object(config, "lazy_load_commands", True), mock.patch.dict(config.servers, {"LoaderTest": 7}):
+            self.assertEqual(commandLoader.read_manifest(self.path)[0][1][-1], ("restrictions", [7, None]))
+            self.assertTrue(commandLoader.register_module(MODULE_NAME))
+
+        self.assertNotIn(commands.__name__ + "." + MODULE_NAME, sys.modules)
+        self.assertIn("loaderversion", commandRegistry.get_dispatch_table(7))
+        self.assertNotIn("loaderversion", commandRegistry.get_dispatch_table(1))
+
+    # Reading the manifest must never run the module's code, only look at it
+    def test_decorator_arguments_are_not_evaluated(self):
+        record = mock.Mock(return_value=1)
+
+        with mock.patch.object(config, "record", record, create=True):
+            for argument in ("config.record()", "config.servers.get(config.record())", "__import__('os').getpid()",
+                             "config.missing_setting", "config.lazy_load_commands.get(1)"):
+                with self.subTest(argument=argument):
+                    self.write_module(MODULE_SOURCE.format(version="1").replace("@restrictions(1)", "@restrictions(" + argument + ")"))
+                    self.assertIsNone(commandLoader.read_manifest(self.path))
+
+        record.assert_not_called()
+
+    def test_lazy_loading_can_be_turned_off(self):
+        self.write_module(MODULE_SOURCE.format(version="1"))
+
+        with mock.patch.object(config, "lazy_load_commands", False):
+            self.assertFalse(commandLoader.register_module(MODULE_NAME))
+
+        self.assertEqual(self.call(1, "loaderversion"), "1")
+
+
+class ReloadTestCase(TemporaryModuleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write_module(MODULE_SOURCE.format(version="1"))
+
+        with mock.patch.object(config, "lazy_load_commands", False):
+            commandLoader.register_module(MODULE_NAME)
+
+    def reload(self):
+        reloaded, failed = commandLoader.reload_changed()
+        return reloaded, {name: str(error) for name, error in failed.items()}
+
+    def test_reload_picks_up_an_edited_command(self):
+        self.assertEqual(self.reload(), ([], {}))  # nothing has changed yet
+
+        self.write_module(MODULE_SOURCE.format(version="two").replace('@command("loaderversion", "lv")',
+                                                                      '@command("loaderversion")'))
+
+        self.assertEqual(self.reload(), (["commands." + MODULE_NAME], {}))
+        self.assertEqual(self.call(1, "loaderversion"), "two")
+        self.assertNotIn("lv", commandRegistry.commandsDict)  # the dropped alias went with the old module
+
+    def test_broken_edit_keeps_the_loaded_version(self):
+        before = self.call(1, "lv")
+        registered = commandRegistry.commandsDict["loaderversion"]
+
+        self.write_module(MODULE_SOURCE.format(version="2") + "\nraise ValueError('broken')\n")
+
+        self.assertEqual(self.reload(), ([], {"commands." + MODULE_NAME: "broken"}))
+        self.assertIs(commandRegistry.commandsDict["loaderversion"], registered)
+        self.assertEqual(commandRegistry.restrictionsDict[registered], frozenset([1]))
+        self.assertEqual(self.call(1, "lv"), before)
+
+        # Once fixed it is picked up, as its file still differs from what was loaded
+        self.write_module(MODULE_SOURCE.format(version="three"))
+        self.assertEqual(self.reload(), (["commands." + MODULE_NAME], {}))
+        self.assertEqual(self.call(1, "lv"), "three")
+
+    def test_deleted_module_is_dropped(self):
+        os.remove(self.path)
+
+        self.assertEqual(self.reload(), (["commands." + MODULE_NAME], {}))
+        self.assertNotIn("loaderversion", commandRegistry.commandsDict)
+        self.assertNotIn("loaderversion", commandRegistry.help_texts)
+        self.assertNotIn(MODULE_NAME, commands.__all__)
+
+
+if __name__ == '__main__':
+    unittest.main()
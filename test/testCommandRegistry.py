@@ -0,0 +1,93 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import commandRegistry
+from helpers import basicResponseHelpers
+
+
+# Registers throwaway commands, removing them again after each test
+class RegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.registered = []
+        self.addCleanup(self.unregister)
+
+    def register(self, name, help=None, servers=None):
+        async def function(command_data, metadata, send_reply):
+            return name
+
+        function.__name__ = name
+        if servers is not None:
+            commandRegistry.restrictions(*servers)(function)
+        if help is not None:
+            commandRegistry.help_text(help)(function)
+        commandRegistry.command(name)(function)
+
+        self.registered.append(function)
+        return function
+
+    def unregister(self):
+        for function in self.registered:
+            commandRegistry.commandsDict.pop(function.__name__, None)
+            commandRegistry.restrictionsDict.pop(function, None)
+            commandRegistry.help_texts.pop(function.__name__, None)
+        commandRegistry.registry_changed()
+
+
+class HelpCacheTestCase(RegistryTestCase):
+    def test_help_is_built_once_per_server_until_the_registry_changes(self):
+        first = commandRegistry.get_help_chunks(1)
+        self.assertIs(commandRegistry.get_help_chunks(1), first)
+
+        self.register("registrytestone", help="The first test command")
+        second = commandRegistry.get_help_chunks(1)
+
+        self.assertIsNot(second, first)
+        self.assertIn("- registrytestone: The first test command", "".join(second))
+
+    def test_help_only_lists_commands_usable_in_the_server(self):
+        self.register("registrytestrestricted", help="Only in server 1", servers=[1])
+
+        self.assertIn("registrytestrestricted", "".join(commandRegistry.get_help_chunks(1)))
+        self.assertNotIn("registrytestrestricted", "".join(commandRegistry.get_help_chunks(2)))
+
+    def test_long_help_is_split_into_messages(self):
+        for index in range(40):
+            self.register("registrytest" + str(index), help="Help text which goes on for a while. " * 3)
+
+        chunks = commandRegistry.get_help_chunks(1)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= basicResponseHelpers.MAX_MESSAGE_SIZE for chunk in chunks))
+        self.assertEqual("".join(chunks).count("registrytest"), 40)
+
+
+class DispatchTableTestCase(RegistryTestCase):
+    def test_tables_apply_restrictions(self):
+        anywhere = self.register("registrytestanywhere")
+        restricted = self.register("registrytestrestricted", servers=[1, 3])
+
+        self.assertIs(commandRegistry.get_dispatch_table(1)["registrytestanywhere"], anywhere)
+        self.assertIs(commandRegistry.get_dispatch_table(1)["registrytestrestricted"], restricted)
+        self.assertIs(commandRegistry.get_dispatch_table(3)["registrytestrestricted"], restricted)
+        self.assertNotIn("registrytestrestricted", commandRegistry.get_dispatch_table(2))
+        self.assertIn("help", commandRegistry.get_dispatch_table(2))
+
+    def test_tables_are_rebuilt_when_the_registry_changes(self):
+        table = commandRegistry.get_dispatch_table(1)
+        self.assertIs(commandRegistry.get_dispatch_table(1), table)
+
+        added = self.register("registrytestadded")
+
+        self.assertIsNot(commandRegistry.get_dispatch_table(1), table)
+        self.assertIs(commandRegistry.get_dispatch_table(1)["registrytestadded"], added)
+
+        # Restricting a command afterwards takes it out of other servers' tables
+        commandRegistry.restrictions(2)(added)
+        self.assertNotIn("registrytestadded", commandRegistry.get_dispatch_table(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import asyncio
+import datetime
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import discord
+
+from helpers import deletionHelpers, rateHelpers
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+        self.reason = "Error"
+
+
+class FakeMessage:
+    def __init__(self, channel, id, missing=False):
+        self.channel = channel
+        self.id = id
+        self.missing = missing
+
+    async def delete(self):
+        if self.missing:
+            raise discord.NotFound(FakeResponse(404), "Unknown Message")
+        self.channel.deleted.append([self.id])
+
+
+class FakeChannel:
+    def __init__(self, bulk_fails=False):
+        self.bulk_fails = bulk_fails
+        self.deleted = []  # one list of ids per delete call
+
+    async def delete_messages(self, messages):
+        if self.bulk_fails:
+            raise discord.HTTPException(FakeResponse(500), "Internal Server Error")
+        self.deleted.append([message.id for message in messages])
+
+
+def snowflakes(days_old, count):
+    first = discord.utils.time_snowflake(datetime.datetime.utcnow() - datetime.timedelta(days=days_old))
+    return [first + index for index in range(count)]
+
+
+def engine_for(channel):
+    return deletionHelpers.DeletionEngine(channel, rateHelpers.TokenBucket(rate=1000.0), rateHelpers.TokenBucket(rate=1000.0))
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class DeletionEngineTestCase(unittest.TestCase):
+    def test_young_messages_are_bulk_deleted_and_old_ones_singly(self):
+        channel = FakeChannel()
+        engine = engine_for(channel)
+        young = snowflakes(1, 250)
+        old = snowflakes(30, 3)
+
+        run(engine.add_all([FakeMessage(channel, message_id) for message_id in young + old]))
+        run(engine.finish())
+
+        self.assertEqual([len(ids) for ids in channel.deleted], [100, 100, 1, 1, 1, 50])
+        self.assertEqual(sorted(sum(channel.deleted, [])), sorted(young + old))
+        self.assertEqual((engine.deleted_in_bulk, engine.deleted_singly, engine.failed), (250, 3, 0))
+
+    def test_a_lone_message_is_deleted_singly(self):
+        channel = FakeChannel()
+        engine = engine_for(channel)
+
+        run(engine.add(FakeMessage(channel, snowflakes(1, 1)[0])))
+        run(engine.finish())
+
+        self.assertEqual((engine.deleted_in_bulk, engine.deleted_singly), (0, 1))
+
+    def test_failed_bulk_deletes_fall_back_to_single_deletes(self):
+        channel = FakeChannel(bulk_fails=True)
+        engine = engine_for(channel)
+        young = snowflakes(1, 3)
+        messages = [FakeMessage(channel, message_id) for message_id in young[:2]] + [FakeMessage(channel, young[2], missing=True)]
+
+        run(engine.add_all(messages))
+        run(engine.finish())
+
+        self.assertEqual(channel.deleted, [[young[0]], [young[1]]])
+        self.assertEqual((engine.deleted_in_bulk, engine.deleted_singly, engine.failed), (0, 2, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+DB_DIR = tempfile.mkdtemp()
+os.environ.setdefault("BOT_DATABASE", "sqlite:///" + os.path.join(DB_DIR, "test.db"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import discord
+
+import deletionScheduler
+import models
+
+models.create_schema()
+
+
+class FakePartialMessage:
+    def __init__(self, channel, id):
+        self.channel = channel
+        self.id = id
+
+    async def delete(self):
+        self.channel.deleted.append([self.id])
+
+
+class FakeChannel:
+    def __init__(self, id, guild=None):
+        self.id = id
+        self.guild = guild
+        self.deleted = []  # one list of ids per delete call
+
+    def get_partial_message(self, message_id):
+        return FakePartialMessage(self, message_id)
+
+    async def delete_messages(self, messages):
+        self.deleted.append(sorted(message.id for message in messages))
+
+
+class FakeMessage:
+    def __init__(self, channel, id):
+        self.channel = channel
+        self.guild = channel.guild
+        self.id = id
+
+
+class FakeClient:
+    def __init__(self, channels):
+        self.channels = {channel.id: channel for channel in channels}
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_guild(self, guild_id):
+        return None
+
+
+def new_message_id(offset):
+    return discord.utils.time_snowflake(datetime.datetime.utcnow()) + offset
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class DeletionSchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        with models.session_scope() as session:
+            session.query(models.ScheduledDeletion).delete()
+
+    def test_due_deletions_are_bulk_deleted_together(self):
+        channel = FakeChannel(1)
+        scheduler = deletionScheduler.DeletionScheduler()
+        first, second = new_message_id(1), new_message_id(2)
+
+        async def scenario():
+            started = time.monotonic()
+            scheduler.schedule(FakeMessage(channel, first), 0.2)
+            scheduler.schedule(FakeMessage(channel, second), 0.3)
+            returned = time.monotonic() - started
+
+            while scheduler.worker is not None:
+                await asyncio.sleep(0.05)
+            return returned
+
+        self.assertLess(run(scenario()), 0.05)
+        self.assertEqual(channel.deleted, [[first, second]])
+        self.assertEqual(run(models.run_in_db(deletionScheduler.loadDeletions)), [])
+
+    def test_pending_deletions_survive_a_restart(self):
+        channel = FakeChannel(2)
+        message_id = new_message_id(3)
+
+        async def before_restart():
+            scheduler = deletionScheduler.DeletionScheduler()
+            scheduler.schedule(FakeMessage(channel, message_id), 0.2)
+            await asyncio.sleep(0.05)  # let it be saved
+            scheduler.stop()
+
+        async def after_restart():
+            scheduler = deletionScheduler.DeletionScheduler()
+            await scheduler.start(FakeClient([channel]))
+            self.assertEqual(len(scheduler), 1)
+
+            while scheduler.worker is not None:
+                await asyncio.sleep(0.05)
+
+        run(before_restart())
+        self.assertEqual(channel.deleted, [])
+
+        run(after_restart())
+        self.assertEqual(channel.deleted, [[message_id]])
+
+    def test_deletions_for_missing_channels_are_forgotten(self):
+        run(models.run_in_db(deletionScheduler.storeDeletion, 5, 404, None, datetime.datetime.utcnow()))
+
+        scheduler = deletionScheduler.DeletionScheduler()
+        run(scheduler.start(FakeClient([])))
+
+        self.assertEqual(len(scheduler), 0)
+        self.assertEqual(run(models.run_in_db(deletionScheduler.loadDeletions)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
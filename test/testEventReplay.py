@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import eventReplay
+import reactableRegistry
+
+
+# Records what the replayer dispatches, answering commands so there are replies to count
+class FakeEve:
+    def __init__(self):
+        self.messages = []
+        self.reactions = []
+
+    async def read(self, message, metadata, send_reply):
+        self.messages.append((metadata["message"].id, message))
+        if message.startswith("."):
+            await send_reply("reply to " + message)
+
+    async def do_tag_reacts(self, event_type, metadata):
+        self.reactions.append((event_type, metadata["message"].id, metadata["user"].id))
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class ReplayTestCase(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(reactableRegistry.reactablesDict)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def replay(self, events, **kwargs):
+        eve = FakeEve()
+        replayer = eventReplay.Replayer(eve=eve)
+        report = run(replayer.run(events, **kwargs))
+        return eve, replayer, report
+
+    def test_every_event_is_dispatched(self):
+        events = [
+            {"type": "reactable", "message": 1, "function": "toggle_role", "args": "0"},
+            {"type": "message", "id": 100, "content": "hello", "user": 10},
+            {"type": "message", "id": 101, "content": ".help", "user": 11, "channel": 2},
+            {"type": "edit", "message": 100, "content": "hello again"},
+            {"type": "reaction_add", "message": 1, "user": 12},
+            {"type": "reaction_remove", "message": 2, "user": 12},  # not reactable, so dropped
+            {"type": "delete", "message": 101},
+        ]
+
+        eve, replayer, report = self.replay(events, concurrency=1)
+
+        self.assertEqual(report.count, len(events))
+        self.assertEqual({event_type: len(values) for event_type, values in report.latencies.items()},
+                         {"reactable": 1, "message": 2, "edit": 1, "reaction_add": 1, "reaction_remove": 1, "delete": 1})
+        self.assertEqual(dict(report.errors), {})
+        self.assertEqual(report.replies, 1)
+
+        self.assertEqual(eve.messages, [(100, "hello"), (101, ".help")])
+        self.assertEqual(eve.reactions, [("REACTION_ADD", 1, 12)])
+        self.assertEqual(replayer.message_store.get(100).content, "hello again")
+        self.assertIsNone(replayer.message_store.get(101))
+
+    def test_unknown_events_are_counted_as_errors(self):
+        eve, replayer, report = self.replay([{"type": "typing"}])
+
+        self.assertEqual(report.count, 1)
+        self.assertEqual(dict(report.errors), {"typing ValueError": 1})
+
+    def test_a_fixed_seed_gives_the_same_run(self):
+        events = eventReplay.generate_corpus(200, seed=7)
+
+        self.assertEqual(eventReplay.generate_corpus(200, seed=7), events)
+        self.assertNotEqual(eventReplay.generate_corpus(200, seed=8), events)
+
+        first, first_replayer, first_report = self.replay(events, concurrency=1)
+        second, second_replayer, second_report = self.replay(eventReplay.generate_corpus(200, seed=7), concurrency=1)
+
+        self.assertEqual(first_report.count, len(events))
+        self.assertEqual(dict(first_report.errors), {})
+        self.assertEqual(first.messages, second.messages)
+        self.assertEqual(first.reactions, second.reactions)
+        self.assertEqual(first_replayer.replies, second_replayer.replies)
+        self.assertEqual(first_report.replies, len([event for event in events if event.get("content") == ".help"]))
+        self.assertEqual(len(first.messages), len([event for event in events if event["type"] == "message"]))
+
+
+class PercentileTestCase(unittest.TestCase):
+    def test_nearest_rank(self):
+        values = list(range(1, 11))
+
+        self.assertEqual(eventReplay.percentile(values, 0.5), 5)
+        self.assertEqual(eventReplay.percentile(values, 0.9), 9)
+        self.assertEqual(eventReplay.percentile(values, 0.99), 10)
+        self.assertEqual(eventReplay.percentile(values, 1.0), 10)
+        self.assertEqual(eventReplay.percentile(values, 0.0), 1)
+        self.assertEqual(eventReplay.percentile([3], 0.5), 3)
+
+    def test_empty(self):
+        self.assertEqual(eventReplay.percentile([], 0.5), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
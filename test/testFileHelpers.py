@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from helpers import fileHelpers
+
+CONTENT = """// A response file
+First entry
+%
+Second entry,
+over two lines
+
+// a comment in the middle of an entry
+%
+Third entry with ünïcödé
+%%
+Fourth entry after a doubled delimiter
+%
+Last entry, without a newline at the end"""
+
+
+class FileHelpersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "responses.txt")
+        self.write(CONTENT)
+
+    def tearDown(self):
+        for key in [key for key in fileHelpers.corpora if key[0] == self.path]:
+            corpus = fileHelpers.corpora.pop(key)[1]
+            if isinstance(corpus, fileHelpers.IndexedFile):
+                corpus.close()
+
+    def write(self, content):
+        with open(self.path, "w", encoding="utf-8") as fileHandler:
+            fileHandler.write(content)
+
+    def assertSameEntries(self, delimiter):
+        expected = fileHelpers.parse_file_as_array(self.path, delimiter)
+        indexed = fileHelpers.IndexedFile(self.path, delimiter)
+
+        try:
+            self.assertEqual(len(indexed), len(expected))
+            self.assertEqual([indexed[index] for index in range(len(indexed))], expected)
+            self.assertEqual(indexed[-1], expected[-1])
+        finally:
+            indexed.close()
+
+    def test_indexed_entries_match_parsing_the_whole_file(self):
+        for delimiter in (None, "%", "\n%\n", "entry"):
+            with self.subTest(delimiter=delimiter):
+                self.assertSameEntries(delimiter)
+
+    def test_out_of_range_entries_raise(self):
+        indexed = fileHelpers.IndexedFile(self.path)
+
+        try:
+            with self.assertRaises(IndexError):
+                indexed[len(indexed)]
+        finally:
+            indexed.close()
+
+    def test_corpus_is_reparsed_only_when_the_file_changes(self):
+        first = fileHelpers.get_corpus(self.path, "\n%\n")
+        self.assertIs(fileHelpers.get_corpus(self.path, "\n%\n"), first)
+        self.assertIsInstance(first, list)
+
+        self.write(CONTENT + "\n%\nA new entry")
+        second = fileHelpers.get_corpus(self.path, "\n%\n")
+
+        self.assertIsNot(second, first)
+        self.assertEqual(second[-1], "A new entry")
+
+    def test_big_files_are_indexed(self):
+        with mock.patch.object(fileHelpers, "INDEX_THRESHOLD", 0):
+            corpus = fileHelpers.get_corpus(self.path, "\n%\n")
+
+        self.assertIsInstance(corpus, fileHelpers.IndexedFile)
+        self.assertEqual(list(corpus), fileHelpers.parse_file_as_array(self.path, "\n%\n"))
+
+
+if __name__ == '__main__':
+    unittest.main()
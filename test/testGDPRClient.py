@@ -0,0 +1,143 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from discord import ChannelType
+
+import config
+import GDPRClient
+from helpers import exportHelpers
+
+USER_ID = 42
+
+
+class FakeUser:
+    def __init__(self, id):
+        self.id = id
+        self.name = "user" + str(id)
+        self.discriminator = "0001"
+
+
+class FakeChannel:
+    def __init__(self, name):
+        self.name = name
+
+
+# A text channel whose history can't be read
+class BrokenChannel(FakeChannel):
+    type = ChannelType.text
+
+    def history(self, **kwargs):
+        raise RuntimeError("Missing Access")
+
+
+class FakeGuild:
+    def __init__(self, channels=()):
+        self.id = 500
+        self.name = "guild"
+        self.channels = list(channels)
+
+
+class FakeMessage:
+    def __init__(self, guild, channel, content):
+        self.author = FakeUser(USER_ID)
+        self.guild = guild
+        self.channel = channel
+        self.created_at = "2020-01-01 00:00:00"
+        self.edited_at = None
+        self.content = content
+        self.mentions = []
+        self.attachments = []
+        self.embeds = []
+
+
+# Writes some messages into the export, then fails part way through the scan
+class FailingScanClient(GDPRClient.GDPRClient):
+    def __init__(self):
+        super().__init__()
+        self.guild = FakeGuild()
+
+    def get_guild(self, guildid):
+        return self.guild
+
+    def get_user(self, userid):
+        return FakeUser(userid)
+
+    async def scanGuild(self, guild, isMatch, handleMessages, sendReply, statusMessage):
+        channel = FakeChannel("general")
+        await handleMessages(channel, [FakeMessage(guild, channel, "message " + str(number)) for number in range(3)])
+        raise RuntimeError("scan failed")
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class GetGDPRTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.exporters = []
+        GDPRExporter = exportHelpers.GDPRExporter
+
+        def makeExporter(userid, jsonl=False):
+            exporter = GDPRExporter(userid, directory=self.directory, jsonl=jsonl, compress=False)
+            self.exporters.append(exporter)
+            return exporter
+
+        # Every write goes straight to disk, so there are part files to clean up when the scan fails
+        for patcher in (mock.patch.object(config, "message_mirror_enabled", False),
+                        mock.patch.object(exportHelpers, "BUFFER_SIZE", 0),
+                        mock.patch.object(exportHelpers, "GDPRExporter", makeExporter)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_parts_are_removed_when_the_scan_fails(self):
+        client = FailingScanClient()
+        replies = []
+
+        async def sendReply(text, **kwargs):
+            replies.append(text)
+
+        with self.assertRaisesRegex(RuntimeError, "scan failed"):
+            run(client.getGDPR(str(USER_ID), 500, sendReply))
+
+        exporter, = self.exporters
+        self.assertEqual(exporter.count, 3)
+        self.assertGreater(len(exporter.parts), 0)
+        self.assertFalse(any(os.path.exists(part) for part in exporter.parts))
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(replies, ["Compiling GDPR data..."])
+
+
+
+class ScanGuildTestCase(unittest.TestCase):
+    # The logger is the module's, so a scan works on a client which hasn't seen on_ready
+    def test_failed_channels_are_logged_and_reported(self):
+        client = GDPRClient.GDPRClient()
+        guild = FakeGuild([BrokenChannel("secret")])
+        replies = []
+
+        async def sendReply(text, **kwargs):
+            replies.append(text)
+
+        async def handleMessages(channel, messages):
+            self.fail("nothing should match")
+
+        with self.assertLogs(GDPRClient.logger, "ERROR") as logs:
+            progress = run(client.scanGuild(guild, lambda message: True, handleMessages, sendReply, None))
+
+        self.assertEqual(progress.failed, ["secret"])
+        self.assertEqual(progress.done, 1)
+        self.assertIn("Missing Access", logs.output[0])
+        self.assertEqual(replies, ["Exception while processing channels: secret"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import sys
+import types
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import gdprWorker
+import GDPRClient
+
+
+# Stands in for a logged in GDPRClient
+class FakeClient:
+    def __init__(self, **kwargs):
+        self.started = []
+        self.finished = []
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+    async def getGDPR(self, userid, guildid, sendReply, jsonl=False):
+        self.started.append(userid)
+        await asyncio.sleep(0.05)
+        self.finished.append(userid)
+        return userid
+
+
+class FakeWorker(gdprWorker.GDPRWorker):
+    def __init__(self):
+        super().__init__()
+        self.client = FakeClient()
+
+    async def connect(self):
+        return self.client
+
+
+# A GDPRClient whose login is refused
+class FailingClient(FakeClient):
+    async def start(self, token):
+        raise RuntimeError("Improper token has been passed.")
+
+    async def wait_until_ready(self):
+        await asyncio.Event().wait()
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class GDPRWorkerTestCase(unittest.TestCase):
+    def test_jobs_run_one_at_a_time_on_one_client(self):
+        worker = FakeWorker()
+        replies = []
+
+        async def sendReply(text, **kwargs):
+            replies.append(text)
+
+        async def scenario():
+            results = await asyncio.gather(*[worker.submit("getGDPR", str(userid), 1, sendReply) for userid in range(3)])
+            await worker.stop()
+            return results
+
+        self.assertEqual(run(scenario()), ["0", "1", "2"])
+        self.assertEqual(worker.client.started, ["0", "1", "2"])
+        self.assertTrue(worker.client.closed)
+        self.assertEqual(replies, ["Queued behind 1 other gdpr requests.", "Queued behind 2 other gdpr requests."])
+
+    def test_cancelled_jobs_are_stopped_or_skipped(self):
+        worker = FakeWorker()
+
+        async def sendReply(text, **kwargs):
+            pass
+
+        async def scenario():
+            running = asyncio.ensure_future(worker.submit("getGDPR", "running", 1, sendReply))
+            waiting = asyncio.ensure_future(worker.submit("getGDPR", "waiting", 1, sendReply))
+            after = asyncio.ensure_future(worker.submit("getGDPR", "after", 1, sendReply))
+            await asyncio.sleep(0.01)
+
+            running.cancel()
+            waiting.cancel()
+            result = await after
+            await worker.stop()
+            return result
+
+        self.assertEqual(run(scenario()), "after")
+        self.assertEqual(worker.client.started, ["running", "after"])
+        self.assertEqual(worker.client.finished, ["after"])
+
+    def test_on_start_is_called_when_the_job_is_picked_up(self):
+        worker = FakeWorker()
+        events = []
+
+        async def sendReply(text, **kwargs):
+            pass
+
+        async def scenario():
+            first = asyncio.ensure_future(worker.submit("getGDPR", "first", 1, sendReply, on_start=lambda: events.append(
+                ("started first", list(worker.client.finished)))))
+            second = asyncio.ensure_future(worker.submit("getGDPR", "second", 1, sendReply, on_start=lambda: events.append(
+                ("started second", list(worker.client.finished)))))
+            await asyncio.gather(first, second)
+            await worker.stop()
+
+        run(scenario())
+
+        self.assertEqual(events, [("started first", []), ("started second", ["first"])])
+
+    def test_failed_login_fails_waiting_jobs_with_a_reply(self):
+        worker = gdprWorker.GDPRWorker()
+        replies = []
+
+        async def sendReply(text, **kwargs):
+            replies.append(text)
+
+        async def scenario():
+            jobs = [asyncio.ensure_future(worker.submit("getGDPR", str(userid), 1, sendReply)) for userid in range(2)]
+            results = await asyncio.wait_for(asyncio.gather(*jobs, return_exceptions=True), 1)
+            await worker.stop()
+            return results
+
+        with mock.patch.dict(sys.modules, {"apikeys": types.SimpleNamespace(workerkey="token")}), \
+                mock.patch.object(GDPRClient, "GDPRClient", FailingClient):
+            results = run(scenario())
+
+        self.assertTrue(all(isinstance(result, gdprWorker.GDPRWorkerError) for result in results))
+        self.assertIsNone(worker.client)
+        self.assertEqual(replies, ["Queued behind 1 other gdpr requests.",
+                                   "Couldn't connect the gdpr worker: Improper token has been passed.",
+                                   "Couldn't connect the gdpr worker: Improper token has been passed."])
+
+
+if __name__ == '__main__':
+    unittest.main()
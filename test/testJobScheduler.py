@@ -0,0 +1,144 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import config
+import jobScheduler
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class JobSchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = jobScheduler.JobScheduler()
+        self.replies = []
+
+    async def sendReply(self, text, **kwargs):
+        self.replies.append(text)
+
+    async def wait_for_jobs(self):
+        await asyncio.gather(*[job.task for job in self.scheduler.jobs.values()])
+
+    def test_jobs_per_guild_are_limited(self):
+        running = []
+        most = []
+
+        async def work(sendReply):
+            running.append(1)
+            most.append(len(running))
+            await asyncio.sleep(0.02)
+            running.pop()
+
+        async def scenario():
+            jobs = [self.scheduler.submit(1, "work", work, self.sendReply) for _ in range(5)]
+            await asyncio.sleep(0)
+            statuses = [job.status for job in jobs]
+            await self.wait_for_jobs()
+            return jobs, statuses
+
+        jobs, statuses = run(scenario())
+
+        self.assertEqual(max(most), config.jobs_per_guild)
+        self.assertEqual(statuses.count("running"), config.jobs_per_guild)
+        self.assertEqual([job.status for job in jobs], ["done"] * 5)
+        self.assertEqual(len(set(job.id for job in jobs)), 5)
+
+    def test_too_many_waiting_jobs_are_refused(self):
+        async def work(sendReply):
+            await asyncio.sleep(0.01)
+
+        async def scenario():
+            for _ in range(config.max_jobs_per_guild):
+                self.scheduler.submit(1, "work", work, self.sendReply)
+            with self.assertRaises(jobScheduler.JobLimitError):
+                self.scheduler.submit(1, "work", work, self.sendReply)
+
+            # Other guilds aren't affected
+            self.scheduler.submit(2, "work", work, self.sendReply)
+            await self.wait_for_jobs()
+
+        run(scenario())
+
+    def test_cancel_and_progress(self):
+        async def work(sendReply):
+            await sendReply("Processing channel 1")
+            await asyncio.sleep(10)
+
+        async def scenario():
+            job = self.scheduler.submit(1, "regenroles", work, self.sendReply)
+            await asyncio.sleep(0.01)
+            description = job.describe()
+
+            self.assertFalse(self.scheduler.cancel(2, job.id))  # not that guild's job
+            self.assertTrue(self.scheduler.cancel(1, job.id))
+            await self.wait_for_jobs()
+            return job, description
+
+        job, description = run(scenario())
+
+        self.assertIn("Processing channel 1", description)
+        self.assertEqual(job.status, "cancelled")
+        self.assertFalse(self.scheduler.cancel(1, job.id))
+        self.assertEqual(self.replies, ["Processing channel 1", "Job #1 (regenroles) was cancelled."])
+
+    def test_timeout_and_failure(self):
+        async def slow(sendReply):
+            await asyncio.sleep(10)
+
+        async def broken(sendReply):
+            raise ValueError("broken")
+
+        async def scenario():
+            slow_job = self.scheduler.submit(1, "slow", slow, self.sendReply, timeout=0.01)
+            broken_job = self.scheduler.submit(1, "broken", broken, self.sendReply)
+            await self.wait_for_jobs()
+            return slow_job, broken_job
+
+        slow_job, broken_job = run(scenario())
+
+        self.assertEqual((slow_job.status, broken_job.status), ("timed out", "failed"))
+        self.assertIn("Job #2 (broken) failed: broken", self.replies)
+
+    def test_queued_jobs_wait_without_a_slot_or_their_timeout(self):
+        picked_up = asyncio.Event()
+
+        async def waiting(sendReply, started):
+            await picked_up.wait()
+            started()
+            await asyncio.sleep(0.01)
+
+        async def stuck(sendReply, started):
+            started()
+            await asyncio.sleep(10)
+
+        async def work(sendReply):
+            await asyncio.sleep(0.01)
+
+        async def scenario():
+            queued = [self.scheduler.submit(1, "gdpr", waiting, self.sendReply, timeout=0.05, queued=True)
+                      for _ in range(config.jobs_per_guild)]
+            other = self.scheduler.submit(1, "work", work, self.sendReply)
+            await asyncio.sleep(0.1)
+            statuses = [job.status for job in queued]
+
+            picked_up.set()
+            timed_out = self.scheduler.submit(1, "gdpr", stuck, self.sendReply, timeout=0.01, queued=True)
+            await self.wait_for_jobs()
+            return queued, other, timed_out, statuses
+
+        queued, other, timed_out, statuses = run(scenario())
+
+        self.assertEqual(statuses, ["queued"] * config.jobs_per_guild)
+        self.assertEqual(other.status, "done")
+        self.assertEqual([job.status for job in queued], ["done"] * config.jobs_per_guild)
+        self.assertEqual(timed_out.status, "timed out")
+        self.assertEqual(self.replies, ["Job #4 (gdpr) timed out after 0.01s."])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import discord
+
+import config
+from helpers import logHelpers
+
+
+class FakeAuthor:
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+class FakeAttachment:
+    def __init__(self, proxy_url):
+        self.proxy_url = proxy_url
+
+
+class FakeChannel:
+    def __init__(self, id):
+        self.id = id
+
+
+class FakeMessage:
+    def __init__(self, id, content, attachments=()):
+        self.id = id
+        self.author = FakeAuthor(5, "someone")
+        self.channel = FakeChannel(20)
+        self.content = content
+        self.attachments = [FakeAttachment(url) for url in attachments]
+
+
+class FakeGuild:
+    def __init__(self, id, channel=None):
+        self.id = id
+        self.channel = channel
+
+    def get_channel(self, channel_id):
+        return self.channel
+
+
+class FakeWebhook:
+    def __init__(self):
+        self.sent = []
+        self.blocked = None
+
+    async def send(self, embeds, username=None):
+        if self.blocked is not None:
+            await self.blocked.wait()
+        self.sent.append(list(embeds))
+
+
+class FakeLogChannel(FakeChannel):
+    def __init__(self, id):
+        super().__init__(id)
+        self.sent = []
+
+    async def send(self, text, embed=None):
+        self.sent.append(embed)
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class LogPipelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pipeline = logHelpers.LogPipeline(None)
+        self.guild = FakeGuild(config.servers["Test"])
+        self.other_guild = FakeGuild(config.servers["TMHC"])
+        self.webhooks = {guild.id: FakeWebhook() for guild in (self.guild, self.other_guild)}
+        self.pipeline.webhooks.update(self.webhooks)
+
+        patcher = mock.patch.object(logHelpers, "BATCH_WAIT", 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: run(self.pipeline.close()))
+
+    async def drain(self, *guilds):
+        await asyncio.gather(*[self.pipeline.queues[guild.id].join() for guild in guilds])
+
+    def test_webhook_entries_are_batched_in_order(self):
+        async def scenario():
+            for index in range(25):
+                self.pipeline.log(self.guild, index)
+            await self.drain(self.guild)
+
+        run(scenario())
+
+        sent = self.webhooks[self.guild.id].sent
+        self.assertEqual([len(embeds) for embeds in sent], [10, 10, 5])
+        self.assertEqual(sum(sent, []), list(range(25)))
+        self.assertEqual(self.pipeline.stats()[self.guild.id], {"sent": 25, "dropped": 0, "failed": 0, "queued": 0})
+
+    def test_channel_entries_are_sent_one_at_a_time(self):
+        channel = FakeLogChannel(config.log_channels[self.guild.id])
+        guild = FakeGuild(self.guild.id, channel)
+        self.pipeline.webhooks[guild.id] = None
+
+        async def scenario():
+            for index in range(3):
+                self.pipeline.log(guild, index)
+            await self.drain(guild)
+
+        run(scenario())
+
+        self.assertEqual(channel.sent, [0, 1, 2])
+        self.assertEqual(self.pipeline.stats()[guild.id]["sent"], 3)
+
+    def test_entries_past_a_full_queue_are_dropped_and_counted(self):
+        async def scenario():
+            with mock.patch.object(logHelpers, "MAX_QUEUE_SIZE", 3):
+                for index in range(5):
+                    self.pipeline.log(self.guild, index)
+            stats = self.pipeline.stats()[self.guild.id]
+            await self.drain(self.guild)
+            return stats
+
+        stats = run(scenario())
+
+        self.assertEqual(stats, {"sent": 0, "dropped": 2, "failed": 0, "queued": 3})
+        self.assertEqual(sum(self.webhooks[self.guild.id].sent, []), [0, 1, 2])
+        self.assertEqual(self.pipeline.stats()[self.guild.id]["sent"], 3)
+
+    def test_one_guilds_backlog_does_not_hold_up_another(self):
+        stuck = self.webhooks[self.guild.id]
+        stuck.blocked = asyncio.Event()
+
+        async def scenario():
+            for index in range(15):
+                self.pipeline.log(self.guild, index)
+            self.pipeline.log(self.other_guild, "other")
+
+            await asyncio.wait_for(self.drain(self.other_guild), 1)
+            stats = self.pipeline.stats()
+
+            stuck.blocked.set()
+            await self.drain(self.guild)
+            return stats
+
+        stats = run(scenario())
+
+        self.assertEqual(self.webhooks[self.other_guild.id].sent, [["other"]])
+        self.assertEqual((stats[self.guild.id]["sent"], stats[self.guild.id]["queued"]), (0, 5))
+        self.assertEqual(sum(stuck.sent, []), list(range(15)))
+
+
+class MessageStoreTestCase(unittest.TestCase):
+    def test_least_recently_used_messages_are_evicted(self):
+        store = logHelpers.MessageStore(max_size=3)
+
+        for message_id in (1, 2, 3):
+            store.add(FakeMessage(message_id, "message " + str(message_id)))
+
+        # Putting a message again (as edits do) makes it the most recently used
+        store.put(1, store.get(1))
+        store.add(FakeMessage(4, "message 4"))
+
+        self.assertEqual(len(store), 3)
+        self.assertIsNone(store.get(2))
+        self.assertEqual([store.get(message_id).content for message_id in (1, 3, 4)], ["message 1", "message 3", "message 4"])
+
+    def test_deleted_messages_are_popped(self):
+        store = logHelpers.MessageStore(max_size=3)
+        store.add(FakeMessage(1, "hello", attachments=["https://media.example/a.png"]))
+
+        loggedMessage = store.pop(1)
+
+        self.assertEqual((loggedMessage.message_id, loggedMessage.author_id, loggedMessage.author_name), (1, 5, "someone"))
+        self.assertEqual((loggedMessage.channel_id, loggedMessage.content), (20, "hello"))
+        self.assertEqual(loggedMessage.attachment_urls, ("https://media.example/a.png",))
+        self.assertEqual(len(store), 0)
+        self.assertIsNone(store.pop(1))
+
+    def test_edits_update_content_and_keep_what_they_dont_mention(self):
+        before = logHelpers.LoggedMessage.from_message(FakeMessage(1, "hello", attachments=["https://media.example/a.png"]))
+
+        after = before.edited({"content": "hello again", "edited_timestamp": "2020-01-01T12:00:00.000000+00:00"})
+
+        self.assertEqual((before.content, after.content), ("hello", "hello again"))
+        self.assertEqual(after.attachment_urls, before.attachment_urls)
+        self.assertEqual((after.message_id, after.author_id, after.channel_id), (1, 5, 20))
+        self.assertEqual(after.edited_at, discord.utils.parse_time("2020-01-01T12:00:00.000000+00:00"))
+
+        # Link previews arrive as edits without content, which leave it as it was
+        self.assertEqual(before.edited({"attachments": []}).content, "hello")
+        self.assertEqual(before.edited({"attachments": []}).attachment_urls, ())
+
+
+if __name__ == '__main__':
+    unittest.main()
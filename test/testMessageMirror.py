@@ -0,0 +1,79 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+DB_DIR = tempfile.mkdtemp()
+os.environ.setdefault("BOT_DATABASE", "sqlite:///" + os.path.join(DB_DIR, "test.db"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from discord import ChannelType
+
+import config
+import messageMirror
+import models
+
+models.create_schema()
+
+
+class FakePermissions:
+    def __init__(self, read_message_history):
+        self.read_message_history = read_message_history
+
+
+class FakeChannel:
+    def __init__(self, id, readable=True, type=ChannelType.text):
+        self.id = id
+        self.readable = readable
+        self.type = type
+
+    def permissions_for(self, member):
+        return FakePermissions(self.readable)
+
+
+class FakeGuild:
+    def __init__(self, id, channels):
+        self.id = id
+        self.channels = channels
+        self.me = object()
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class FindMessagesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.mirror = messageMirror.MessageMirror()
+        patcher = mock.patch.object(config, "message_mirror_enabled", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        run(models.run_in_db(messageMirror.storeMessages, {101: (1, 10, 5, []), 102: (1, 10, 6, [5])}, ()))
+
+    def test_unreadable_channels_are_not_waited_for(self):
+        guild = FakeGuild(1, [FakeChannel(10), FakeChannel(11, readable=False)])
+        self.mirror.backfilled.add(10)
+
+        self.assertEqual(sorted(run(self.mirror.find_messages(guild, 5))[10]), [101, 102])
+        self.assertEqual(run(self.mirror.find_messages(guild, 5, include_mentions=False)), {10: [101]})
+
+    def test_readable_channel_not_backfilled(self):
+        guild = FakeGuild(1, [FakeChannel(10), FakeChannel(12)])
+        self.mirror.backfilled.add(10)
+
+        self.assertIsNone(run(self.mirror.find_messages(guild, 5)))
+
+    def test_new_channels_count_as_backfilled(self):
+        created = FakeChannel(13)
+        guild = FakeGuild(1, [FakeChannel(10), created])
+        self.mirror.backfilled.add(10)
+
+        self.mirror.mark_backfilled(created)
+        self.assertEqual(run(self.mirror.find_messages(guild, 5, include_mentions=False)), {10: [101]})
+
+
+if __name__ == '__main__':
+    unittest.main()
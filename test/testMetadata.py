@@ -0,0 +1,42 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import metadata
+
+
+class MetadataTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = metadata.server_data(1, 0, "server")
+        self.metadata = metadata.Metadata(service=None, user=metadata.UserData(2, 0, "user"), server=self.server)
+
+    def test_only_assigned_keys_are_contained(self):
+        self.assertIn("server", self.metadata)
+        self.assertIn("service", self.metadata)  # assigned, even though it is None
+        self.assertNotIn("event", self.metadata)
+        self.assertNotIn("chat", self.metadata)
+        self.assertNotIn("__slots__", self.metadata)
+
+        self.metadata["event"] = "reaction"
+        self.assertIn("event", self.metadata)
+
+    def test_unassigned_keys_behave_like_missing_dict_keys(self):
+        self.assertIs(self.metadata["server"], self.server)
+        self.assertIsNone(self.metadata["service"])
+        self.assertIsNone(self.metadata.get("event"))
+        self.assertEqual(self.metadata.get("event", "default"), "default")
+
+        with self.assertRaises(KeyError):
+            self.metadata["event"]
+
+        with self.assertRaises(KeyError):
+            self.metadata["unknown"] = 1
+
+    def test_repr_with_unassigned_keys(self):
+        self.assertIn("chat='None'", repr(self.metadata))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from helpers import metricsHelpers
+
+
+class MetricsHelpersTestCase(unittest.TestCase):
+    def setUp(self):
+        metricsHelpers.timings.clear()
+
+    def test_timer_counts_calls_and_errors(self):
+        with metricsHelpers.timer("command", "ping"):
+            pass
+
+        with self.assertRaises(ValueError):
+            with metricsHelpers.timer("command", "ping"):
+                raise ValueError("failed")
+
+        timing = metricsHelpers.timings[("command", "ping")]
+        self.assertEqual((timing.calls, timing.errors, sum(timing.buckets)), (2, 1, 2))
+
+    def test_timed_event(self):
+        @metricsHelpers.timed_event
+        async def on_message(message):
+            await asyncio.sleep(0.01)
+            return message
+
+        self.assertEqual(asyncio.get_event_loop().run_until_complete(on_message("hi")), "hi")
+
+        timing = metricsHelpers.timings[("event", "on_message")]
+        self.assertEqual(timing.calls, 1)
+        self.assertGreaterEqual(timing.total, 0.01)
+
+    def test_percentiles(self):
+        for _ in range(98):
+            metricsHelpers.observe("rest", "send_message", 0.002)
+        for _ in range(2):
+            metricsHelpers.observe("rest", "send_message", 3)
+
+        timing = metricsHelpers.timings[("rest", "send_message")]
+        self.assertEqual(timing.percentile(0.5), 0.0025)
+        self.assertEqual(timing.percentile(0.99), 5)
+        self.assertEqual(len(metricsHelpers.describe("rest")), 1)
+        self.assertEqual(metricsHelpers.describe("command"), [])
+
+    def test_prometheus_format(self):
+        metricsHelpers.observe("command", 'say "hi"', 0.02)
+        metricsHelpers.observe("command", 'say "hi"', 60, error=True)
+
+        text = metricsHelpers.render_prometheus()
+
+        self.assertIn('evebot_seconds_bucket{kind="command",name="say \\"hi\\"",le="0.025"} 1', text)
+        self.assertIn('evebot_seconds_bucket{kind="command",name="say \\"hi\\"",le="+Inf"} 2', text)
+        self.assertIn('evebot_seconds_count{kind="command",name="say \\"hi\\""} 2', text)
+        self.assertIn('evebot_errors_total{kind="command",name="say \\"hi\\""} 1', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
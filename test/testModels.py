@@ -0,0 +1,75 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+DB_DIR = tempfile.mkdtemp()
+os.environ["BOT_DATABASE"] = "sqlite:///" + os.path.join(DB_DIR, "test.db")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import models
+from models import TagReactables, run_in_db, session_scope
+
+models.create_schema()
+
+
+def slow_insert(session, message_id):
+    session.add(TagReactables(message_id=message_id, function_name="toggle_role", function_args="1"))
+    time.sleep(0.3)  # stand in for a slow query/commit
+
+
+def count_reactables(session):
+    return session.query(TagReactables).count()
+
+
+class ModelsTestCase(unittest.TestCase):
+    def setUp(self):
+        with session_scope() as session:
+            session.query(TagReactables).delete()
+
+    def test_event_loop_stays_responsive(self):
+        async def ticker(ticks, done):
+            while not done.is_set():
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def scenario():
+            ticks = []
+            done = asyncio.Event()
+            tick_task = asyncio.ensure_future(ticker(ticks, done))
+
+            await asyncio.gather(run_in_db(slow_insert, "1"), run_in_db(slow_insert, "2"))
+            done.set()
+            await tick_task
+
+            return ticks, await run_in_db(count_reactables)
+
+        ticks, count = asyncio.get_event_loop().run_until_complete(scenario())
+
+        self.assertEqual(count, 2)
+        # 0.6s of database work, during which the loop kept ticking without a long stall
+        self.assertGreater(len(ticks), 20)
+        self.assertLess(max(b - a for a, b in zip(ticks, ticks[1:])), 0.2)
+
+    def test_unit_of_work_rolls_back_on_error(self):
+        def failing_insert(session):
+            session.add(TagReactables(message_id="3", function_name="toggle_role", function_args="1"))
+            session.flush()
+            raise ValueError("failed")
+
+        async def scenario():
+            with self.assertRaises(ValueError):
+                await run_in_db(failing_insert)
+            return await run_in_db(count_reactables)
+
+        self.assertEqual(asyncio.get_event_loop().run_until_complete(scenario()), 0)
+
+    def test_wal_mode(self):
+        with models.engine.connect() as connection:
+            self.assertEqual(connection.execute("PRAGMA journal_mode").scalar(), "wal")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import discord
+
+from helpers import rateHelpers
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+        self.reason = "Too Many Requests" if status == 429 else "Error"
+
+
+class FakeChannel:
+    def __init__(self, message_ids):
+        self.message_ids = message_ids  # newest first
+        self.requests = []
+
+    def history(self, limit, before=None):
+        self.requests.append(before)
+        older = [message_id for message_id in self.message_ids if before is None or message_id < before]
+        page = older[:limit]
+
+        class Iterator:
+            async def flatten(self):
+                return page
+
+        return Iterator()
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class TokenBucketTestCase(unittest.TestCase):
+    def test_bursts_then_paces_at_the_rate(self):
+        bucket = rateHelpers.TokenBucket(rate=50.0, capacity=5)
+
+        async def scenario():
+            started = time.monotonic()
+            for _ in range(5):
+                await bucket.acquire()
+            burst = time.monotonic() - started
+
+            for _ in range(5):
+                await bucket.acquire()
+            return burst, time.monotonic() - started
+
+        burst, total = run(scenario())
+
+        self.assertLess(burst, 0.05)
+        self.assertGreaterEqual(total, 5 / 50.0 * 0.9)
+        self.assertEqual(bucket.calls, 10)
+
+    def test_rate_limits_halve_the_rate_and_successes_raise_it(self):
+        bucket = rateHelpers.TokenBucket(rate=4.0, min_rate=1.0, max_rate=4.05)
+
+        async def ok():
+            return "ok"
+
+        async def limited():
+            raise discord.HTTPException(FakeResponse(429), "rate limited")
+
+        async def failed():
+            raise discord.HTTPException(FakeResponse(500), "server error")
+
+        async def scenario():
+            with self.assertRaises(discord.HTTPException):
+                await bucket.call(limited)
+            after_limit = bucket.rate
+
+            with self.assertRaises(discord.HTTPException):
+                await bucket.call(failed)
+            after_error = bucket.rate
+
+            result = await bucket.call(ok)
+            return after_limit, after_error, result
+
+        after_limit, after_error, result = run(scenario())
+
+        self.assertEqual((after_limit, after_error), (2.0, 2.0))  # only 429s slow the bucket down
+        self.assertEqual(result, "ok")
+        self.assertAlmostEqual(bucket.rate, 2.1)
+        self.assertEqual(bucket.rate_limits, 1)
+
+        for _ in range(5):
+            bucket.penalise()
+        self.assertEqual(bucket.rate, 1.0)
+
+        for _ in range(50):
+            bucket.reward()
+        self.assertEqual(bucket.rate, 4.05)
+
+    def test_discord_rate_limit_warnings_pause_watched_buckets(self):
+        watched = rateHelpers.TokenBucket(rate=10.0)
+        unwatched = rateHelpers.TokenBucket(rate=10.0)
+
+        with rateHelpers.watch_rate_limits(watched):
+            logging.getLogger("discord.http").warning("We are being rate limited. Retrying in %.2f seconds. "
+                                                      "Handled under the bucket \"%s\"", 0.5, "channels")
+        logging.getLogger("discord.http").warning("We are being rate limited. Retrying in %.2f seconds.", 0.5)
+
+        self.assertEqual((watched.rate, unwatched.rate), (5.0, 10.0))
+        self.assertGreater(watched.paused_until, time.monotonic() + 0.4)
+        self.assertNotIn(watched, rateHelpers.rateLimitListener.buckets)
+
+
+class HistoryPagesTestCase(unittest.TestCase):
+    def test_pages_newest_first_until_a_short_page(self):
+        channel = FakeChannel(list(range(250, 0, -1)))
+        bucket = rateHelpers.TokenBucket(rate=100.0)
+
+        async def scenario():
+            return [page async for page in rateHelpers.history_pages(channel, bucket)]
+
+        pages = run(scenario())
+
+        self.assertEqual([len(page) for page in pages], [100, 100, 50])
+        self.assertEqual(sum(pages, []), list(range(250, 0, -1)))
+        self.assertEqual(bucket.calls, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from helpers.reactionHelpers import ReactionMatcher
+
+TRIGGERS = ["hello", "thanks eve", "good (morning|night)", r"\bcats?\b", "c++", "[unclosed", "Upper Case", r"(\w)\1{3}"]
+
+MESSAGES = ["", "Hello there", "HELLO", "thanks Eve!", "good morning all", "Good Night", "goodnight", "I like cats",
+            "concatenate", "I write C++", "a [unclosed bracket", "upper case", "zzzz", "nothing to see here",
+            "hello and good morning"]
+
+
+# How reactions were matched before they were compiled: each trigger in turn, as a literal then a regex
+def linear_scan(triggers, message):
+    for trigger in triggers:
+        if trigger in message.lower():
+            return trigger
+
+        try:
+            if re.findall(trigger, message, re.IGNORECASE):
+                return trigger
+        except re.error:
+            pass
+
+    return None
+
+
+class ReactionMatcherTestCase(unittest.TestCase):
+    def assertMatchesLinearScan(self, triggers):
+        matcher = ReactionMatcher(triggers)
+
+        for message in MESSAGES:
+            with self.subTest(message=message):
+                self.assertEqual(matcher.match(message), linear_scan(triggers, message))
+
+    def test_matches_are_the_same_as_scanning_every_trigger(self):
+        self.assertMatchesLinearScan(TRIGGERS)
+
+    def test_registration_order_decides_between_matches(self):
+        self.assertMatchesLinearScan(list(reversed(TRIGGERS)))
+        self.assertEqual(ReactionMatcher(["good (morning|night)", "hello"]).match("hello and good morning"),
+                         "good (morning|night)")
+
+    # Inline flags can't go in the middle of the combined pattern (newer pythons refuse to compile it)
+    def test_triggers_which_cant_be_combined_are_still_matched(self):
+        matcher = ReactionMatcher(TRIGGERS + ["(?i)shout"])
+
+        self.assertMatchesLinearScan(TRIGGERS + ["(?i)shout"])
+        self.assertEqual(matcher.match("SHOUT"), "(?i)shout")
+
+    def test_no_triggers(self):
+        self.assertIsNone(ReactionMatcher().match("hello"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+DB_DIR = tempfile.mkdtemp()
+os.environ.setdefault("BOT_DATABASE", "sqlite:///" + os.path.join(DB_DIR, "test.db"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import config
+import models
+import roleReconciler
+from helpers import rateHelpers
+
+models.create_schema()
+
+GUILD_ID = 500
+ROLE_ID = 10
+BLOCKING_ROLE_ID = 20
+
+
+class FakeRole:
+    def __init__(self, id):
+        self.id = id
+
+
+class FakeMember:
+    def __init__(self, id, roles, fails=False, hangs=False):
+        self.id = id
+        self.name = "member" + str(id)
+        self.roles = roles
+        self.fails = fails
+        self.hangs = hangs
+        self.changes = []
+
+    async def add_roles(self, role, reason=None):
+        await self.change(role, True)
+
+    async def remove_roles(self, role, reason=None):
+        await self.change(role, False)
+
+    async def change(self, role, add):
+        if self.hangs:
+            await asyncio.Event().wait()
+        if self.fails:
+            raise RuntimeError("Missing Permissions")
+        self.changes.append((role.id, add))
+
+
+class FakeGuild:
+    def __init__(self, members, roles):
+        self.id = GUILD_ID
+        self.members = members
+        self.roles = {role.id: role for role in roles}
+
+    def get_role(self, role_id):
+        return self.roles.get(role_id)
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class RoleReconcilerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.role = FakeRole(ROLE_ID)
+        self.blocking_role = FakeRole(BLOCKING_ROLE_ID)
+        patcher = mock.patch.dict(config.reconcile_roles, {GUILD_ID: (ROLE_ID, BLOCKING_ROLE_ID)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def guild(self, *members):
+        return FakeGuild(list(members), [self.role, self.blocking_role])
+
+    def test_plan_adds_and_removes_only_what_is_needed(self):
+        guild = self.guild(FakeMember(4, [self.role, self.blocking_role]),  # has the role but shouldn't
+                           FakeMember(1, []),  # needs the role
+                           FakeMember(3, [self.blocking_role]),  # correctly without it
+                           FakeMember(2, [self.role]))  # correctly with it
+
+        plan = roleReconciler.planRoleChanges(guild)
+
+        self.assertEqual([(change.member.id, change.add) for change in plan], [(1, True), (4, False)])
+        self.assertEqual(roleReconciler.describePlan(plan), "1 members to add roles to, 1 members to remove roles from")
+        self.assertEqual([change.member.id for change in roleReconciler.planRoleChanges(guild, after_member_id=1)], [4])
+
+    def test_apply_counts_failures_and_clears_the_cursor(self):
+        members = [FakeMember(1, []), FakeMember(2, [], fails=True), FakeMember(3, [self.role, self.blocking_role])]
+        guild = self.guild(*members)
+        plan = roleReconciler.planRoleChanges(guild)
+
+        result = run(roleReconciler.applyRoleChanges(guild, plan, concurrency=2, bucket=rateHelpers.TokenBucket(rate=1000.0)))
+
+        self.assertEqual(result, (2, 1))
+        self.assertEqual([member.changes for member in members], [[(ROLE_ID, True)], [], [(ROLE_ID, False)]])
+        self.assertIsNone(run(roleReconciler.getCursor(GUILD_ID)))
+
+    def test_interrupted_run_saves_a_cursor_to_resume_from(self):
+        members = [FakeMember(1, []), FakeMember(2, []), FakeMember(3, [], hangs=True), FakeMember(4, [])]
+        guild = self.guild(*members)
+        plan = roleReconciler.planRoleChanges(guild)
+
+        async def scenario():
+            task = asyncio.ensure_future(roleReconciler.applyRoleChanges(
+                guild, plan, concurrency=4, bucket=rateHelpers.TokenBucket(rate=1000.0)))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            await asyncio.wait([task])
+            return await roleReconciler.getCursor(GUILD_ID)
+
+        cursor = run(scenario())
+
+        # Member 4 is done too, but the cursor can't move past member 3 until they are
+        self.assertEqual(cursor, 2)
+        self.assertEqual([change.member.id for change in roleReconciler.planRoleChanges(guild, cursor)], [3, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,150 @@
+import asyncio
+import os
+import sys
+import tempfile
 import unittest
+from unittest import mock
 
+DB_DIR = tempfile.mkdtemp()
+os.environ.setdefault("BOT_DATABASE", "sqlite:///" + os.path.join(DB_DIR, "test.db"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
 
-class MyTestCase(unittest.TestCase):
-    def test_something(self):
-        self.assertEqual(True, False)
+import config
+import models
+import runDiscord
+from helpers import logHelpers
+
+models.create_schema()
+
+
+class FakeUser:
+    id = 901
+    display_name = "Eve"
+
+
+class FakeClient(runDiscord.DiscordClient):
+    user = FakeUser()
+
+
+class FakeGuild:
+    def __init__(self, id):
+        self.id = id
+
+
+class FakeChannel:
+    def __init__(self, id, guild):
+        self.id = id
+        self.name = "channel" + str(id)
+        self.guild = guild
+
+
+class FakeEvent:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeLogPipeline:
+    def __init__(self):
+        self.logged = []
+
+    def log(self, guild, embed):
+        self.logged.append((guild.id, embed.title))
+
+
+# A client in a logged guild, with its log channel and one other channel
+class LoggingClient(FakeClient):
+    def __init__(self):
+        super().__init__()
+        self.guild = FakeGuild(config.servers["Test"])
+        self.log_channel = FakeChannel(config.log_channels[self.guild.id], self.guild)
+        self.other_channel = FakeChannel(1, self.guild)
+        self.log_pipeline = FakeLogPipeline()
+
+    def get_guild(self, guild_id):
+        return self.guild if guild_id == self.guild.id else None
+
+    def get_channel(self, channel_id):
+        return {channel.id: channel for channel in (self.log_channel, self.other_channel)}.get(channel_id)
+
+    def store(self, message_id, channel):
+        self.message_store.put(message_id, logHelpers.LoggedMessage(message_id, 5, "someone", channel.id, "hello"))
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class LoadBotUserTestCase(unittest.TestCase):
+    def test_bot_user_is_stored(self):
+        client = FakeClient()
+        database_user = run(client.load_bot_user())
+
+        self.assertEqual(client.service.name, "discord")
+        self.assertEqual(int(database_user.id), FakeUser.id)
+        self.assertEqual(database_user.username, "Eve")
+
+    def test_database_failure_still_gives_a_bot_user(self):
+        client = FakeClient()
+
+        async def failing_run_in_db(function, *args):
+            raise RuntimeError("database is locked")
+
+        with mock.patch.object(runDiscord, "run_in_db", failing_run_in_db):
+            database_user = run(client.load_bot_user())
+
+        self.assertEqual(client.service.name, "discord")
+        self.assertEqual(database_user.id, FakeUser.id)
+        self.assertEqual(database_user.username, "Eve")
+
+
+class LogChannelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = LoggingClient()
+
+    def bulk_delete(self, channel, message_ids):
+        run(self.client.on_raw_bulk_message_delete(FakeEvent(guild_id=self.client.guild.id, channel_id=channel.id,
+                                                              message_ids=set(message_ids))))
+
+    def test_purging_the_log_channel_is_not_logged(self):
+        self.client.store(10, self.client.log_channel)
+
+        self.bulk_delete(self.client.log_channel, [10, 11])
+        self.assertEqual(self.client.log_pipeline.logged, [])
+        self.assertIsNone(self.client.message_store.get(10))
+
+        self.bulk_delete(self.client.other_channel, [12, 13])
+        self.assertEqual(self.client.log_pipeline.logged, [(self.client.guild.id, "Messages Bulk Deleted")])
+
+    def test_deletes_and_edits_in_the_log_channel_are_not_logged(self):
+        for channel in (self.client.log_channel, self.client.other_channel):
+            self.client.store(channel.id + 100, channel)
+            self.client.store(channel.id + 200, channel)
+
+            run(self.client.on_raw_message_edit(FakeEvent(message_id=channel.id + 100, channel_id=channel.id, data={
+                "content": "edited", "guild_id": str(self.client.guild.id)})))
+            run(self.client.on_raw_message_delete(FakeEvent(message_id=channel.id + 200, channel_id=channel.id,
+                                                            guild_id=self.client.guild.id)))
+
+        self.assertEqual(self.client.log_pipeline.logged, [(self.client.guild.id, "Message Edited"),
+                                                           (self.client.guild.id, "Message Deleted")])
+
+
+class MessageStoreTestCase(unittest.TestCase):
+    def test_raw_edits_update_the_store_and_deletes_remove_from_it(self):
+        client = LoggingClient()
+        channel = client.other_channel
+        client.store(10, channel)
+
+        run(client.on_raw_message_edit(FakeEvent(message_id=10, channel_id=channel.id, data={"content": "edited"})))
+        self.assertEqual(client.message_store.get(10).content, "edited")
+
+        # Edits to messages that aren't stored (e.g sent before the bot started) are ignored
+        run(client.on_raw_message_edit(FakeEvent(message_id=11, channel_id=channel.id, data={"content": "edited"})))
+        self.assertIsNone(client.message_store.get(11))
+
+        run(client.on_raw_message_delete(FakeEvent(message_id=10, channel_id=channel.id, guild_id=client.guild.id)))
+        self.assertIsNone(client.message_store.get(10))
+        self.assertEqual(client.log_pipeline.logged, [(client.guild.id, "Message Edited"), (client.guild.id, "Message Deleted")])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import sys
+import unittest
+from collections import namedtuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import discord
+
+from helpers import sendHelpers
+
+FakeResponse = namedtuple("FakeResponse", ["status", "reason"])
+
+
+class FakeMessage:
+    def __init__(self, channel, id, content):
+        self.channel = channel
+        self.id = id
+        self.content = content
+
+    async def edit(self, content):
+        await self.channel.call("edit " + content)
+        self.content = content
+
+
+# Records what was sent, failing the first few calls if asked to
+class FakeChannel:
+    def __init__(self, id, failures=0, status=500):
+        self.id = id
+        self.calls = []
+        self.failures = failures
+        self.status = status
+
+    async def call(self, description):
+        await asyncio.sleep(0)
+        if self.failures:
+            self.failures -= 1
+            raise discord.HTTPException(FakeResponse(self.status, "failed"), "failed")
+        self.calls.append(description)
+
+    async def send(self, text, **kwargs):
+        await self.call("send " + str(text))
+        return FakeMessage(self, len(self.calls), text)
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class SendHelpersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.backoff = sendHelpers.RETRY_BACKOFF
+        self.idle_timeout = sendHelpers.IDLE_TIMEOUT
+        sendHelpers.RETRY_BACKOFF = 0.01
+        sendHelpers.IDLE_TIMEOUT = 0.01
+
+    def tearDown(self):
+        sendHelpers.RETRY_BACKOFF = self.backoff
+        sendHelpers.IDLE_TIMEOUT = self.idle_timeout
+
+    def test_replies_go_before_progress_and_logs(self):
+        channel = FakeChannel(1)
+        queue = sendHelpers.SendQueue(channel)
+
+        async def scenario():
+            status = await queue.send("status")
+            channel.calls.clear()
+            await asyncio.gather(queue.send("log", priority=sendHelpers.LOG), queue.edit(status, "progress"),
+                                 queue.send("reply"))
+
+        run(scenario())
+
+        self.assertEqual(channel.calls, ["send reply", "edit progress", "send log"])
+
+    def test_progress_edits_are_coalesced(self):
+        channel = FakeChannel(2)
+        queue = sendHelpers.SendQueue(channel)
+
+        async def scenario():
+            status = await queue.send("status")
+            blocker = queue.send("reply")  # keeps the worker busy while the edits queue up
+            edits = [queue.edit(status, "progress " + str(number)) for number in range(10)]
+            await asyncio.gather(blocker, *edits)
+            return status
+
+        status = run(scenario())
+
+        self.assertEqual(channel.calls, ["send status", "send reply", "edit progress 9"])
+        self.assertEqual(status.content, "progress 9")
+        self.assertEqual(queue.coalesced, 9)
+
+    def test_server_errors_are_retried(self):
+        channel = FakeChannel(3, failures=2)
+        queue = sendHelpers.SendQueue(channel)
+
+        message = run(queue.send("hello"))
+
+        self.assertEqual(message.content, "hello")
+        self.assertEqual(channel.calls, ["send hello"])
+
+    def test_retries_dont_hold_up_the_channel(self):
+        channel = FakeChannel(5, failures=1)
+        queue = sendHelpers.SendQueue(channel)
+        sendHelpers.RETRY_BACKOFF = 0.2
+
+        async def scenario():
+            failing = asyncio.ensure_future(queue.send("first"))
+            await asyncio.sleep(0.05)
+            await asyncio.wait_for(queue.send("reply"), 0.1)
+            await failing
+
+        run(scenario())
+
+        self.assertEqual(channel.calls, ["send reply", "send first"])
+
+    def test_rate_never_rises_above_the_channel_limit(self):
+        queue = sendHelpers.SendQueue(FakeChannel(6))
+
+        for _ in range(100):
+            queue.bucket.reward()
+
+        self.assertEqual(queue.bucket.rate, sendHelpers.CHANNEL_RATE)
+
+    def test_idle_queues_are_dropped(self):
+        channel = FakeChannel(7)
+
+        async def scenario():
+            await sendHelpers.get_send_queue(channel).send("hello")
+            self.assertIn(channel.id, sendHelpers.sendQueues)
+            await asyncio.sleep(0.05)
+
+        run(scenario())
+
+        self.assertNotIn(channel.id, sendHelpers.sendQueues)
+
+    def test_client_errors_are_not_retried(self):
+        channel = FakeChannel(4, failures=1, status=400)
+        queue = sendHelpers.SendQueue(channel)
+
+        with self.assertRaises(discord.HTTPException):
+            run(queue.send("hello"))
+
+        self.assertEqual(channel.failures, 0)
+        self.assertEqual(channel.calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
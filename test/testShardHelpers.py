@@ -0,0 +1,73 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from helpers import shardHelpers
+
+# Stands in for runDiscord.py: records the shards it was given, then exits straight away
+FAKE_SHARD = """
+import sys
+with open(sys.argv[-1] + ".log", "a") as log:
+    log.write(" ".join(sys.argv[1:-1]) + "\\n")
+"""
+
+
+class FakeShardSupervisor(shardHelpers.ShardSupervisor):
+    def __init__(self, log_path, *args, **kwargs):
+        self.log_path = log_path
+        super().__init__(*args, **kwargs)
+
+    def command(self, shard_ids):
+        return super().command(shard_ids) + [self.log_path]
+
+
+class ShardHelpersTestCase(unittest.TestCase):
+    def test_shard_ranges_cover_every_shard_once(self):
+        for shard_count in range(1, 12):
+            for processes in range(1, 6):
+                ranges = shardHelpers.shard_ranges(shard_count, processes)
+                self.assertEqual([shard for shard_range in ranges for shard in shard_range], list(range(shard_count)))
+                self.assertLessEqual(max(map(len, ranges)) - min(map(len, ranges)), 1)
+
+        self.assertEqual(shardHelpers.shard_ranges(2, 4), [[0], [1]])
+
+    def test_parse_shard_ids(self):
+        self.assertEqual(shardHelpers.parse_shard_ids("0-3"), [0, 1, 2, 3])
+        self.assertEqual(shardHelpers.parse_shard_ids("1,4-5"), [1, 4, 5])
+        self.assertEqual(shardHelpers.parse_shard_ids(shardHelpers.format_shard_ids([2, 3])), [2, 3])
+
+    def test_shard_for_guild(self):
+        # Discord's documented example: shard_id = (guild_id >> 22) % num_shards
+        self.assertEqual(shardHelpers.shard_for_guild(354565059675947009, 1), 0)
+        self.assertEqual(shardHelpers.shard_for_guild(354565059675947009, 4), (354565059675947009 >> 22) % 4)
+
+    def test_supervisor_restarts_exited_processes(self):
+        directory = tempfile.mkdtemp()
+        script = os.path.join(directory, "fakeShard.py")
+        with open(script, "w") as fileHandler:
+            fileHandler.write(FAKE_SHARD)
+
+        log_path = os.path.join(directory, "shards")
+        supervisor = FakeShardSupervisor(log_path, script, 4, 2, restart_delay=0.05, identify_interval=0)
+
+        async def scenario():
+            run = asyncio.ensure_future(supervisor.run())
+            while supervisor.restarts < 4:
+                await asyncio.sleep(0.05)
+            supervisor.stop()
+            await asyncio.wait_for(run, 5)
+
+        asyncio.get_event_loop().run_until_complete(scenario())
+
+        with open(log_path + ".log") as log:
+            started = set(log.read().splitlines())
+
+        self.assertEqual(started, {"--shard-count 4 --shard-ids 0,1", "--shard-count 4 --shard-ids 2,3"})
+
+
+if __name__ == '__main__':
+    unittest.main()
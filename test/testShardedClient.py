@@ -0,0 +1,132 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+DB_DIR = tempfile.mkdtemp()
+os.environ.setdefault("BOT_DATABASE", "sqlite:///" + os.path.join(DB_DIR, "test.db"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import config
+import evebot
+import models
+import runDiscord
+from helpers import shardHelpers
+
+models.create_schema()
+
+BOT_ID = 900
+SHARD_COUNT = 4
+
+
+class FakeRole:
+    def __init__(self, id):
+        self.id = id
+
+
+class FakeGuild:
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+class FakeAuthor:
+    def __init__(self, id, guild, roles):
+        self.id = id
+        self.name = self.display_name = "user" + str(id)
+        self.bot = False
+        self.guild = guild
+        self.roles = [FakeRole(role) for role in roles]
+
+
+class FakeChannel:
+    def __init__(self, id, guild):
+        self.id = id
+        self.name = "channel" + str(id)
+        self.guild = guild
+        self.sent = []
+
+    def is_nsfw(self):
+        return False
+
+    async def send(self, text, **kwargs):
+        self.sent.append(text)
+        return FakeMessage(len(self.sent), text, None, self)
+
+
+class FakeMessage:
+    def __init__(self, id, content, author, channel):
+        self.id = id
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.attachments = []
+        self.mentions = []
+
+
+# Hands each message to the one client connected to the shard its guild belongs to, as discord does
+class FakeGateway:
+    def __init__(self, clients):
+        self.clients = clients
+
+    def client_for(self, guild):
+        for client in self.clients:
+            shard_ids = getattr(client, "shard_ids", None)
+            if shard_ids is None or shardHelpers.shard_for_guild(guild.id, client.shard_count) in shard_ids:
+                return client
+
+    async def deliver(self, message):
+        client = self.client_for(message.guild)
+        await client.on_message(message)
+        return client
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+async def ready(client):
+    client.service, database_user = await models.run_in_db(runDiscord.store_bot_user, BOT_ID, "Eve")
+    client.eve = evebot.EveBot(database_user)
+    return client
+
+
+class ShardedClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.guilds = {name: FakeGuild(config.servers[name], name) for name in ("Test", "TMHC")}
+        self.roles = {"Test": config.approved_roles[config.servers["Test"]][0],
+                      "TMHC": config.approved_roles[config.servers["TMHC"]][0]}
+
+    # Sends a command in each guild through the gateway, returns {guild name: (replies, client which handled it)}
+    def converse(self, clients):
+        gateway = FakeGateway([run(ready(client)) for client in clients])
+        results = {}
+
+        for name, guild in self.guilds.items():
+            channel = FakeChannel(guild.id + 1, guild)
+            author = FakeAuthor(guild.id + 2, guild, [self.roles[name]])
+            client = run(gateway.deliver(FakeMessage(guild.id + 3, ".ping", author, channel)))
+            results[name] = (channel.sent, client)
+
+        return results
+
+    def test_commands_run_on_the_guilds_shard_as_they_do_unsharded(self):
+        ranges = shardHelpers.shard_ranges(SHARD_COUNT, SHARD_COUNT)
+        sharded = self.converse([runDiscord.ShardedDiscordClient(shard_count=SHARD_COUNT, shard_ids=shard_ids)
+                                 for shard_ids in ranges])
+        unsharded = self.converse([runDiscord.DiscordClient()])
+
+        for name, guild in self.guilds.items():
+            replies, client = sharded[name]
+            self.assertIn(shardHelpers.shard_for_guild(guild.id, SHARD_COUNT), client.shard_ids)
+            self.assertEqual(replies, ["Pong"])
+            self.assertEqual(replies, unsharded[name][0])
+
+        # The two guilds are on different shards, so different processes
+        self.assertIsNot(sharded["Test"][1], sharded["TMHC"][1])
+
+
+if __name__ == '__main__':
+    unittest.main()